@@ -33,8 +33,15 @@ bl_info = {
 
 import os
 import json
+import time
+import sqlite3
+import threading
+from array import array
+from bisect import bisect_right
+from collections import OrderedDict
 
 import bpy
+import bpy.utils.previews
 from bpy.app.handlers import persistent
 from bpy.types import (
     Operator,
@@ -52,6 +59,19 @@ from bpy.props import (
     PointerProperty,
 )
 
+from . import (
+    blendfile,
+    groupcache,
+    model,
+    placement,
+    previews,
+    purge,
+    storage,
+    validation,
+)
+from .profiling import profiler
+from .storage import read_library_file
+
 
 VERBOSE = False # enable this for debugging
 
@@ -72,11 +92,51 @@ def debug_print(*args):
 
 runtime_vars = {}
 class ReadState:
-    NotLoaded, NoFile, FilePathInvalid, FileContentInvalid, EmptyLib, AllGood = range(6)
+    NotLoaded, NoFile, FilePathInvalid, FileContentInvalid, EmptyLib, AllGood, Loading = range(7)
 runtime_vars["read_state"] = ReadState.NotLoaded
 class SaveState:
     HasUnsavedChanges, AllSaved = range(2)
 runtime_vars["save_state"] = SaveState.AllSaved
+# The whole library, as plain Python records (see model.py)
+runtime_vars["library"] = model.Library()
+# Name of the collection whose assets are filled in the PropertyGroups
+runtime_vars["shown_col"] = ""
+# Whether those PropertyGroups were edited since they were last written back
+# into the model, see store_shown_collection
+runtime_vars["shown_edited"] = False
+# Group names per blend file, stored next to the library (see groupcache.py)
+runtime_vars["group_cache"] = groupcache.GroupCache()
+# Set while filling PropertyGroups, to not list the groups of every component
+runtime_vars["defer_groups"] = False
+# (path, mtime, size) of the library file as last read or written
+runtime_vars["library_stat"] = None
+# storage.LibraryStore of a library in SQLite, None for JSON libraries
+runtime_vars["storage"] = None
+# Whether the library watcher modal operator is running
+runtime_vars["watching"] = False
+# Report of the last library validation, see validation.py
+runtime_vars["validation"] = None
+# Token of the background reload in progress, see ASSET_OT_powerlib_reload_from_json
+runtime_vars["loading"] = None
+# (PreviewCache, PreviewRenderer) of the library, see previews.py
+runtime_vars["previews"] = None
+# bpy.utils.previews collection of the preview icons loaded so far
+runtime_vars["preview_icons"] = None
+# Keys of the loaded preview icons, least recently drawn first
+runtime_vars["preview_icon_keys"] = OrderedDict()
+# (library generation, {(collection name, asset name): (key, abspath, group
+# name) or None}) of the previews drawn so far, see asset_preview_icon()
+runtime_vars["preview_sources"] = (None, {})
+# Keys requested from the renderer and not rendered yet
+runtime_vars["preview_requested"] = set()
+# Whether the preview modal operator is running
+runtime_vars["previews_running"] = False
+# Incremented on every change of the library or its PropertyGroups
+runtime_vars["library_generation"] = 0
+# What the panel draws, see PanelModel
+runtime_vars["panel_model"] = None
+# (key, flags) of the last filtering of the asset list, see ASSET_UL_collection_assets
+runtime_vars["asset_filter"] = None
 
 
 enum_component_type = EnumProperty(
@@ -102,6 +162,48 @@ def enum_item_name_icon(enum, value):
     return "Error", 'ERROR'
 
 
+def list_groups_in_blend(filepath):
+    """Return the names of the groups in a blend file.
+
+    The file-block headers are read directly (see blendfile.py), Blender's
+    loader is only used for files that reader does not understand.
+    """
+    debug_print('Listing groups in {}'.format(filepath))
+    try:
+        with profiler.phase('list_groups'):
+            groups = blendfile.list_groups(filepath)
+        profiler.count('files_read')
+        return groups
+    except blendfile.BlendFileError as ex:
+        debug_print('... falling back to libraries.load: {}'.format(ex))
+
+    with profiler.phase('libraries.load'):
+        with bpy.data.libraries.load(filepath) as (data_from, data_to):
+            groups = list(data_from.groups)
+    profiler.count('files_opened')
+    return groups
+
+
+def absolute_library_filepath(filepath):
+    """Return the absolute path of a file given relative to the library,
+    or None if there is no such file.
+    """
+    from . import linking
+
+    abspath = linking.library_paths().absolute(filepath)
+    if abspath is None:
+        # raise IOError('File {} not found'.format(normpath))
+        debug_print('IOError: File {} not found'.format(filepath))
+    return abspath
+
+
+def shown_collection_edited(self=None, context=None):
+    """Note an edit of the assets in the PropertyGroups, also the update
+    callback of the properties edited in the asset list.
+    """
+    runtime_vars["shown_edited"] = True
+
+
 class ComponentItem(PropertyGroup):
     name = StringProperty()
 
@@ -111,44 +213,67 @@ class Component(PropertyGroup):
         """Updates the filepath property after we picked a new value for
         filepath_rel via a file browser.
         """
+        shown_collection_edited()
         #~ self.group = None
         self.groups.clear()
+        self.groups_loaded = False
 
         if self.filepath_rel == '':
             return
         # TODO: ensure path is valid
         # Make path relative to the library
         from . import linking
-        import importlib
-        importlib.reload(linking)
 
         fp_rel_to_lib = linking.relative_path_to_lib(self.filepath_rel)
         debug_print('Updating library link to {}'.format(fp_rel_to_lib))
         self.filepath = fp_rel_to_lib
 
-        cache_key = self.filepath
+        # While a collection is being filled the groups are listed on demand,
+        # see AssetItem.load_groups
+        if not runtime_vars["defer_groups"]:
+            self.load_groups()
+
+    def load_groups(self):
+        """Fill the list of groups the id can be picked from"""
+        self.groups.clear()
+        self.groups_loaded = True
+
+        if self.filepath_rel == '':
+            return
+
         if self.filepath_rel == '//' + os.path.basename(bpy.data.filepath):
             for g in bpy.data.groups:
                 if g.library:
                     continue
                 self.groups.add().name = g.name
         else:
-            filepath = bpy.path.relpath(self.absolute_filepath)
-            with bpy.data.libraries.load(filepath) as (data_from, data_to):
-                for gname in data_from.groups:
-                    self.groups.add().name = gname
+            absolute_filepath = self.absolute_filepath
+            if absolute_filepath is None:
+                return
+            group_names = runtime_vars["group_cache"].get(
+                absolute_filepath, list_groups_in_blend)
+            for gname in group_names or ():
+                self.groups.add().name = gname
 
     id = StringProperty(
         name="Name",
         description="Name for this component, eg. the name of a group",
+        update=shown_collection_edited,
     )
 
     groups = CollectionProperty(type=ComponentItem)
+    groups_loaded = BoolProperty(
+        name="Groups Loaded",
+        description="Whether the groups of the file have been listed",
+        default=False,
+        options={'HIDDEN', 'SKIP_SAVE'},
+    )
 
     filepath = StringProperty(
         name="File path",
         description="Path to the blend file which holds this data relative to the library",
         subtype='FILE_PATH',
+        update=shown_collection_edited,
     )
 
     filepath_rel = StringProperty(
@@ -160,15 +285,7 @@ class Component(PropertyGroup):
 
     @property
     def absolute_filepath(self):
-        library_path = os.path.dirname(
-            bpy.path.abspath(bpy.context.scene['lib_path']))
-        abspath = os.path.join(library_path, self.filepath)
-        normpath = os.path.normpath(abspath)
-        if os.path.isfile(normpath):
-            return normpath
-        else:
-            # raise IOError('File {} not found'.format(normpath))
-            debug_print('IOError: File {} not found'.format(normpath))
+        return absolute_library_filepath(self.filepath)
 
 
 class ComponentsList(PropertyGroup):
@@ -202,16 +319,41 @@ class ComponentsList(PropertyGroup):
 
 
 class AssetItem(PropertyGroup):
+    name = StringProperty(
+        name="Name",
+        update=shown_collection_edited,
+    )
     components_by_type = CollectionProperty(
         name="Components by Type",
         type=ComponentsList,
     )
+    select = BoolProperty(
+        name="Select",
+        description="Include this asset when linking the selected assets",
+        default=False,
+    )
+
+    def load_groups(self):
+        """List the groups of the components that were not listed yet"""
+        for components_of_type in self.components_by_type:
+            for component in components_of_type.components:
+                if not component.groups_loaded:
+                    component.load_groups()
 
 
 class AssetCollection(PropertyGroup):
+    def update_active_asset(self, context):
+        """The components of the active asset are shown, list their groups"""
+        self.load_active_asset_groups()
+
+    def load_active_asset_groups(self):
+        if 0 <= self.active_asset < len(self.assets):
+            self.assets[self.active_asset].load_groups()
+
     active_asset = IntProperty(
         name="Selected Asset",
         description="Currently selected asset",
+        update=update_active_asset,
     )
     assets = CollectionProperty(
         name="Assets",
@@ -220,7 +362,27 @@ class AssetCollection(PropertyGroup):
     )
 
 
+class LinkTarget(PropertyGroup):
+    """An asset, or a whole collection, to link in"""
+    collection = StringProperty(
+        name="Collection",
+        description="Name of the collection",
+    )
+    asset = StringProperty(
+        name="Asset",
+        description="Name of the asset, empty for all assets of the collection",
+    )
+
+
+# Most search results listed in the panel
+SEARCH_LIMIT = 100
+
+
 class PowerProperties(PropertyGroup):
+    def update_active_col(self, context):
+        """Fill the PropertyGroups of the newly selected collection"""
+        show_collection(self, self.active_col)
+
     is_edit_mode = BoolProperty(
         name="Is in Edit Mode",
         description="Toggle for Edit/Selection mode",
@@ -236,8 +398,543 @@ class PowerProperties(PropertyGroup):
     active_col = StringProperty(
         name="Active Collection",
         description="Currently selected collection",
+        update=update_active_col,
+    )
+
+    def update_watch_library(self, context):
+        if self.watch_library and not runtime_vars["watching"]:
+            bpy.ops.wm.powerlib_watch_library('INVOKE_DEFAULT')
+
+    watch_library = BoolProperty(
+        name="Watch Library File",
+        description="Apply the changes made to the library file on disk "
+                    "while it is open",
+        default=False,
+        update=update_watch_library,
     )
 
+    def update_profiling(self, context):
+        profiler.enabled = self.profile
+        profiler.trace_path = bpy.path.abspath(self.profile_trace_path)
+        profiler.set_history(self.profile_history)
+
+    profile = BoolProperty(
+        name="Profile",
+        description="Time the phases of library loads and links",
+        default=False,
+        update=update_profiling,
+    )
+    profile_history = IntProperty(
+        name="Runs to Keep",
+        description="Number of profiled runs to keep",
+        default=10,
+        min=1,
+        max=100,
+        update=update_profiling,
+    )
+    profile_trace_path = StringProperty(
+        name="Trace File",
+        description="Append each profiled run to this JSON-lines file",
+        subtype='FILE_PATH',
+        update=update_profiling,
+    )
+
+    lazy_groups = BoolProperty(
+        name="List Groups on Demand",
+        description="Only open the blend files of an asset's components "
+                    "when the asset is shown, instead of on library load",
+        default=True,
+    )
+    hash_sources = BoolProperty(
+        name="Hash Source Files",
+        description="Compare the content of the source files, not only their "
+                    "modification time and size, to find the reference objects "
+                    "that need no update",
+        default=False,
+    )
+    purge_after_update = BoolProperty(
+        name="Purge After Update",
+        description="Remove the datablocks nothing uses anymore after "
+                    "updating group reference objects",
+        default=False,
+    )
+
+    def update_search(self, context):
+        """List the assets of all collections matching the search"""
+        self.search_results.clear()
+        self.active_search_result = 0
+        if not self.search.strip():
+            return
+        # The shown collection may have been edited
+        store_edited_collection(self)
+        # Unloaded collections are searched without loading them
+        for asset in runtime_vars["library"].search(self.search, SEARCH_LIMIT):
+            result = self.search_results.add()
+            result.collection = asset.collection.name
+            result.asset = asset.name
+
+    search = StringProperty(
+        name="Search",
+        description="Find assets in all collections by name, group name or "
+                    "file path",
+        options={'TEXTEDIT_UPDATE', 'SKIP_SAVE'},
+        update=update_search,
+    )
+    search_results = CollectionProperty(
+        name="Search Results",
+        type=LinkTarget,
+        options={'SKIP_SAVE'},
+    )
+    active_search_result = IntProperty(
+        name="Selected Search Result",
+        options={'SKIP_SAVE'},
+    )
+
+    def update_show_previews(self, context):
+        if self.show_previews and not runtime_vars["previews_running"]:
+            bpy.ops.wm.powerlib_previews('INVOKE_DEFAULT')
+
+    show_previews = BoolProperty(
+        name="Show Previews",
+        description="Show a preview image of the assets, rendered in the "
+                    "background the first time an asset is shown",
+        default=False,
+        update=update_show_previews,
+    )
+
+    def update_preview_cache_size(self, context):
+        if runtime_vars["previews"] is not None:
+            cache = runtime_vars["previews"][0]
+            cache.max_bytes = self.preview_cache_size * 1024 * 1024
+            cache.evict()
+
+    preview_cache_size = IntProperty(
+        name="Preview Cache Size (MB)",
+        description="Size above which the least recently used previews are "
+                    "removed from the cache next to the library",
+        default=100,
+        min=1,
+        update=update_preview_cache_size,
+    )
+
+
+# Library Model ###############################################################
+
+# The library is kept in runtime_vars["library"] as a model.Library.
+# Only the assets of the shown collection are copied into PropertyGroups, the
+# other AssetCollections are kept empty. Edits made through the UI live in the
+# PropertyGroups until the collection is hidden again or the library is saved,
+# at which point they are written back into the model.
+
+def library_changed():
+    """Make the panel rebuild what it cached about the library"""
+    runtime_vars["library_generation"] += 1
+
+
+def fill_collection_props(col_prop, collection, lazy=True):
+    """Fill the assets of an AssetCollection from a model.Collection
+
+    :param lazy: when True, the groups of the components are only listed
+        for the active asset, see AssetItem.load_groups.
+    """
+    for _ in iter_fill_collection_props(col_prop, collection, lazy):
+        pass
+
+
+def iter_fill_collection_props(col_prop, collection, lazy=True, chunk_size=None):
+    """Generator version of fill_collection_props, yields after each chunk
+    of chunk_size assets, or once when chunk_size is None.
+    """
+    from . import linking
+
+    # Resolve the paths of all components up front, each directory of the
+    # library is listed once
+    with profiler.phase('resolve_paths'):
+        linking.library_paths().absolute_many(
+            component.filepath
+            for asset in collection.assets.values()
+            for component in asset.components())
+
+    col_prop.assets.clear()
+
+    # Assets, eg. Boris
+    asset_names = sorted(collection.assets.keys())
+    chunk_size = chunk_size or max(len(asset_names), 1)
+    for start in range(0, len(asset_names), chunk_size):
+        # Only while filling, other code may run between the chunks
+        runtime_vars["defer_groups"] = lazy
+        try:
+            for asset_name in asset_names[start:start + chunk_size]:
+                asset_prop = col_prop.assets.add()
+                fill_asset_props(asset_prop, collection.assets[asset_name])
+        finally:
+            runtime_vars["defer_groups"] = False
+        yield
+
+    if lazy:
+        col_prop.load_active_asset_groups()
+
+
+def fill_asset_props(asset_prop, asset):
+    """Fill an AssetItem from a model.Asset"""
+    from . import linking
+
+    asset_prop.name = asset.name
+    asset_prop.components_by_type.clear()
+
+    # Component Types, eg. instance_groups
+    for ctype_name, components in asset.components_by_type.items():
+        ctype_prop = asset_prop.components_by_type.add()
+        ctype_prop.name = ctype_name
+        ctype_prop.component_type = ctype_prop.getComponentType(ctype_name)
+
+        # Individual components of this type, each with filepath and name
+        for component in components:
+            component_prop = ctype_prop.components.add()
+            component_prop.name = component.id
+            component_prop.id = component.id
+            component_prop.filepath = component.filepath
+            absolute_filepath = component_prop.absolute_filepath
+            if absolute_filepath:
+                bf_rel_fp = linking.relative_path_to_file(absolute_filepath)
+            else:
+                bf_rel_fp = ''
+            component_prop.filepath_rel = bf_rel_fp
+
+
+def collection_props_to_dict(col_prop):
+    """Return the assets of an AssetCollection in the JSON schema"""
+    assets_json_dict = {}
+
+    # Assets, eg. Boris
+    for asset_name, asset_body in col_prop.assets.items():
+        comps_by_type_json_dict = {}
+
+        # Component Types, eg. instance_groups
+        for comp_type_name, comp_type_body in asset_body.components_by_type.items():
+            comps_by_type_json_dict[comp_type_name] = []
+
+            # Individual components of this type, each with filepath and name
+            for i in comp_type_body.components:
+                comps_by_type_json_dict[comp_type_name].append([
+                    i.filepath, i.id
+                ])
+
+        assets_json_dict[asset_name] = comps_by_type_json_dict
+    return assets_json_dict
+
+
+def store_shown_collection(props):
+    """Write the PropertyGroups of the shown collection back into the model"""
+    shown_col = runtime_vars["shown_col"]
+    runtime_vars["shown_edited"] = False
+    if not shown_col:
+        return
+    col_prop = props.collections.get(shown_col)
+    if col_prop is None:
+        return
+    if runtime_vars["library"].update_collection(
+            shown_col, collection_props_to_dict(col_prop)):
+        library_changed()
+
+
+def store_edited_collection(props):
+    """store_shown_collection, only if the PropertyGroups were edited since.
+    Cheap enough to call on every keystroke.
+    """
+    if runtime_vars["shown_edited"]:
+        store_shown_collection(props)
+
+
+def load_collections(names=None):
+    """Read the collections an SQLite library did not load yet.
+
+    :param names: the collections needed, all when None.
+    """
+    library = runtime_vars["library"]
+    store = runtime_vars["storage"]
+    if store is None:
+        return
+    names = library.unloaded.intersection(library.unloaded if names is None else names)
+    if not names:
+        return
+    with profiler.run('load_collection'):
+        for name in names:
+            library.load_collection(name, store.load_collection(name))
+
+
+def show_collection(props, name):
+    """Make `name` the collection whose assets are in the PropertyGroups"""
+    if name == runtime_vars["shown_col"] and name in props.collections:
+        return
+    if name not in props.collections:
+        # Only puts the shown collection away, not worth a profiled run
+        for _ in iter_show_collection(props, name):
+            pass
+        return
+    with profiler.run('show_collection'):
+        for _ in iter_show_collection(props, name):
+            pass
+
+
+def iter_show_collection(props, name, chunk_size=None):
+    """Generator version of show_collection, yields after each chunk of
+    chunk_size assets added to the PropertyGroups.
+    """
+    shown_col = runtime_vars["shown_col"]
+    if name == shown_col and name in props.collections:
+        return
+
+    store_shown_collection(props)
+    library_changed()
+    old_col_prop = props.collections.get(shown_col) if shown_col else None
+    if old_col_prop is not None:
+        old_col_prop.assets.clear()
+    runtime_vars["shown_col"] = ""
+
+    col_prop = props.collections.get(name) if name else None
+    load_collections([name])
+    collection = runtime_vars["library"].collections.get(name)
+    if col_prop is None or collection is None:
+        return
+
+    debug_print("PowerLib2: Showing collection %s" % name)
+    yield from iter_fill_collection_props(col_prop, collection, props.lazy_groups, chunk_size)
+    runtime_vars["shown_col"] = name
+    # Filling set the edited properties
+    runtime_vars["shown_edited"] = False
+
+    group_cache = runtime_vars["group_cache"]
+    group_cache.save()
+    debug_print("PowerLib2: ... group cache: {hits} hits, {misses} misses, "
+                "{entries} entries".format(**group_cache.stats()))
+
+
+def library_file_stat(library_path):
+    """Return what identifies a version of the library file on disk"""
+    try:
+        stat = os.stat(library_path)
+    except OSError:
+        return None
+    return (library_path, stat.st_mtime, stat.st_size)
+
+
+def apply_library_diff(props, diff, new_library):
+    """Apply a model.LibraryDiff to the model and the PropertyGroups.
+
+    Only what changed is touched, so the selection in the UI is kept.
+    """
+    shown_col = runtime_vars["shown_col"]
+
+    for name in diff.removed:
+        idx = props.collections.find(name)
+        if idx != -1:
+            props.collections.remove(idx)
+        if name == shown_col:
+            runtime_vars["shown_col"] = shown_col = ""
+    for name in diff.added:
+        props.collections.add().name = name
+
+    col_diff = diff.changed.get(shown_col)
+    if col_diff is not None:
+        col_prop = props.collections[shown_col]
+        new_collection = new_library.collections[shown_col]
+
+        active_asset = col_prop.active_asset
+        if 0 <= active_asset < len(col_prop.assets):
+            active_name = col_prop.assets[active_asset].name
+        else:
+            active_name = None
+
+        for asset_name in col_diff.removed:
+            idx = col_prop.assets.find(asset_name)
+            if idx != -1:
+                col_prop.assets.remove(idx)
+
+        # Only the edits made in the panel count as edits
+        edited = runtime_vars["shown_edited"]
+        runtime_vars["defer_groups"] = props.lazy_groups
+        try:
+            for asset_name in col_diff.changed:
+                asset_prop = col_prop.assets.get(asset_name)
+                if asset_prop is not None:
+                    fill_asset_props(asset_prop, new_collection.assets[asset_name])
+            # Keep the list sorted by name, as when filling the whole
+            # collection: only the added assets are moved into place
+            names = col_prop.assets.keys()
+            for asset_name in sorted(col_diff.added):
+                fill_asset_props(col_prop.assets.add(), new_collection.assets[asset_name])
+                to_idx = bisect_right(names, asset_name)
+                names.insert(to_idx, asset_name)
+                if to_idx != len(names) - 1:
+                    col_prop.assets.move(len(names) - 1, to_idx)
+        finally:
+            runtime_vars["defer_groups"] = False
+            runtime_vars["shown_edited"] = edited
+
+        if active_name is not None and active_name in col_prop.assets:
+            col_prop.active_asset = col_prop.assets.find(active_name)
+        else:
+            col_prop.active_asset = min(active_asset, len(col_prop.assets) - 1)
+        col_prop.load_active_asset_groups()
+
+    model.apply_diff(runtime_vars["library"], diff, new_library)
+    library_changed()
+
+    if not props.active_col or props.active_col not in props.collections:
+        props.active_col = next(iter(props.collections.keys()), "")
+
+
+def check_library_file(context):
+    """Apply the changes made to the library file since it was last read.
+
+    :returns: True if anything changed.
+    """
+    # Only JSON libraries are diffed, an SQLite library is read on demand
+    if runtime_vars["storage"] is not None:
+        return False
+
+    library_path = bpy.path.abspath(context.scene.lib_path)
+    stat = library_file_stat(library_path)
+    old_stat = runtime_vars["library_stat"]
+    if (stat is None or stat == old_stat
+            or runtime_vars["read_state"] == ReadState.Loading):
+        return False
+
+    if (old_stat is None or old_stat[0] != library_path
+            or runtime_vars["read_state"] not in {ReadState.AllGood, ReadState.EmptyLib}):
+        # Nothing to diff against
+        bpy.ops.wm.powerlib_reload_from_json()
+        return True
+
+    if runtime_vars["save_state"] == SaveState.HasUnsavedChanges:
+        debug_print("PowerLib2: Library changed on disk, keeping the unsaved edits")
+        return False
+
+    runtime_vars["library_stat"] = stat
+    try:
+        new_library = read_library_file(library_path)
+    except (OSError, ValueError) as ex:
+        # Possibly still being written, wait for the next change
+        debug_print("PowerLib2: ... can not read the changed library: {}".format(ex))
+        return False
+
+    diff = model.diff_libraries(runtime_vars["library"], new_library)
+    if not diff:
+        return False
+
+    debug_print("PowerLib2: Library changed on disk, applying the changes")
+    from . import linking
+    linking.library_paths().invalidate()
+    apply_library_diff(context.window_manager.powerlib_props, diff, new_library)
+    if runtime_vars["library"]:
+        runtime_vars["read_state"] = ReadState.AllGood
+    else:
+        runtime_vars["read_state"] = ReadState.EmptyLib
+    return True
+
+
+# Previews ####################################################################
+
+# Preview icons kept loaded, a few screens of the asset list
+MAX_PREVIEW_ICONS = 256
+
+
+def use_previews(library_path):
+    """Switch to the preview cache of a library, or to none if library_path
+    is None. Previews are only rendered when Blender has a user interface.
+    """
+    if runtime_vars["previews"] is not None:
+        runtime_vars["previews"][1].shutdown()
+    runtime_vars["previews"] = None
+    if runtime_vars["preview_icons"] is not None:
+        runtime_vars["preview_icons"].clear()
+    runtime_vars["preview_icon_keys"].clear()
+    runtime_vars["preview_sources"] = (None, {})
+    runtime_vars["preview_requested"].clear()
+
+    if library_path is None or bpy.app.background or not bpy.app.binary_path:
+        return
+    props = bpy.context.window_manager.powerlib_props
+    cache = previews.PreviewCache(
+        previews.cache_dir_for_library(library_path),
+        props.preview_cache_size * 1024 * 1024)
+    renderer = previews.PreviewRenderer(cache, bpy.app.binary_path)
+    runtime_vars["previews"] = (cache, renderer)
+
+
+def asset_preview_source(collection_name, asset_name):
+    """Return (key, abspath, group name) of the preview of an asset, or None.
+
+    The source files are only looked at once per library generation, rather
+    than on every redraw of the asset list.
+    """
+    generation, sources = runtime_vars["preview_sources"]
+    if generation != runtime_vars["library_generation"]:
+        sources = {}
+        runtime_vars["preview_sources"] = (runtime_vars["library_generation"], sources)
+
+    name = (collection_name, asset_name)
+    try:
+        return sources[name]
+    except KeyError:
+        pass
+
+    source = None
+    asset = runtime_vars["library"].find_asset(collection_name, asset_name)
+    # The first component shows what the asset is
+    component = next(iter(asset.components()), None) if asset is not None else None
+    if component is not None and component.id:
+        abspath = absolute_library_filepath(component.filepath)
+        if abspath is not None:
+            from . import linking
+            fingerprint = linking.source_fingerprint(abspath)
+            if fingerprint is not None:
+                source = (previews.preview_key(fingerprint, component.id),
+                          abspath, component.id)
+    sources[name] = source
+    return source
+
+
+def asset_preview_icon(collection_name, asset_name):
+    """Return the icon_id of the preview of an asset, 0 if there is none yet.
+
+    Only called for the rows the asset list draws, so only the previews of
+    visible assets are loaded, or requested from the renderer when they are
+    not in the cache. Beyond MAX_PREVIEW_ICONS, the icons drawn least recently
+    are released again.
+    """
+    icons = runtime_vars["preview_icons"]
+    if runtime_vars["previews"] is None or icons is None:
+        return 0
+    source = asset_preview_source(collection_name, asset_name)
+    if source is None:
+        return 0
+    key, abspath, group_name = source
+
+    icon_keys = runtime_vars["preview_icon_keys"]
+    icon = icons.get(key)
+    if icon is not None:
+        icon_keys.move_to_end(key)
+        return icon.icon_id
+    if key in runtime_vars["preview_requested"]:
+        return 0
+
+    cache, renderer = runtime_vars["previews"]
+    path = cache.get(key)
+    if path is None:
+        runtime_vars["preview_requested"].add(key)
+        renderer.request(abspath, group_name, key)
+        return 0
+
+    icon = icons.load(key, path, 'IMAGE')
+    icon_keys[key] = None
+    while len(icon_keys) > MAX_PREVIEW_ICONS:
+        old_key, _ = icon_keys.popitem(last=False)
+        if old_key in icons:
+            del icons[old_key]
+    return icon.icon_id
+
 
 # Operators ###################################################################
 
@@ -285,20 +982,131 @@ class ASSET_OT_powerlib_reload_from_json(Operator):
     bl_idname = "wm.powerlib_reload_from_json"
     bl_label = "Reload from JSON"
     bl_description = "Loads the library from the JSON file. Overrides non saved local edits!"
-    bl_options = {'UNDO', 'REGISTER'}
+    # No undo: the library is not stored in the blend file, and an undo push
+    # on reload would be as large as the file.
+    bl_options = {'REGISTER'}
+
+    # Collections, and assets of the active collection, added to the panel
+    # per modal step
+    chunk_size = 200
 
     @classmethod
     def poll(self, context):
         return True
 
     def execute(self, context):
-        from . import linking
-        import importlib
-        importlib.reload(linking)
+        with profiler.run('reload_from_json'):
+            return self.load(context)
+
+    def invoke(self, context, event):
+        """Read the library in a thread and fill the panel from a modal
+        timer, so that large libraries do not block the interface.
+        """
+        library_path = self.begin_load(context)
+        if library_path is None:
+            return {'FINISHED'}
 
+        # A newer reload makes this one give up, see modal
+        self._token = object()
+        runtime_vars["loading"] = self._token
+        runtime_vars["read_state"] = ReadState.Loading
+
+        # Profiled as one run, the steps in the thread then the modal ones
+        self._run = profiler.start('reload_from_json')
+        self._result = None
+        self._result_lock = threading.Lock()
+        self._thread = threading.Thread(
+            target=self.read_in_thread, args=(library_path,), daemon=True)
+        self._thread.start()
+        self._steps = None
+
+        wm = context.window_manager
+        self._timer = wm.event_timer_add(0.05, context.window)
+        wm.modal_handler_add(self)
+        return {'RUNNING_MODAL'}
+
+    def read_in_thread(self, library_path):
+        # The main thread only resumes the run once this one is done
+        with profiler.resume(self._run):
+            try:
+                result = self.read(library_path, search_index=True)
+            except ValueError as ex:
+                result = ex
+        with self._result_lock:
+            self._result = result
+        # A reload cancelled while reading leaves its result to this thread
+        if runtime_vars["loading"] is not self._token:
+            self.discard_result()
+
+    def discard_result(self):
+        """Close the LibraryStore of a read that is not applied. Called from
+        both threads, the lock makes sure that only one of them closes it.
+        """
+        with self._result_lock:
+            result, self._result = self._result, None
+        if isinstance(result, tuple) and result[-1] is not None:
+            result[-1].close()
+
+    def modal(self, context, event):
+        if runtime_vars["loading"] is not self._token:
+            return self.finish_modal(context, {'CANCELLED'})
+        if event.type != 'TIMER' or self._thread.is_alive():
+            return {'PASS_THROUGH'}
+
+        if self._steps is None:
+            if isinstance(self._result, ValueError):
+                debug_print("PowerLib2: ... JSON content is empty or malformed!")
+                runtime_vars["read_state"] = ReadState.FileContentInvalid
+                return self.finish_modal(context, {'FINISHED'})
+            # Keep the panel in the loading state until everything is there
+            self._steps = self.iter_apply(context, *self._result)
+
+        with profiler.resume(self._run):
+            done = next(self._steps, StopIteration) is StopIteration
+        if done:
+            return self.finish_modal(context, {'FINISHED'})
+        return {'PASS_THROUGH'}
+
+    def finish_modal(self, context, result):
+        if runtime_vars["loading"] is self._token:
+            runtime_vars["loading"] = None
+        if result == {'CANCELLED'} and self._steps is None:
+            # Once applied, the store is runtime_vars["storage"], closed by
+            # the next reload
+            self.discard_result()
+        # A cancelled reload is not recorded, its thread may still be reading
+        if result == {'FINISHED'}:
+            profiler.finish(self._run)
+        wm = context.window_manager
+        wm.event_timer_remove(self._timer)
+        if wm.powerlib_props.show_previews and not runtime_vars["previews_running"]:
+            bpy.ops.wm.powerlib_previews('INVOKE_DEFAULT')
+        if wm.powerlib_props.watch_library and not runtime_vars["watching"]:
+            bpy.ops.wm.powerlib_watch_library('INVOKE_DEFAULT')
+        for area in context.screen.areas:
+            if area.type == 'VIEW_3D':
+                area.tag_redraw()
+        return result
+
+    def begin_load(self, context):
+        """Forget the current library.
+
+        :returns: the absolute library path, or None if there is no file to
+            read (the read state says why).
+        """
         wm = context.window_manager
 
+        # Also makes a background reload in progress give up
+        runtime_vars["loading"] = None
+        use_previews(None)
+        library_changed()
+        if runtime_vars["storage"] is not None:
+            runtime_vars["storage"].close()
+            runtime_vars["storage"] = None
         wm.powerlib_props.collections.clear()
+        runtime_vars["shown_col"] = ""
+        runtime_vars["shown_edited"] = False
+        runtime_vars["library"] = model.Library()
         wm.powerlib_props.active_col = ""
         runtime_vars["save_state"] = SaveState.AllSaved
 
@@ -310,59 +1118,96 @@ class ASSET_OT_powerlib_reload_from_json(Operator):
         if not library_path:
             debug_print("PowerLib2: ... no library path specified!")
             runtime_vars["read_state"] = ReadState.NoFile
-            return {'FINISHED'}
+            return None
 
         if not os.path.exists(library_path):
             debug_print("PowerLib2: ... library filepath invalid!")
             runtime_vars["read_state"] = ReadState.FilePathInvalid
-            return {'FINISHED'}
+            return None
 
-        library = {}
+        return library_path
 
-        with open(library_path) as data_file:
-            try:
-                library = json.load(data_file)
-            except (json.decoder.JSONDecodeError, KeyError, ValueError):
-                # malformed json data
-                debug_print("PowerLib2: ... JSON content is empty or malformed!")
-                runtime_vars["read_state"] = ReadState.FileContentInvalid
-                return {'FINISHED'}
+    @staticmethod
+    def read(library_path, search_index=False):
+        """Read the library and its group cache, touches no Blender data so
+        it can run in a thread. Of an SQLite library only the collection
+        names are read, the collections are loaded when shown.
+
+        :param search_index: also build the search index of the library, for
+            a read in a thread. Otherwise the index is started in the
+            background by load().
+        :returns: (library_path, library, stat, group cache, LibraryStore
+            or None).
+        :raises ValueError: when the content is empty or malformed.
+        """
+        store = None
+        try:
+            if storage.is_sqlite_path(library_path):
+                with profiler.phase('read_sqlite_index'):
+                    store = storage.LibraryStore(library_path)
+                    library = store.read_index()
+                    # Edits are written one by one on save
+                    library.changes = []
+            else:
+                with profiler.phase('read_json'):
+                    library = read_library_file(library_path)
+            stat = library_file_stat(library_path)
+
+            with profiler.phase('group_cache_load'):
+                group_cache = groupcache.GroupCache(
+                    groupcache.store_path_for_library(library_path))
+                group_cache.load()
+
+            if search_index:
+                with profiler.phase('search_index'):
+                    library.build_search_index()
+        except Exception:
+            # Nobody else holds the store of a failed read
+            if store is not None:
+                store.close()
+            raise
+
+        return library_path, library, stat, group_cache, store
+
+    def iter_apply(self, context, library_path, library, stat, group_cache, store):
+        """Make a library read by read() the current one, yields after each
+        chunk of collections, then of assets of the first collection, added
+        to the panel.
+        """
+        wm = context.window_manager
+
+        runtime_vars["library"] = library
+        runtime_vars["library_stat"] = stat
+        runtime_vars["group_cache"] = group_cache
+        runtime_vars["storage"] = store
+        use_previews(library_path)
+
+        # Files may have been added to the library since it was last read
+        from . import linking
+        linking.library_paths().invalidate()
 
-        # Collections, eg. Characters
-        for collection_name in library:
+        # Collections, eg. Characters. Their assets are filled in on demand.
+        for index, collection_name in enumerate(library.collections):
             asset_collection_prop = wm.powerlib_props.collections.add()
             asset_collection_prop.name = collection_name
-
-            # Assets, eg. Boris
-            collection = library[collection_name]
-            for asset_name in sorted(collection.keys()):
-                asset_json = collection[asset_name]
-
-                asset_prop = asset_collection_prop.assets.add()
-                asset_prop.name = asset_name
-
-                # Component Types, eg. instance_groups
-                for ctype_name, ctype_components in asset_json.items():
-                    ctype_prop = asset_prop.components_by_type.add()
-                    ctype_prop.name = ctype_name
-                    ctype_prop.component_type = ctype_prop.getComponentType(ctype_name)
-
-                    # Individual components of this type, each with filepath and name
-                    for filepath, name in ctype_components:
-                        component_prop = ctype_prop.components.add()
-                        component_prop.name = name
-                        component_prop.id = name
-                        component_prop.filepath = filepath
-                        absolute_filepath = component_prop.absolute_filepath
-                        if absolute_filepath:
-                            bf_rel_fp = linking.relative_path_to_file(component_prop.absolute_filepath)
-                        else:
-                            bf_rel_fp = ''
-                        component_prop.filepath_rel = bf_rel_fp
+            if (index + 1) % self.chunk_size == 0:
+                library_changed()
+                yield
+        library_changed()
 
         if library:
-            # Assign some collection by default (dictionaries are unordered)
-            wm.powerlib_props.active_col = next(iter(library.keys()))
+            # Assign some collection by default (dictionaries are unordered).
+            # It is filled in chunks first, so that setting active_col does
+            # not fill it again in one go.
+            active_col = next(iter(library.collections.keys()))
+            steps = iter_show_collection(wm.powerlib_props, active_col, self.chunk_size)
+            while True:
+                with profiler.phase('show_collection'):
+                    done = next(steps, StopIteration) is StopIteration
+                if done:
+                    break
+                yield
+            wm.powerlib_props.active_col = active_col
 
             runtime_vars["read_state"] = ReadState.AllGood
         else:
@@ -370,9 +1215,104 @@ class ASSET_OT_powerlib_reload_from_json(Operator):
 
         debug_print("PowerLib2: ... looks good!")
 
+    def load(self, context):
+        library_path = self.begin_load(context)
+        if library_path is None:
+            return {'FINISHED'}
+
+        try:
+            result = self.read(library_path)
+        except ValueError:
+            # malformed json data
+            debug_print("PowerLib2: ... JSON content is empty or malformed!")
+            runtime_vars["read_state"] = ReadState.FileContentInvalid
+            return {'FINISHED'}
+
+        for _ in self.iter_apply(context, *result):
+            pass
+
+        # Rather than on the first keystroke of a search
+        if not bpy.app.background:
+            runtime_vars["library"].start_search_index()
+
         return {'FINISHED'}
 
 
+class ASSET_OT_powerlib_watch_library(Operator):
+    bl_idname = "wm.powerlib_watch_library"
+    bl_label = "Watch Library File"
+    bl_description = "Poll the library file and apply the changes made to it on disk"
+    bl_options = {'INTERNAL'}
+
+    # Seconds between checks of the library file's mtime
+    interval = 1.0
+
+    def invoke(self, context, event):
+        if runtime_vars["watching"]:
+            return {'CANCELLED'}
+
+        wm = context.window_manager
+        self._timer = wm.event_timer_add(self.interval, context.window)
+        wm.modal_handler_add(self)
+        runtime_vars["watching"] = True
+        return {'RUNNING_MODAL'}
+
+    def modal(self, context, event):
+        wm = context.window_manager
+        if not wm.powerlib_props.watch_library:
+            wm.event_timer_remove(self._timer)
+            runtime_vars["watching"] = False
+            return {'CANCELLED'}
+
+        if event.type == 'TIMER' and check_library_file(context):
+            for area in context.screen.areas:
+                if area.type == 'VIEW_3D':
+                    area.tag_redraw()
+
+        return {'PASS_THROUGH'}
+
+
+class ASSET_OT_powerlib_previews(Operator):
+    bl_idname = "wm.powerlib_previews"
+    bl_label = "Render Asset Previews"
+    bl_description = "Start the preview renders requested by the asset list " \
+                     "and show the finished previews"
+    bl_options = {'INTERNAL'}
+
+    # Seconds between checks of the renderer
+    interval = 0.5
+
+    def invoke(self, context, event):
+        if runtime_vars["previews_running"]:
+            return {'CANCELLED'}
+
+        wm = context.window_manager
+        self._timer = wm.event_timer_add(self.interval, context.window)
+        wm.modal_handler_add(self)
+        runtime_vars["previews_running"] = True
+        return {'RUNNING_MODAL'}
+
+    def modal(self, context, event):
+        wm = context.window_manager
+        if not wm.powerlib_props.show_previews:
+            wm.event_timer_remove(self._timer)
+            runtime_vars["previews_running"] = False
+            return {'CANCELLED'}
+
+        if event.type == 'TIMER' and runtime_vars["previews"] is not None:
+            cache, renderer = runtime_vars["previews"]
+            renderer.flush()
+            finished = renderer.take_finished()
+            if finished:
+                runtime_vars["preview_requested"].difference_update(finished)
+                cache.evict()
+                for area in context.screen.areas:
+                    if area.type == 'VIEW_3D':
+                        area.tag_redraw()
+
+        return {'PASS_THROUGH'}
+
+
 class ASSET_OT_powerlib_save_to_json(Operator):
     bl_idname = "wm.powerlib_save_to_json"
     bl_label = "Save to JSON"
@@ -381,7 +1321,8 @@ class ASSET_OT_powerlib_save_to_json(Operator):
 
     @classmethod
     def poll(self, context):
-        return True
+        # Saving a half loaded library would lose the rest of it
+        return runtime_vars["read_state"] != ReadState.Loading
 
     def execute(self, context):
         wm = context.window_manager
@@ -396,34 +1337,53 @@ class ASSET_OT_powerlib_save_to_json(Operator):
             self.report({'ERROR'}, "Invalid path! Could not save!")
             return {'FINISHED'}
 
-        collections_json_dict = {}
-
-        # Collections, eg. Characters
-        for collection in wm.powerlib_props.collections:
-            assets_json_dict = {}
+        # The shown collection may have been edited
+        store_shown_collection(wm.powerlib_props)
+        library = runtime_vars["library"]
 
-            # Assets, eg. Boris
-            for asset_name, asset_body in collection.assets.items():
-                comps_by_type_json_dict = {}
+        if runtime_vars["storage"] is not None:
+            # Only the edits are written, kept for the next save if it fails
+            try:
+                written = runtime_vars["storage"].apply_changes(library.changes)
+            except sqlite3.Error as ex:
+                debug_print("PowerLib2: ... could not write the edits: {}".format(ex))
+                self.report({'ERROR'}, "Could not save: {}".format(ex))
+                return {'CANCELLED'}
+            del library.changes[:]
+            debug_print("PowerLib2: ... {} edits written".format(written))
+        else:
+            with open(library_path, 'w') as data_file:
+                json.dump(library.to_dict(), data_file, indent=4, sort_keys=True,)
+        # Our own save is not an outside change for the library watcher
+        runtime_vars["library_stat"] = library_file_stat(library_path)
 
-                # Component Types, eg. instance_groups
-                for comp_type_name, comp_type_body in asset_body.components_by_type.items():
-                    comps_by_type_json_dict[comp_type_name] = []
+        runtime_vars["save_state"] = SaveState.AllSaved
+        debug_print("PowerLib2: ... no errors!")
+        return {'FINISHED'}
 
-                    # Individual components of this type, each with filepath and name
-                    for i in comp_type_body.components:
-                        comps_by_type_json_dict[comp_type_name].append([
-                            i.filepath, i.id
-                        ])
 
-                assets_json_dict[asset_name] = comps_by_type_json_dict
-            collections_json_dict[collection.name] = assets_json_dict
+class ASSET_OT_powerlib_search_jump(Operator):
+    bl_idname = "wm.powerlib_search_jump"
+    bl_label = "Show Asset"
+    bl_description = "Show the collection of this asset and select it"
+    bl_options = {'INTERNAL'}
 
-        with open(library_path, 'w') as data_file:
-            json.dump(collections_json_dict, data_file, indent=4, sort_keys=True,)
+    collection = StringProperty(name="Collection")
+    asset = StringProperty(name="Asset")
 
-        runtime_vars["save_state"] = SaveState.AllSaved
-        debug_print("PowerLib2: ... no errors!")
+    def execute(self, context):
+        props = context.window_manager.powerlib_props
+        if self.collection not in props.collections:
+            self.report({'WARNING'}, "No collection {}".format(self.collection))
+            return {'CANCELLED'}
+
+        props.active_col = self.collection
+        col_prop = props.collections[self.collection]
+        index = col_prop.assets.find(self.asset)
+        if index == -1:
+            self.report({'WARNING'}, "No asset {} in {}".format(self.asset, self.collection))
+            return {'CANCELLED'}
+        col_prop.active_asset = index
         return {'FINISHED'}
 
 
@@ -444,9 +1404,18 @@ class ASSET_OT_powerlib_collection_rename(ColRequiredOperator):
     def execute(self, context):
         wm = context.window_manager
         col = wm.powerlib_props.collections[wm.powerlib_props.active_col]
+        old_name = col.name
+        if self.name == old_name:
+            return {'CANCELLED'}
+        if not runtime_vars["library"].rename_collection(old_name, self.name):
+            self.report({'ERROR'}, "There is already a collection named {}".format(self.name))
+            return {'CANCELLED'}
         col.name = self.name
+        if runtime_vars["shown_col"] == old_name:
+            runtime_vars["shown_col"] = self.name
         wm.powerlib_props.active_col = self.name
 
+        library_changed()
         runtime_vars["save_state"] = SaveState.HasUnsavedChanges
         return {'FINISHED'}
 
@@ -467,7 +1436,9 @@ class ASSET_OT_powerlib_collection_add(Operator):
         wm = context.window_manager
         col = wm.powerlib_props.collections.add()
         col.name = self.name
+        runtime_vars["library"].add_collection(self.name)
         wm.powerlib_props.active_col = self.name
+        library_changed()
         runtime_vars["save_state"] = SaveState.HasUnsavedChanges
         return {'FINISHED'}
 
@@ -480,9 +1451,14 @@ class ASSET_OT_powerlib_collection_del(ColRequiredOperator):
 
     def execute(self, context):
         wm = context.window_manager
-        idx = wm.powerlib_props.collections.find(wm.powerlib_props.active_col)
+        active_col = wm.powerlib_props.active_col
+        idx = wm.powerlib_props.collections.find(active_col)
         wm.powerlib_props.collections.remove(idx)
+        runtime_vars["library"].remove_collection(active_col)
+        if runtime_vars["shown_col"] == active_col:
+            runtime_vars["shown_col"] = ""
         wm.powerlib_props.active_col = ""
+        library_changed()
         runtime_vars["save_state"] = SaveState.HasUnsavedChanges
         return {'FINISHED'}
 
@@ -505,6 +1481,8 @@ class ASSET_OT_powerlib_assetitem_add(ColRequiredOperator):
         # select newly created asset
         col.active_asset = len(col.assets) - 1
 
+        shown_collection_edited()
+        library_changed()
         runtime_vars["save_state"] = SaveState.HasUnsavedChanges
         return {'FINISHED'}
 
@@ -526,6 +1504,8 @@ class ASSET_OT_powerlib_assetitem_del(ColAndAssetRequiredOperator):
         if (col.active_asset > (num_assets - 1) and num_assets > 0):
             col.active_asset = num_assets - 1
 
+        shown_collection_edited()
+        library_changed()
         runtime_vars["save_state"] = SaveState.HasUnsavedChanges
         return {'FINISHED'}
 
@@ -568,6 +1548,8 @@ class ASSET_OT_powerlib_component_add(ColAndAssetRequiredOperator):
         # select newly created component
         components_of_type.active_component = len(components_of_type.components) - 1
 
+        shown_collection_edited()
+        library_changed()
         runtime_vars["save_state"] = SaveState.HasUnsavedChanges
         return {'FINISHED'}
 
@@ -602,14 +1584,38 @@ class ASSET_OT_powerlib_component_del(ColAndAssetRequiredOperator):
         elif (components_of_type.active_component > (num_components - 1) and num_components > 0):
             components_of_type.active_component = num_components - 1
 
+        shown_collection_edited()
+        library_changed()
         runtime_vars["save_state"] = SaveState.HasUnsavedChanges
         return {'FINISHED'}
 
 
 class AssetFiles():
-    def __init__(self):
-        self._components = {}
+    """Plan of what to link, keyed by file.
+
+    Every blend file is opened only once in process(), whatever the number
+    of assets and component types that need something from it.
+    """
+    def __init__(self, force=False, content_hash=False, purge=False):
+        """
+        :param force: also update the group reference objects whose source
+            file did not change since they were last updated.
+        :param content_hash: include a hash of the content in the source
+            file fingerprints, see linking.source_fingerprint.
+        :param purge: remove the orphan datablocks once the group reference
+            objects are updated, see purge.py.
+        """
+        # filepath -> component type -> list of ids
         self._files = {}
+        self.force = force
+        self.content_hash = content_hash
+        self.purge = purge
+        # purge.PurgeResult of the last process(), if it purged
+        self.purge_result = None
+        # GROUP_REFERENCE_OBJECTS ids skipped by the last process()
+        self.up_to_date = []
+        # Number of files linked from by the last process()
+        self.files_loaded = 0
 
     @staticmethod
     def get_nested_array(_dict, key, array):
@@ -617,32 +1623,198 @@ class AssetFiles():
             _dict[key] = array()
         return _dict[key]
 
-    def get_component(self, component_type):
-        return self.get_nested_array(self._components, component_type, dict)
+    def __len__(self):
+        return len(self._files)
 
     def add(self, component_type, filepath, _id):
-        """Populate the dictionary of lists"""
-        _component = self.get_component(component_type)
-        _file = self.get_nested_array(_component, filepath, list)
-        _file.append(_id)
+        """Populate the dictionary of lists.
+
+        An id added twice is instanced twice, like two assets using the same
+        group; the file is still opened and the group linked only once.
+        """
+        if filepath is None:
+            debug_print('Skipping {}, its file can not be found'.format(_id))
+            return
+        _file = self.get_nested_array(self._files, filepath, dict)
+        _ids = self.get_nested_array(_file, component_type, list)
+        _ids.append(_id)
+
+    def add_asset(self, asset):
+        """Add all components of a model.Asset"""
+        for type_name, components in asset.components_by_type.items():
+            component_type = ComponentsList.getComponentType(type_name)
+            for component in components:
+                self.add(component_type,
+                         absolute_library_filepath(component.filepath),
+                         component.id)
 
     def process(self):
         """handle the importing"""
-        callbacks = {
-                'GROUP_REFERENCE_OBJECTS': linking.load_group_reference_objects,
-                'INSTANCE_GROUPS': linking.load_instance_groups,
-                }
+        with profiler.run('link'):
+            self._process()
+
+    def _process(self):
+        for _ in self.iter_process():
+            pass
+
+    def iter_process(self, cancelled=None):
+        """Generator version of process, yields the fraction done after each
+        step, see ChunkedLinkOperator.
+
+        :param cancelled: function returning True when the remaining work
+            should be skipped, checked between files and between objects.
+        """
+        from . import linking
+
+        self.up_to_date = []
+        self.files_loaded = 0
+        self.purge_result = None
+        updated_references = False
+        # Objects dropped from the __REF groups, removed in one batch
+        removed = []
+        num_files = len(self._files)
+        for file_index, (_file, _components) in enumerate(self._files.items()):
+            if cancelled is not None and cancelled():
+                break
+
+            for _component in _components:
+                assert _component in {'GROUP_REFERENCE_OBJECTS', 'INSTANCE_GROUPS'}, \
+                    "Component \"{0}\" not supported".format(_component)
+
+            instance_ids = _components.get('INSTANCE_GROUPS', [])
+            # A reference group is updated once however many assets use it
+            reference_ids = list(OrderedDict.fromkeys(
+                _components.get('GROUP_REFERENCE_OBJECTS', [])))
+
+            # Group reference objects already updated from this version of
+            # the file need no relinking. Only files with reference groups
+            # are fingerprinted, which may hash their content.
+            fingerprint = None
+            if reference_ids and not self.force:
+                fingerprint = linking.source_fingerprint(_file, self.content_hash)
+                up_to_date = [_id for _id in reference_ids
+                              if linking.reference_group_up_to_date(_id, fingerprint)]
+                if up_to_date:
+                    debug_print('Up to date: {}'.format(up_to_date))
+                    profiler.count('up_to_date', len(up_to_date))
+                    self.up_to_date.extend(up_to_date)
+                    reference_ids = [_id for _id in reference_ids if _id not in up_to_date]
+            if not instance_ids and not reference_ids:
+                yield (file_index + 1) / num_files
+                continue
+
+            # One libraries.load for everything needed from this file
+            groups = linking.link_groups(_file, set(instance_ids) | set(reference_ids))
+            self.files_loaded += 1
+
+            linking.instance_groups(
+                groups[_id] for _id in instance_ids if _id in groups)
+
+            # Linked groups that are also instanced must not be removed
+            data = {}
+            for _id in reference_ids:
+                if _id not in groups:
+                    continue
+                data.update(linking.prepare_group_reference_objects(
+                    [groups[_id]], remove_linked=_id not in instance_ids, removed=removed))
+            yield file_index / num_files
+
+            for fraction in linking.iter_process_group_reference_objects(data, cancelled):
+                yield (file_index + fraction) / num_files
+            updated_references = updated_references or bool(data)
+
+            # Objects skipped by a cancel still need updating next time
+            if reference_ids and (cancelled is None or not cancelled()):
+                if fingerprint is None:
+                    fingerprint = linking.source_fingerprint(_file, self.content_hash)
+                for _id in reference_ids:
+                    if _id in groups:
+                        linking.set_reference_group_fingerprint(_id, fingerprint)
+
+        with profiler.phase('remove_objects'):
+            linking.remove_objects(removed)
+        if cancelled is not None and cancelled():
+            return
+
+        if self.purge and updated_references:
+            with profiler.phase('purge'):
+                self.purge_result = purge.purge_orphans()
+            debug_print(self.purge_result.summary())
+        yield 1.0
+
+
+class ChunkedLinkOperator:
+    """Mixin running AssetFiles.iter_process from a modal timer.
 
-        for _component, _files in self._components.items():
-            callback = callbacks.get(_component)
+    Each timer event processes steps for at most `slice_seconds`, so the
+    interface is redrawn and the progress shown in between. ESC skips the
+    remaining work, once the objects being linked are consistent. Other
+    events are swallowed while linking, nothing may change the scene under
+    our feet.
+    """
+    slice_seconds = 0.1
+
+    def start_chunked(self, context, files):
+        self._cancelled = False
+        self._files = files
+        self._steps = files.iter_process(cancelled=lambda: self._cancelled)
+        # One profiled run over all the modal steps
+        self._run = profiler.start('link')
+
+        wm = context.window_manager
+        wm.progress_begin(0, 100)
+        self._timer = wm.event_timer_add(0.01, context.window)
+        wm.modal_handler_add(self)
+        return {'RUNNING_MODAL'}
 
-            assert callback, "Component \"{0}\" not supported".format(_component)
+    def modal(self, context, event):
+        if event.type == 'ESC':
+            self._cancelled = True
+        if event.type != 'TIMER':
+            return {'RUNNING_MODAL'}
 
-            for _file, ids in _files.items():
-                callback(_file, ids)
+        wm = context.window_manager
+        deadline = time.perf_counter() + self.slice_seconds
+        try:
+            with profiler.resume(self._run):
+                for fraction in self._steps:
+                    wm.progress_update(int(fraction * 100))
+                    if time.perf_counter() >= deadline:
+                        return {'RUNNING_MODAL'}
+        except Exception:
+            self.finish_chunked(context)
+            raise
+
+        self.finish_chunked(context)
+        if self._cancelled:
+            self.report({'WARNING'}, "Linking cancelled, the remaining objects were skipped")
+        else:
+            self.report_up_to_date(self._files)
+        # Also when cancelled, what was linked so far gets an undo step
+        return {'FINISHED'}
+
+    def finish_chunked(self, context):
+        profiler.finish(self._run)
+        wm = context.window_manager
+        wm.event_timer_remove(self._timer)
+        wm.progress_end()
+
+    def report_up_to_date(self, files):
+        """Report the components skipped because their source did not
+        change, and what was purged afterwards.
+        """
+        if files.purge_result:
+            self.report({'INFO'}, files.purge_result.summary())
+        if not files.up_to_date:
+            return
+        if not files.files_loaded:
+            self.report({'INFO'}, "Up to date")
+        else:
+            self.report({'INFO'}, "{} groups already up to date".format(
+                len(files.up_to_date)))
 
 
-class ASSET_OT_powerlib_link_in_component(ColAndAssetRequiredOperator):
+class ASSET_OT_powerlib_link_in_component(ChunkedLinkOperator, ColAndAssetRequiredOperator):
     bl_idname = "wm.powerlib_link_in_component"
     bl_label = "TODO"
     bl_description = "TODO"
@@ -652,13 +1824,15 @@ class ASSET_OT_powerlib_link_in_component(ColAndAssetRequiredOperator):
             default=-1,
             options={'HIDDEN', 'SKIP_SAVE'},
             )
+    force = BoolProperty(
+            name="Force Update",
+            description="Also update the group reference objects whose "
+                        "source file did not change",
+            default=False,
+            options={'SKIP_SAVE'},
+            )
 
-    def execute(self, context):
-        from . import linking
-        if "bpy" in locals():
-            import importlib
-            importlib.reload(linking)
-
+    def asset_files(self, context):
         wm = context.window_manager
 
         asset_collection = wm.powerlib_props.collections[wm.powerlib_props.active_col]
@@ -670,7 +1844,8 @@ class ASSET_OT_powerlib_link_in_component(ColAndAssetRequiredOperator):
 
         debug_print('Linking in {}'.format(active_asset.name))
 
-        files = AssetFiles()
+        props = wm.powerlib_props
+        files = AssetFiles(self.force, props.hash_sources, props.purge_after_update)
 
         for component_list in active_asset.components_by_type:
             component_type = component_list.component_type
@@ -678,13 +1853,321 @@ class ASSET_OT_powerlib_link_in_component(ColAndAssetRequiredOperator):
             for component in component_list.components:
                 files.add(component_type, component.absolute_filepath, component.id)
 
+        return files
+
+    def invoke(self, context, event):
+        return self.start_chunked(context, self.asset_files(context))
+
+    def execute(self, context):
+        from . import linking
+        if "bpy" in locals():
+            import importlib
+            importlib.reload(linking)
+
+        files = self.asset_files(context)
         files.process()
+        self.report_up_to_date(files)
+
+        return {'FINISHED'}
+
+
+class ASSET_OT_powerlib_link_in_batch(ChunkedLinkOperator, ColRequiredOperator):
+    bl_idname = "wm.powerlib_link_in_batch"
+    bl_label = "Link Assets"
+    bl_description = "Link in several assets, opening each blend file only once"
+    bl_options = {'UNDO', 'REGISTER'}
+
+    targets = CollectionProperty(
+            type=LinkTarget,
+            options={'HIDDEN', 'SKIP_SAVE'},
+            )
+    whole_collection = BoolProperty(
+            name="Whole Collection",
+            description="Link all the assets of the active collection",
+            default=False,
+            options={'SKIP_SAVE'},
+            )
+    force = BoolProperty(
+            name="Force Update",
+            description="Also update the group reference objects whose "
+                        "source file did not change",
+            default=False,
+            options={'SKIP_SAVE'},
+            )
+
+    def assets_to_link(self, props):
+        """Return the model.Asset list to link in"""
+        library = runtime_vars["library"]
+
+        if self.targets:
+            load_collections(target.collection for target in self.targets)
+            assets = []
+            for target in self.targets:
+                collection = library.collections.get(target.collection)
+                if collection is None:
+                    self.report({'WARNING'}, "No collection {}".format(target.collection))
+                elif not target.asset:
+                    assets.extend(collection.assets.values())
+                elif target.asset in collection.assets:
+                    assets.append(collection.assets[target.asset])
+                else:
+                    self.report({'WARNING'}, "No asset {} in {}".format(
+                        target.asset, target.collection))
+            return assets
+
+        collection = library.collections[props.active_col]
+        if self.whole_collection:
+            return list(collection.assets.values())
+
+        col_prop = props.collections[props.active_col]
+        return [collection.assets[a.name] for a in col_prop.assets if a.select]
+
+    def asset_files(self, context):
+        """Return the AssetFiles to process, or None if there is nothing"""
+        props = context.window_manager.powerlib_props
+
+        # Plan from the model, which needs the edits of the shown collection
+        store_shown_collection(props)
+
+        assets = self.assets_to_link(props)
+        if not assets:
+            self.report({'INFO'}, "No assets to link")
+            return None
+
+        files = AssetFiles(self.force, props.hash_sources, props.purge_after_update)
+        for asset in assets:
+            debug_print('Linking in {}'.format(asset.name))
+            files.add_asset(asset)
+        return files
+
+    def invoke(self, context, event):
+        files = self.asset_files(context)
+        if files is None:
+            return {'CANCELLED'}
+        return self.start_chunked(context, files)
+
+    def execute(self, context):
+        files = self.asset_files(context)
+        if files is None:
+            return {'CANCELLED'}
+        files.process()
+
+        if files.files_loaded:
+            self.report({'INFO'}, "Linked assets from {} files".format(files.files_loaded))
+        self.report_up_to_date(files)
+        return {'FINISHED'}
+
+
+class ASSET_OT_powerlib_place_instances(ColAndAssetRequiredOperator):
+    bl_idname = "wm.powerlib_place_instances"
+    bl_label = "Place Instances"
+    bl_description = ("Instance the groups of the active asset many times, "
+                      "at the transforms read from a CSV file or at the "
+                      "vertices of a mesh")
+    bl_options = {'UNDO', 'REGISTER'}
+
+    source = EnumProperty(
+            name="Source",
+            items=(
+                ('CSV', "CSV File", "One transform per row: x, y, z "
+                 "[, rx, ry, rz in degrees [, sx, sy, sz]] or 16 matrix values"),
+                ('MESH', "Mesh Vertices", "One instance on each vertex of a mesh object"),
+            ),
+            default='CSV',
+            )
+    filepath = StringProperty(
+            name="CSV File",
+            subtype='FILE_PATH',
+            )
+    source_object = StringProperty(
+            name="Mesh Object",
+            description="Object whose vertices the instances are placed on",
+            )
+
+    def invoke(self, context, event):
+        return context.window_manager.invoke_props_dialog(self)
+
+    def draw(self, context):
+        layout = self.layout
+        layout.prop(self, "source", expand=True)
+        if self.source == 'CSV':
+            layout.prop(self, "filepath")
+        else:
+            layout.prop_search(self, "source_object", context.scene, "objects")
+
+    def matrices(self, context):
+        """Return the row-major matrices of the instances to place"""
+        if self.source == 'CSV':
+            return placement.matrices_from_csv(bpy.path.abspath(self.filepath))
+
+        ob = context.scene.objects.get(self.source_object)
+        if ob is None or ob.type != 'MESH':
+            raise ValueError("{} is not a mesh object".format(self.source_object))
+        vertices = ob.data.vertices
+        points = array('f', [0.0]) * (len(vertices) * 3)
+        vertices.foreach_get('co', points)
+        return placement.matrices_from_points(
+            placement.transform_points(points, ob.matrix_world))
+
+    def execute(self, context):
+        from . import linking
+
+        wm = context.window_manager
+        asset_collection = wm.powerlib_props.collections[wm.powerlib_props.active_col]
+        asset = asset_collection.assets[asset_collection.active_asset]
+
+        try:
+            count, flat = placement.flat_matrices(self.matrices(context))
+        except (OSError, ValueError) as ex:
+            self.report({'ERROR'}, str(ex))
+            return {'CANCELLED'}
+        if not count:
+            self.report({'WARNING'}, "No transforms to place instances at")
+            return {'CANCELLED'}
+
+        # Only the instanced groups of the asset make sense here
+        ids_by_file = {}
+        for component_list in asset.components_by_type:
+            if component_list.component_type != 'INSTANCE_GROUPS':
+                continue
+            for component in component_list.components:
+                filepath = component.absolute_filepath
+                if filepath is not None:
+                    ids_by_file.setdefault(filepath, set()).add(component.id)
+
+        num_instances = 0
+        with profiler.run('place_instances'):
+            for filepath, ids in ids_by_file.items():
+                groups = linking.link_groups(filepath, ids)
+                for group in groups.values():
+                    linking.instance_group_many(group, flat, count)
+                    num_instances += count
+
+        self.report({'INFO'}, "Placed {} instances".format(num_instances))
+        return {'FINISHED'}
+
+
+class ASSET_OT_powerlib_purge_orphans(Operator):
+    bl_idname = "wm.powerlib_purge_orphans"
+    bl_label = "Purge Orphans"
+    bl_description = ("Remove the datablocks nothing uses, the leftovers of "
+                      "reference object updates and the unused libraries")
+    bl_options = {'UNDO', 'REGISTER'}
+
+    dry_run = BoolProperty(
+            name="Dry Run",
+            description="Only report what would be removed",
+            default=False,
+            options={'SKIP_SAVE'},
+            )
+
+    def execute(self, context):
+        with profiler.run('purge'):
+            result = purge.purge_orphans(self.dry_run)
+            profiler.count('purged', result.total())
+
+        self.report({'INFO'}, result.summary(self.dry_run))
+        return {'FINISHED'} if result and not self.dry_run else {'CANCELLED'}
+
+
+class ASSET_OT_powerlib_validate_library(Operator):
+    bl_idname = "wm.powerlib_validate_library"
+    bl_label = "Validate Library"
+    bl_description = ("Check that the files and groups of all components exist, "
+                      "and look for duplicate assets")
+    bl_options = {'REGISTER'}
+
+    @classmethod
+    def poll(cls, context):
+        return runtime_vars["read_state"] == ReadState.AllGood
 
+    def execute(self, context):
+        props = context.window_manager.powerlib_props
+        # The shown collection may have been edited
+        store_shown_collection(props)
+        load_collections()
+
+        library_path = os.path.normpath(bpy.path.abspath(context.scene.lib_path))
+        group_cache = runtime_vars["group_cache"]
+
+        with profiler.run('validate'):
+            validator = validation.Validator(
+                runtime_vars["library"], library_path, group_cache)
+            report = validator.run()
+            group_cache.save()
+            profiler.count('components', report['summary']['components'])
+
+        report_path = validation.report_path_for_library(library_path)
+        try:
+            validation.write_report(report, report_path)
+            report['report_path'] = report_path
+        except OSError as ex:
+            self.report({'WARNING'}, "Could not write {}: {}".format(report_path, ex))
+        runtime_vars["validation"] = report
+
+        summary = report['summary']
+        self.report({'WARNING'} if summary['errors'] else {'INFO'},
+                    "{} errors, {} warnings in {} components".format(
+                        summary['errors'], summary['warnings'], summary['components']))
         return {'FINISHED'}
 
 
 # Panel #######################################################################
 
+# Label and icon of each component type
+component_type_labels = {
+    item[0]: (item[1], item[3]) for item in enum_component_type[1]['items']
+}
+
+
+class PanelModel:
+    """What ASSET_PT_powerlib draws, kept between redraws.
+
+    Items are stored by index, not as RNA references, which may not survive
+    changes to the PropertyGroups. The key tells what the model was built
+    from: the library generation, the active collection and the active asset.
+    """
+    __slots__ = ('key', 'collection_index', 'component_types')
+
+    def __init__(self, key, collection_index, component_types=()):
+        self.key = key
+        # Index of the active collection in powerlib_props.collections, or -1
+        self.collection_index = collection_index
+        # (index in components_by_type, label, icon) for the active asset
+        self.component_types = component_types
+
+
+def panel_model(props):
+    """Return the PanelModel of the current selection, rebuilt only when
+    the library or the selection changed.
+    """
+    generation = runtime_vars["library_generation"]
+    cached = runtime_vars["panel_model"]
+
+    if cached is None or cached.key[:2] != (generation, props.active_col):
+        collection_index = props.collections.find(props.active_col) if props.active_col else -1
+        cached = PanelModel((generation, props.active_col, None), collection_index)
+    if cached.collection_index == -1:
+        runtime_vars["panel_model"] = cached
+        return cached
+
+    asset_collection = props.collections[cached.collection_index]
+    active_asset = asset_collection.active_asset
+    if cached.key[2] != active_asset:
+        component_types = ()
+        if 0 <= active_asset < len(asset_collection.assets):
+            components_by_type = asset_collection.assets[active_asset].components_by_type
+            component_types = tuple(
+                (index,) + component_type_labels.get(
+                    components_of_type.component_type, ("Error", 'ERROR'))
+                for index, components_of_type in enumerate(components_by_type))
+        cached = PanelModel((generation, props.active_col, active_asset),
+                            cached.collection_index, component_types)
+
+    runtime_vars["panel_model"] = cached
+    return cached
+
+
 class ASSET_UL_asset_components(UIList):
     def draw_item(self, context, layout, data, item, icon, active_data, active_propname, index):
         is_edit_mode = context.window_manager.powerlib_props.is_edit_mode
@@ -695,19 +2178,63 @@ class ASSET_UL_asset_components(UIList):
 
 
 class ASSET_UL_collection_assets(UIList):
+    def filter_items(self, context, data, propname):
+        """Filter by name with the library's search index, see search.py"""
+        items = getattr(data, propname)
+        order = []
+        if self.use_filter_sort_alpha:
+            order = bpy.types.UI_UL_list.sort_items_by_name(items, "name")
+        if not self.filter_name:
+            return [], order
+
+        # Search the assets as they are in the list, added and renamed ones
+        # included. Storing an edit changes the library generation.
+        store_edited_collection(context.window_manager.powerlib_props)
+
+        # Redraws reuse the flags until the library or the filter changes
+        key = (runtime_vars["library_generation"], data.name, self.filter_name, len(items))
+        cached = runtime_vars["asset_filter"]
+        if cached is None or cached[0] != key:
+            names = {asset.name
+                     for asset in runtime_vars["library"].search(self.filter_name)
+                     if asset.collection.name == data.name}
+            flags = [self.bitflag_filter_item if item.name in names else 0
+                     for item in items]
+            cached = runtime_vars["asset_filter"] = (key, flags)
+        return cached[1], order
+
     def draw_item(self, context, layout, data, set, icon, active_data, active_propname, index):
         # layout.prop(set, "name", text="", icon='LINK_BLEND', emboss=False)
-        is_edit_mode = context.window_manager.powerlib_props.is_edit_mode
+        props = context.window_manager.powerlib_props
+        is_edit_mode = props.is_edit_mode
         col = layout.split()
-        col.prop(set, "name", text="", icon='LINK_BLEND', emboss=False)
+        icon_id = 0
+        if props.show_previews and not is_edit_mode:
+            icon_id = asset_preview_icon(runtime_vars["shown_col"], set.name)
+        if icon_id:
+            col.prop(set, "name", text="", icon_value=icon_id, emboss=False)
+        else:
+            col.prop(set, "name", text="", icon='LINK_BLEND', emboss=False)
         if is_edit_mode:
             return
         col = layout.split()
+        col.prop(set, "select", text="")
+        col = layout.split()
         col.enabled = True
         monkey = col.operator("wm.powerlib_link_in_component", text="", icon='MESH_MONKEY')
         monkey.index = index
 
 
+class ASSET_UL_search_results(UIList):
+    def draw_item(self, context, layout, data, item, icon, active_data, active_propname, index):
+        row = layout.row(align=True)
+        row.label(text=item.asset, icon='LINK_BLEND')
+        row.label(text=item.collection)
+        jump = row.operator("wm.powerlib_search_jump", text="", icon='VIEWZOOM')
+        jump.collection = item.collection
+        jump.asset = item.asset
+
+
 class ASSET_PT_powerlib(Panel):
     bl_label = 'Powerlib'       # panel section name
     bl_space_type = 'VIEW_3D'
@@ -740,6 +2267,17 @@ class ASSET_PT_powerlib(Panel):
         if is_edit_mode:
             row = layout.row()
             row.prop(scene, "lib_path", text="Library Path")
+            row = layout.row()
+            row.prop(wm.powerlib_props, "lazy_groups")
+            row = layout.row()
+            row.prop(wm.powerlib_props, "hash_sources")
+            row = layout.row()
+            row.prop(wm.powerlib_props, "purge_after_update")
+            row = layout.row()
+            row.prop(wm.powerlib_props, "show_previews")
+            row.prop(wm.powerlib_props, "preview_cache_size", text="Cache (MB)")
+            row = layout.row()
+            row.prop(wm.powerlib_props, "watch_library")
             layout.separator()
 
         # Fail report for library loading
@@ -771,9 +2309,13 @@ class ASSET_PT_powerlib(Panel):
                 row.label("The library is empty or corrupt!", icon='ERROR')
             elif (read_state == ReadState.EmptyLib and not is_edit_mode):
                 row.label("The chosen library is empty")
+            elif (read_state == ReadState.Loading):
+                row.label("Loading the library...", icon='TIME')
 
             return
 
+        view = panel_model(wm.powerlib_props)
+
         # Category selector
 
         row = layout.row(align=True)
@@ -788,11 +2330,27 @@ class ASSET_PT_powerlib(Panel):
             row.operator("wm.powerlib_collection_add", text="", icon='ZOOMIN')
             row.operator("wm.powerlib_collection_del", text="", icon='ZOOMOUT')
 
+        # Search over all collections
+
+        row = layout.row()
+        row.prop(wm.powerlib_props, "search", text="", icon='VIEWZOOM')
+        if wm.powerlib_props.search.strip():
+            row = layout.row()
+            if wm.powerlib_props.search_results:
+                row.template_list(
+                    "ASSET_UL_search_results", "",
+                    wm.powerlib_props, "search_results",
+                    wm.powerlib_props, "active_search_result",
+                    rows=4,
+                )
+            else:
+                row.label("No assets found")
+
         # UI List with the assets of the selected category
 
         row = layout.row()
-        if (wm.powerlib_props.active_col):
-            asset_collection = wm.powerlib_props.collections[wm.powerlib_props.active_col]
+        if view.collection_index != -1:
+            asset_collection = wm.powerlib_props.collections[view.collection_index]
             row.template_list(
                "ASSET_UL_collection_assets", "", # type and unique id
                 asset_collection, "assets",      # pointer to the CollectionProperty
@@ -805,21 +2363,28 @@ class ASSET_PT_powerlib(Panel):
                 col.operator("wm.powerlib_assetitem_add", icon='ZOOMIN', text="")
                 col.operator("wm.powerlib_assetitem_del", icon='ZOOMOUT', text="")
                 #col.menu("ASSET_MT_powerlib_assetlist_specials", icon='DOWNARROW_HLT', text="")
+            else:
+                row = layout.row(align=True)
+                row.operator("wm.powerlib_link_in_batch", text="Link Selected")
+                row.operator("wm.powerlib_link_in_batch", text="Link All").whole_collection = True
+                row = layout.row(align=True)
+                row.operator("wm.powerlib_place_instances", icon='PARTICLES')
+                row.operator("wm.powerlib_purge_orphans", icon='GHOST')
         else:
             row.enabled = False
             row.label("Choose an Asset Collection!")
 
         # Properties and Components of this Asset
 
-        if wm.powerlib_props.active_col:
+        if view.collection_index != -1:
             layout.separator()
 
-            if asset_collection.assets:
+            if view.component_types:
                 active_asset = asset_collection.assets[asset_collection.active_asset]
 
-                for components_of_type in active_asset.components_by_type:
+                for type_index, name, icon in view.component_types:
+                    components_of_type = active_asset.components_by_type[type_index]
                     row = layout.row()
-                    name, icon = enum_item_name_icon(enum_component_type, components_of_type.component_type)
                     row.label(text=name, icon=icon)
 
                     row = layout.row()
@@ -851,6 +2416,82 @@ class ASSET_PT_powerlib(Panel):
                 icon='ERROR' if runtime_vars["save_state"] == SaveState.HasUnsavedChanges else 'FILE_TICK')
 
 
+class ASSET_PT_powerlib_stats(Panel):
+    bl_label = 'Powerlib Stats'
+    bl_space_type = 'VIEW_3D'
+    bl_region_type = 'TOOLS'
+    bl_category = 'Powerlib'
+    bl_options = {'DEFAULT_CLOSED'}
+
+    def draw_header(self, context):
+        self.layout.prop(context.window_manager.powerlib_props, "profile", text="")
+
+    def draw(self, context):
+        props = context.window_manager.powerlib_props
+        layout = self.layout
+
+        col = layout.column()
+        col.active = props.profile
+        col.prop(props, "profile_history")
+        col.prop(props, "profile_trace_path")
+
+        row = layout.row()
+        row.label("Group cache: {hits} hits, {misses} misses".format(
+            **runtime_vars["group_cache"].stats()))
+
+        if not profiler.runs:
+            layout.label("No profiled runs")
+            return
+
+        # Most recent first
+        for run in reversed(profiler.runs):
+            box = layout.box()
+            row = box.row()
+            row.label(run.name, icon='TIME')
+            row.label("{:.1f} ms".format(run.duration * 1000.0))
+
+            col = box.column(align=True)
+            for phase, seconds in run.phases.items():
+                row = col.row()
+                row.label(phase)
+                row.label("{:.1f} ms".format(seconds * 1000.0))
+            for counter, amount in run.counts.items():
+                row = col.row()
+                row.label(counter)
+                row.label(str(amount))
+
+
+class ASSET_PT_powerlib_validation(Panel):
+    bl_label = 'Powerlib Validation'
+    bl_space_type = 'VIEW_3D'
+    bl_region_type = 'TOOLS'
+    bl_category = 'Powerlib'
+    bl_options = {'DEFAULT_CLOSED'}
+
+    def draw(self, context):
+        layout = self.layout
+        layout.operator("wm.powerlib_validate_library", icon='VIEWZOOM')
+
+        report = runtime_vars["validation"]
+        if report is None:
+            layout.label("Not validated yet")
+            return
+
+        summary = report['summary']
+        col = layout.column(align=True)
+        col.label("{} components in {} files".format(
+            summary['components'], summary['files']))
+        if not summary['issues']:
+            col.label("No issues", icon='FILE_TICK')
+        for kind, amount in sorted(summary['issues'].items()):
+            icon = 'ERROR' if validation.SEVERITIES[kind] == validation.ERROR else 'INFO'
+            row = col.row()
+            row.label(kind.replace('_', ' ').capitalize(), icon=icon)
+            row.label(str(amount))
+        if 'report_path' in report:
+            layout.label(bpy.path.basename(report['report_path']), icon='TEXT')
+
+
 # Registry ####################################################################
 
 classes = (
@@ -859,12 +2500,19 @@ classes = (
     ComponentsList,
     AssetItem,
     AssetCollection,
+    LinkTarget,
     PowerProperties,
     ASSET_UL_asset_components,
     ASSET_UL_collection_assets,
+    ASSET_UL_search_results,
     ASSET_PT_powerlib,
+    ASSET_PT_powerlib_stats,
+    ASSET_PT_powerlib_validation,
     ASSET_OT_powerlib_reload_from_json,
     ASSET_OT_powerlib_save_to_json,
+    ASSET_OT_powerlib_watch_library,
+    ASSET_OT_powerlib_previews,
+    ASSET_OT_powerlib_search_jump,
     ASSET_OT_powerlib_collection_rename,
     ASSET_OT_powerlib_collection_add,
     ASSET_OT_powerlib_collection_del,
@@ -873,18 +2521,50 @@ classes = (
     ASSET_OT_powerlib_component_add,
     ASSET_OT_powerlib_component_del,
     ASSET_OT_powerlib_link_in_component,
+    ASSET_OT_powerlib_link_in_batch,
+    ASSET_OT_powerlib_place_instances,
+    ASSET_OT_powerlib_purge_orphans,
+    ASSET_OT_powerlib_validate_library,
 )
 
 
+def reload_library():
+    """Reload the library, in the background when there is a window"""
+    if bpy.context.window is not None:
+        bpy.ops.wm.powerlib_reload_from_json('INVOKE_DEFAULT')
+    else:
+        bpy.ops.wm.powerlib_reload_from_json()
+
+
 def powerlib_lib_path_update_cb(self, context):
     debug_print("PowerLib2: Loading Add-on and Library")
-    bpy.ops.wm.powerlib_reload_from_json()
+    reload_library()
+
+
+@persistent
+def powerlib_load_post_cb(dummy):
+    # The component files may have changed while another file was open
+    from . import linking
+    linking.library_paths().invalidate()
+
+    # Loading a file ends the modal operators, they are started again once
+    # the library is reloaded
+    runtime_vars["previews_running"] = False
+    runtime_vars["watching"] = False
+
+    # Show the library of the file just opened
+    if not bpy.app.background:
+        reload_library()
 
 
 def register():
     for cls in classes:
         bpy.utils.register_class(cls)
 
+    bpy.app.handlers.load_post.append(powerlib_load_post_cb)
+
+    runtime_vars["preview_icons"] = bpy.utils.previews.new()
+
     bpy.types.WindowManager.powerlib_props = PointerProperty(
         name="Powerlib Add-on Properties",
         description="Properties and data used by the Powerlib Add-on",
@@ -893,13 +2573,20 @@ def register():
 
     bpy.types.Scene.lib_path = StringProperty(
         name="Powerlib Add-on Library Path",
-        description="Path to a PowerLib JSON file",
+        description="Path to a PowerLib JSON file, or an SQLite file "
+                    "(.sqlite, .sqlite3, .db) for very large libraries",
         subtype='FILE_PATH',
         update=powerlib_lib_path_update_cb,
     )
 
 
 def unregister():
+    bpy.app.handlers.load_post.remove(powerlib_load_post_cb)
+
+    use_previews(None)
+    bpy.utils.previews.remove(runtime_vars["preview_icons"])
+    runtime_vars["preview_icons"] = None
+
     del bpy.types.Scene.lib_path
     del bpy.types.WindowManager.powerlib_props
 
@@ -0,0 +1,213 @@
+# ***** BEGIN GPL LICENSE BLOCK *****
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software Foundation,
+# Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ***** END GPL LICENCE BLOCK *****
+
+# <pep8 compliant>
+
+"""Read-only queries over a library, for pipeline scripts.
+
+Inside Blender, snapshot() returns the library loaded by the add-on:
+
+    from powerlib import api
+    lib = api.snapshot()
+    for component in lib.components_in_file('./chars/boris.blend'):
+        print(component.collection, component.asset, component.group)
+
+Without Blender, with the add-on directory on sys.path:
+
+    import api
+    lib = api.load('/path/to/lib.json')  # or lib.sqlite
+    print(lib.collections_of_asset('Boris'))
+
+A Snapshot is immutable: records are named tuples, and lookups return
+tuples. Its indexes are built once, so every lookup is a dict access. The
+snapshot of the loaded library is rebuilt when the library changes, edits
+made in the panel count once they are saved or another collection is shown.
+"""
+
+import os
+from collections import namedtuple
+from types import MappingProxyType
+
+if __package__:
+    from . import storage
+else:
+    import storage
+
+
+ComponentInfo = namedtuple(
+    'ComponentInfo', 'collection asset type_name filepath group')
+ComponentInfo.__doc__ = """A component; filepath is relative to the library,
+as in the JSON, group is the group name (the component id)."""
+
+AssetInfo = namedtuple('AssetInfo', 'collection name components')
+AssetInfo.__doc__ = """An asset; components is a tuple of ComponentInfo."""
+
+
+def _freeze(index):
+    """Return a read-only view of a dict of lists, with tuple values"""
+    return MappingProxyType({key: tuple(values) for key, values in index.items()})
+
+
+class Snapshot:
+    """Immutable view of a library with forward and reverse indexes"""
+
+    __slots__ = ('library_path', '_collections', '_assets', '_by_file',
+                 '_by_group', '_by_type', '_by_asset_name')
+
+    def __init__(self, library, library_path=None):
+        """Build the snapshot of a model.Library.
+
+        :param library_path: absolute path of the library file, used to
+            look up files by absolute path.
+        """
+        self.library_path = library_path
+
+        collections = {}
+        assets = {}
+        by_file = {}
+        by_group = {}
+        by_type = {}
+        by_asset_name = {}
+
+        # model.Component -> ComponentInfo
+        infos = {}
+        for collection_name, collection in library.collections.items():
+            asset_names = []
+            for asset_name, asset in collection.assets.items():
+                components = []
+                for component in asset.components():
+                    component_info = infos[component] = ComponentInfo(
+                        collection_name, asset_name, component.type_name,
+                        component.filepath, component.id)
+                    components.append(component_info)
+                info = AssetInfo(collection_name, asset_name, tuple(components))
+                assets[collection_name, asset_name] = info
+                asset_names.append(asset_name)
+
+                groups = set()
+                for component in components:
+                    by_type.setdefault(component.type_name, []).append(component)
+                    groups.add(component.group)
+                for group in groups:
+                    by_group.setdefault(group, []).append(info)
+            collections[collection_name] = tuple(asset_names)
+
+        # The library indexes its assets by name and its components by file
+        # already
+        for asset_name, named_assets in library.assets_by_name.items():
+            by_asset_name[asset_name] = [asset.collection.name for asset in named_assets]
+        for filepath, file_components in library.components_by_file.items():
+            by_file.setdefault(self._file_key(filepath), []).extend(
+                infos[component] for component in file_components)
+
+        self._collections = MappingProxyType(collections)
+        self._assets = MappingProxyType(assets)
+        self._by_file = _freeze(by_file)
+        self._by_group = _freeze(by_group)
+        self._by_type = _freeze(by_type)
+        self._by_asset_name = _freeze(by_asset_name)
+
+    def __repr__(self):
+        return '<Snapshot {!r}: {} collections, {} assets>'.format(
+            self.library_path, len(self._collections), len(self._assets))
+
+    @staticmethod
+    def _file_key(filepath):
+        # './chars/boris.blend' and 'chars/boris.blend' are the same file
+        return os.path.normpath(filepath)
+
+    # Forward lookups
+
+    @property
+    def collections(self):
+        """Read-only mapping of collection name -> tuple of asset names"""
+        return self._collections
+
+    def asset(self, collection, name):
+        """Return the AssetInfo of an asset, or None"""
+        return self._assets.get((collection, name))
+
+    def assets(self):
+        """Iterate over the AssetInfo of all assets"""
+        return iter(self._assets.values())
+
+    def components_of_type(self, type_name):
+        """Return the components of a type, eg. 'instance_groups'"""
+        return self._by_type.get(type_name, ())
+
+    # Reverse lookups
+
+    def collections_of_asset(self, name):
+        """Return the names of the collections with an asset of this name"""
+        return self._by_asset_name.get(name, ())
+
+    def assets_using_group(self, group):
+        """Return the AssetInfo of the assets with a component of this group"""
+        return self._by_group.get(group, ())
+
+    def components_in_file(self, filepath):
+        """Return the components in a blend file.
+
+        :param filepath: path relative to the library, as in the JSON, or
+            absolute when the snapshot has a library_path.
+        """
+        if os.path.isabs(filepath) and self.library_path:
+            filepath = os.path.relpath(filepath, os.path.dirname(self.library_path))
+        return self._by_file.get(self._file_key(filepath), ())
+
+    def assets_using_file(self, filepath):
+        """Return the AssetInfo of the assets with a component in a file"""
+        seen = set()
+        assets = []
+        for component in self.components_in_file(filepath):
+            key = (component.collection, component.asset)
+            if key not in seen:
+                seen.add(key)
+                assets.append(self._assets[key])
+        return tuple(assets)
+
+
+def load(library_path):
+    """Return the Snapshot of a library file, JSON or SQLite, without Blender.
+
+    :raises ValueError: when the content is empty or malformed.
+    """
+    library_path = os.path.abspath(library_path)
+    return Snapshot(storage.read_library_file(library_path), library_path)
+
+
+# (library, generation, Snapshot) of the last snapshot() call
+_cache = None
+
+
+def snapshot():
+    """Return the Snapshot of the library loaded by the add-on, rebuilt only
+    when the library changed since the last call. Only inside Blender.
+    """
+    global _cache
+    import bpy
+    from . import runtime_vars, load_collections
+
+    # The collections of an SQLite library not shown yet
+    load_collections()
+    library = runtime_vars["library"]
+    generation = runtime_vars["library_generation"]
+    if _cache is None or _cache[0] is not library or _cache[1] != generation:
+        library_path = bpy.path.abspath(bpy.context.scene.lib_path) or None
+        _cache = (library, generation, Snapshot(library, library_path))
+    return _cache[2]
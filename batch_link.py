@@ -0,0 +1,239 @@
+# ***** BEGIN GPL LICENSE BLOCK *****
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software Foundation,
+# Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ***** END GPL LICENCE BLOCK *****
+
+# <pep8 compliant>
+
+"""Link assets into many shot files from the command line.
+
+Usage:
+    blender -b -P batch_link.py -- manifest.json [--jobs N] [--report report.json]
+
+The manifest is a JSON file:
+
+    {
+        "library": "/path/to/lib.json",
+        "jobs": 4,
+        "assets": [["Characters", "Boris"], ["Sets", ""]],
+        "shots": [
+            "/path/to/shot_010.blend",
+            {"file": "/path/to/shot_020.blend", "assets": [["Props", "chair"]]}
+        ]
+    }
+
+"assets" lists [collection, asset] pairs, an empty asset name meaning all
+assets of the collection. A shot can override the default asset list.
+
+Every shot file is opened by its own background Blender process, which links
+the assets with the add-on's AssetFiles/linking code and saves the file. At
+most "jobs" (or --jobs) processes run at the same time. A report with the
+outcome of each file is printed, and written to --report if given. The exit
+code is 1 if any file failed.
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import importlib
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+import bpy
+
+
+RESULT_PREFIX = 'POWERLIB_RESULT '
+
+
+def import_powerlib():
+    """Import the add-on package this script is part of"""
+    addon_dir = os.path.dirname(os.path.abspath(__file__))
+    parent_dir = os.path.dirname(addon_dir)
+    if parent_dir not in sys.path:
+        sys.path.insert(0, parent_dir)
+    return importlib.import_module(os.path.basename(addon_dir))
+
+
+# Worker ######################################################################
+
+def link_assets(library_path, asset_names):
+    """Link assets into the open file and save it.
+
+    :param asset_names: list of [collection, asset] pairs.
+    :returns: number of assets linked.
+    """
+    powerlib = import_powerlib()
+    library = powerlib.read_library_file(library_path)
+
+    assets = []
+    for collection_name, asset_name in asset_names:
+        collection = library.collections.get(collection_name)
+        if collection is None:
+            raise KeyError("No collection {}".format(collection_name))
+        if not asset_name:
+            assets.extend(collection.assets.values())
+        elif asset_name in collection.assets:
+            assets.append(collection.assets[asset_name])
+        else:
+            raise KeyError("No asset {} in {}".format(asset_name, collection_name))
+
+    # The component paths are resolved relative to the scene's library
+    scene = bpy.context.scene
+    old_lib_path = scene.get('lib_path')
+    scene['lib_path'] = library_path
+    try:
+        files = powerlib.AssetFiles()
+        for asset in assets:
+            files.add_asset(asset)
+        files.process()
+    finally:
+        if old_lib_path is None:
+            del scene['lib_path']
+        else:
+            scene['lib_path'] = old_lib_path
+
+    bpy.ops.wm.save_mainfile()
+    return len(assets)
+
+
+def run_worker(job):
+    """Entry point of the Blender process handling a single shot file"""
+    start = time.time()
+    result = {'file': bpy.data.filepath}
+    try:
+        result['assets'] = link_assets(job['library'], job['assets'])
+        result['ok'] = True
+    except Exception as ex:
+        import traceback
+        traceback.print_exc()
+        result['ok'] = False
+        result['error'] = '{}: {}'.format(type(ex).__name__, ex)
+    result['seconds'] = round(time.time() - start, 3)
+
+    print(RESULT_PREFIX + json.dumps(result))
+    sys.stdout.flush()
+
+
+# Manager #####################################################################
+
+def read_manifest(manifest_path):
+    with open(manifest_path) as manifest_file:
+        manifest = json.load(manifest_file)
+
+    base_dir = os.path.dirname(os.path.abspath(manifest_path))
+    library = os.path.join(base_dir, manifest['library'])
+    default_assets = manifest.get('assets', [])
+
+    jobs = []
+    for shot in manifest['shots']:
+        if isinstance(shot, str):
+            shot = {'file': shot}
+        jobs.append({
+            'file': os.path.join(base_dir, shot['file']),
+            'library': library,
+            'assets': shot.get('assets', default_assets),
+        })
+    return manifest, jobs
+
+
+def run_job(blender, job, timeout):
+    """Run a worker Blender process for a shot and return its result"""
+    cmd = [
+        blender, '-b', job['file'],
+        '-P', os.path.abspath(__file__),
+        '--', '--worker', json.dumps({'library': job['library'], 'assets': job['assets']}),
+    ]
+    start = time.time()
+    try:
+        proc = subprocess.run(
+            cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+            universal_newlines=True, timeout=timeout)
+    except subprocess.TimeoutExpired:
+        return {'file': job['file'], 'ok': False,
+                'error': 'Timed out after {} seconds'.format(timeout),
+                'seconds': round(time.time() - start, 3)}
+
+    for line in reversed(proc.stdout.splitlines()):
+        if line.startswith(RESULT_PREFIX):
+            result = json.loads(line[len(RESULT_PREFIX):])
+            result['file'] = job['file']
+            return result
+
+    # Blender died before reporting, eg. the file could not be opened
+    return {'file': job['file'], 'ok': False,
+            'error': 'Blender exited with code {}'.format(proc.returncode),
+            'output': proc.stdout.splitlines()[-20:],
+            'seconds': round(time.time() - start, 3)}
+
+
+def run_manager(args):
+    manifest, jobs = read_manifest(args.manifest)
+    max_jobs = args.jobs or manifest.get('jobs') or os.cpu_count() or 1
+    blender = args.blender or bpy.app.binary_path
+
+    print('PowerLib: linking into {} files with {} processes'.format(len(jobs), max_jobs))
+
+    results = []
+    with ThreadPoolExecutor(max_workers=max_jobs) as executor:
+        futures = [executor.submit(run_job, blender, job, args.timeout) for job in jobs]
+        for future in futures:
+            result = future.result()
+            results.append(result)
+            print('{:6}  {}{}'.format(
+                'OK' if result['ok'] else 'FAILED', result['file'],
+                '' if result['ok'] else '  ({})'.format(result['error'])))
+
+    failed = sum(1 for result in results if not result['ok'])
+    report = {
+        'library': jobs[0]['library'] if jobs else None,
+        'succeeded': len(results) - failed,
+        'failed': failed,
+        'files': results,
+    }
+    if args.report:
+        with open(args.report, 'w') as report_file:
+            json.dump(report, report_file, indent=4)
+
+    print('PowerLib: {} succeeded, {} failed'.format(report['succeeded'], failed))
+    return 1 if failed else 0
+
+
+def main(argv):
+    if argv[:1] == ['--worker']:
+        run_worker(json.loads(argv[1]))
+        return 0
+
+    parser = argparse.ArgumentParser(
+        prog='blender -b -P batch_link.py --',
+        description="Link powerlib assets into many shot files")
+    parser.add_argument('manifest', help="JSON manifest of shot files and assets")
+    parser.add_argument('--jobs', type=int, default=0,
+                        help="Maximum number of Blender processes at a time")
+    parser.add_argument('--blender', default='',
+                        help="Blender executable for the workers, "
+                             "defaults to the running one")
+    parser.add_argument('--timeout', type=float, default=None,
+                        help="Seconds after which a shot is given up")
+    parser.add_argument('--report', default='',
+                        help="Write the JSON report to this file")
+    return run_manager(parser.parse_args(argv))
+
+
+if __name__ == "__main__":
+    argv = sys.argv[sys.argv.index('--') + 1:] if '--' in sys.argv else []
+    sys.exit(main(argv))
@@ -0,0 +1,30 @@
+# ***** BEGIN GPL LICENSE BLOCK *****
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software Foundation,
+# Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ***** END GPL LICENCE BLOCK *****
+
+# <pep8 compliant>
+
+"""Benchmarks of the add-on's hot paths.
+
+    generate.py         synthetic lib.json and .blend files
+    bpy_stub.py         bpy stand-in, to import the add-on outside Blender
+    run.py              timed scenarios, run with `python -m benchmarks.run`
+                        from the add-on directory
+
+The bench_*.py scripts need a real Blender and are run with
+`blender -b -P benchmarks/bench_<name>.py -- ...`.
+"""
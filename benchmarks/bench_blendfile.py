@@ -0,0 +1,79 @@
+# ***** BEGIN GPL LICENSE BLOCK *****
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software Foundation,
+# Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ***** END GPL LICENCE BLOCK *****
+
+# <pep8 compliant>
+
+"""Compare blendfile.list_groups with bpy.data.libraries.load.
+
+Usage:
+    blender -b -P benchmarks/bench_blendfile.py -- [--repeat N] file.blend ...
+
+Prints one JSON object per file, with the file size, the number of groups
+and the best time of each method in milliseconds.
+"""
+
+import os
+import sys
+import json
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import blendfile
+
+import bpy
+
+
+def best_time(func, repeat):
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000.0, result
+
+
+def list_with_loader(filepath):
+    with bpy.data.libraries.load(filepath) as (data_from, data_to):
+        return list(data_from.groups)
+
+
+def main(args):
+    repeat = 5
+    if args[:1] == ['--repeat']:
+        repeat = int(args[1])
+        args = args[2:]
+
+    for filepath in args:
+        reader_ms, reader_groups = best_time(
+            lambda: blendfile.list_groups(filepath), repeat)
+        loader_ms, loader_groups = best_time(
+            lambda: list_with_loader(filepath), repeat)
+        print(json.dumps({
+            'file': filepath,
+            'size': os.path.getsize(filepath),
+            'groups': len(loader_groups),
+            'reader_ms': round(reader_ms, 3),
+            'libraries_load_ms': round(loader_ms, 3),
+            'same_result': sorted(reader_groups) == sorted(loader_groups),
+        }))
+
+
+if __name__ == "__main__":
+    argv = sys.argv[sys.argv.index('--') + 1:] if '--' in sys.argv else []
+    main(argv)
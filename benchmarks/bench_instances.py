@@ -0,0 +1,102 @@
+# ***** BEGIN GPL LICENSE BLOCK *****
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software Foundation,
+# Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ***** END GPL LICENCE BLOCK *****
+
+# <pep8 compliant>
+
+"""Time the placement of many group instances.
+
+Usage:
+    blender -b --factory-startup -P benchmarks/bench_instances.py -- [num_instances]
+
+A group is instanced `num_instances` times on a grid, once by setting
+matrix_world object by object, and once with linking.instance_group_many,
+which sets all matrices with one foreach_set call. Results are printed as
+one JSON object.
+"""
+
+import os
+import sys
+import json
+import time
+import importlib
+
+import bpy
+
+ADDON_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(ADDON_DIR))
+package = os.path.basename(ADDON_DIR)
+linking = importlib.import_module(package + '.linking')
+placement = importlib.import_module(package + '.placement')
+
+
+def grid_matrices(num_instances):
+    side = int(num_instances ** 0.5) + 1
+    return [placement.compose((i % side, i // side, 0.0)) for i in range(num_instances)]
+
+
+def per_object(group, matrices):
+    """The straightforward way: one matrix_world assignment per object"""
+    scene = bpy.context.scene
+    for matrix in matrices:
+        instance = bpy.data.objects.new(group.name, None)
+        instance.dupli_type = 'GROUP'
+        instance.dupli_group = group
+        scene.objects.link(instance)
+        instance.matrix_world = [tuple(row) for row in matrix]
+
+
+def main(num_instances):
+    bpy.ops.wm.read_homefile(use_empty=True)
+    group = bpy.data.groups.new('Crowd')
+    group.objects.link(bpy.data.objects.new('Member', bpy.data.meshes.new('Member')))
+
+    matrices = grid_matrices(num_instances)
+
+    start = time.perf_counter()
+    per_object(group, matrices)
+    per_object_s = time.perf_counter() - start
+
+    bpy.ops.wm.read_homefile(use_empty=True)
+    group = bpy.data.groups.new('Crowd')
+    group.objects.link(bpy.data.objects.new('Member', bpy.data.meshes.new('Member')))
+
+    start = time.perf_counter()
+    count, flat = placement.flat_matrices(matrices)
+    flatten_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    instances = linking.instance_group_many(group, flat, count)
+    bulk_s = time.perf_counter() - start
+
+    # The matrices must have landed on the right objects
+    last = instances[-1].matrix_world.translation
+    expected = matrices[-1]
+    assert abs(last.x - expected[0][3]) < 1e-4 and abs(last.y - expected[1][3]) < 1e-4
+
+    print(json.dumps({
+        'instances': num_instances,
+        'numpy': placement.numpy is not None,
+        'per_object_s': round(per_object_s, 4),
+        'flat_matrices_s': round(flatten_s, 4),
+        'instance_group_many_s': round(bulk_s, 4),
+    }))
+
+
+if __name__ == "__main__":
+    argv = sys.argv[sys.argv.index('--') + 1:] if '--' in sys.argv else []
+    main(int(argv[0]) if argv else 10000)
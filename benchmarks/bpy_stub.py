@@ -0,0 +1,522 @@
+# ***** BEGIN GPL LICENSE BLOCK *****
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software Foundation,
+# Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ***** END GPL LICENCE BLOCK *****
+
+# <pep8 compliant>
+
+"""Lightweight stand-in for the bpy module.
+
+Just enough of bpy to import the add-on's __init__.py and linking.py outside
+Blender and to run its Python-side hot paths: properties (with update
+callbacks), collection properties, operators called through bpy.ops, the
+path helpers, and a fake ID database for bpy.data.user_map.
+
+Nothing is drawn and nothing is linked; libraries.load yields empty data.
+Timings of code that goes through this stub measure the add-on's own Python
+work, not Blender's.
+"""
+
+import os
+import sys
+import types
+
+
+# Properties ##################################################################
+
+def _make_property(kind):
+    def prop(**kwargs):
+        # Blender 2.7x returns a (function, keywords) tuple until registration
+        return (prop, kwargs)
+    prop.__name__ = kind
+    prop.kind = kind
+    return prop
+
+
+BoolProperty = _make_property('BoolProperty')
+IntProperty = _make_property('IntProperty')
+FloatProperty = _make_property('FloatProperty')
+StringProperty = _make_property('StringProperty')
+EnumProperty = _make_property('EnumProperty')
+CollectionProperty = _make_property('CollectionProperty')
+PointerProperty = _make_property('PointerProperty')
+FloatVectorProperty = _make_property('FloatVectorProperty')
+
+_DEFAULTS = {
+    'BoolProperty': False,
+    'IntProperty': 0,
+    'FloatProperty': 0.0,
+    'StringProperty': '',
+}
+
+
+def _is_property(value):
+    return (isinstance(value, tuple) and len(value) == 2
+            and hasattr(value[0], 'kind'))
+
+
+def _default_value(func, kwargs):
+    if func is CollectionProperty:
+        return Collection(kwargs.get('type'))
+    if func is PointerProperty:
+        return kwargs['type']()
+    if 'default' in kwargs:
+        return kwargs['default']
+    if func is EnumProperty:
+        return kwargs['items'][0][0]
+    return _DEFAULTS.get(func.kind)
+
+
+class _Property:
+    """Descriptor standing in for a registered RNA property"""
+    __slots__ = ('name', 'func', 'kwargs', 'update')
+
+    def __init__(self, name, prop):
+        self.name = name
+        self.func, self.kwargs = prop
+        self.update = self.kwargs.get('update')
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+        values = instance._values
+        try:
+            return values[self.name]
+        except KeyError:
+            value = values[self.name] = _default_value(self.func, self.kwargs)
+            return value
+
+    def __set__(self, instance, value):
+        instance._values[self.name] = value
+        if self.update is not None:
+            self.update(instance, context)
+
+
+class _StructMeta(type):
+    """Turns the property tuples of a class into descriptors, also the ones
+    assigned later on, eg. bpy.types.Scene.lib_path = StringProperty().
+    """
+    def __init__(cls, name, bases, namespace):
+        super().__init__(name, bases, namespace)
+        for attr, value in namespace.items():
+            if _is_property(value):
+                type.__setattr__(cls, attr, _Property(attr, value))
+
+    def __setattr__(cls, attr, value):
+        if _is_property(value):
+            value = _Property(attr, value)
+        type.__setattr__(cls, attr, value)
+
+
+class StructBase(metaclass=_StructMeta):
+    """Instance side of a bpy_struct. The properties and the ID properties
+    (item access) are stored in one dict, like in Blender.
+    """
+    name = StringProperty()
+
+    def __init__(self):
+        self._values = {}
+
+    def __getitem__(self, key):
+        return self._values[key]
+
+    def __setitem__(self, key, value):
+        self._values[key] = value
+
+    def __delitem__(self, key):
+        del self._values[key]
+
+    def __contains__(self, key):
+        return key in self._values
+
+    def get(self, key, default=None):
+        return self._values.get(key, default)
+
+
+class Collection:
+    """bpy_prop_collection of PropertyGroups"""
+
+    def __init__(self, item_type):
+        self._type = item_type
+        self._items = []
+
+    def add(self):
+        item = self._type()
+        self._items.append(item)
+        return item
+
+    def clear(self):
+        del self._items[:]
+
+    def remove(self, index):
+        del self._items[index]
+
+    def move(self, from_index, to_index):
+        self._items.insert(to_index, self._items.pop(from_index))
+
+    def find(self, name):
+        for index, item in enumerate(self._items):
+            if item.name == name:
+                return index
+        return -1
+
+    def get(self, name, default=None):
+        index = self.find(name)
+        return default if index == -1 else self._items[index]
+
+    def keys(self):
+        return [item.name for item in self._items]
+
+    def values(self):
+        return list(self._items)
+
+    def items(self):
+        return [(item.name, item) for item in self._items]
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            index = self.find(key)
+            if index == -1:
+                raise KeyError(key)
+            return self._items[index]
+        return self._items[key]
+
+    def __contains__(self, name):
+        return self.find(name) != -1
+
+    def __iter__(self):
+        return iter(self._items)
+
+    def __len__(self):
+        return len(self._items)
+
+    def __bool__(self):
+        return bool(self._items)
+
+
+# Types #######################################################################
+
+class PropertyGroup(StructBase):
+    pass
+
+
+class Operator(StructBase):
+    def report(self, level, message):
+        pass
+
+
+class Panel(StructBase):
+    pass
+
+
+class Menu(StructBase):
+    pass
+
+
+class UIList(StructBase):
+    pass
+
+
+class UILayout:
+    """Layout that draws nothing. template_list calls the registered
+    UIList's draw_item for the rows a list of that height would show.
+    """
+    def __init__(self):
+        self.enabled = True
+        self.alignment = 'EXPAND'
+
+    def _sub(self, *args, **kwargs):
+        return UILayout()
+
+    row = column = split = box = _sub
+
+    def _item(self, *args, **kwargs):
+        pass
+
+    prop = prop_search = label = separator = _item
+
+    def operator(self, *args, **kwargs):
+        return types.SimpleNamespace()
+
+    def template_list(self, listtype_name, list_id, dataptr, propname,
+                      active_dataptr, active_propname, rows=5, **kwargs):
+        ui_list = _ui_lists[listtype_name]()
+        items = getattr(dataptr, propname)
+        active = getattr(active_dataptr, active_propname)
+        start = max(0, min(active, len(items) - rows))
+        for index in range(start, min(start + rows, len(items))):
+            ui_list.draw_item(context, UILayout(), dataptr, items[index], 0,
+                              active_dataptr, active_propname, index)
+
+
+class ID(StructBase):
+    library = None
+    users = 1
+    use_fake_user = False
+
+    def __init__(self, name=''):
+        super().__init__()
+        self.name = name
+
+    def make_local(self, clear_proxy=True):
+        self.library = None
+        return self
+
+
+class Mesh(ID):
+    pass
+
+
+class WindowManager(ID):
+    pass
+
+
+class Scene(ID):
+    pass
+
+
+# Operators ###################################################################
+
+_operators = {}
+_ui_lists = {}
+
+
+class _OperatorCall:
+    def __init__(self, cls):
+        self._cls = cls
+
+    def __call__(self, *args, **kwargs):
+        op = self._cls()
+        for key, value in kwargs.items():
+            setattr(op, key, value)
+        if args and args[0] == 'INVOKE_DEFAULT' and hasattr(op, 'invoke'):
+            return op.invoke(context, None)
+        return op.execute(context)
+
+
+class _OperatorModule:
+    def __init__(self, prefix):
+        self._prefix = prefix
+
+    def __getattr__(self, name):
+        cls = _operators.get('{}.{}'.format(self._prefix, name))
+        if cls is None:
+            # Blender operators the add-on calls, they do nothing here
+            return lambda *args, **kwargs: {'FINISHED'}
+        return _OperatorCall(cls)
+
+
+class _Ops:
+    def __getattr__(self, prefix):
+        return _OperatorModule(prefix)
+
+
+def register_class(cls):
+    idname = getattr(cls, 'bl_idname', None)
+    if idname and issubclass(cls, Operator):
+        _operators[idname] = cls
+    if issubclass(cls, UIList):
+        _ui_lists[cls.__name__] = cls
+
+
+def unregister_class(cls):
+    idname = getattr(cls, 'bl_idname', None)
+    _operators.pop(idname, None)
+
+
+class ImagePreview:
+    def __init__(self, icon_id):
+        self.icon_id = icon_id
+
+
+class ImagePreviewCollection(dict):
+    def load(self, name, filepath, filetype):
+        self[name] = preview = ImagePreview(len(self) + 1)
+        return preview
+
+    def close(self):
+        self.clear()
+
+
+# Data ########################################################################
+
+class IDCollection(list):
+    def get(self, key, default=None):
+        for item in self:
+            if item.name == key:
+                return item
+        return default
+
+    def __getitem__(self, key):
+        if isinstance(key, (str, tuple)):
+            if isinstance(key, tuple):
+                key, library = key
+            for item in self:
+                if item.name == key:
+                    return item
+            raise KeyError(key)
+        return list.__getitem__(self, key)
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def remove(self, item, do_unlink=False):
+        list.remove(self, item)
+
+
+class _LibraryLoad:
+    def __init__(self, filepath, link=False, relative=False):
+        self.filepath = filepath
+
+    def __enter__(self):
+        self.data_from = types.SimpleNamespace(groups=[], objects=[])
+        self.data_to = types.SimpleNamespace(groups=[], objects=[])
+        return self.data_from, self.data_to
+
+    def __exit__(self, *args):
+        self.data_to.groups = [None for _ in self.data_to.groups]
+        return False
+
+
+class BlendData:
+    def __init__(self):
+        self.filepath = ''
+        self.groups = IDCollection()
+        self.objects = IDCollection()
+        self.meshes = IDCollection()
+        self.materials = IDCollection()
+        self.libraries = types.SimpleNamespace(load=_LibraryLoad)
+        # idblock -> idblocks it uses, the source for user_map
+        self.uses = {}
+
+    def user_map(self, subset=None, key_types=None, value_types=None):
+        """Like bpy.data.user_map, scans every datablock on each call"""
+        keys = set(self.uses) if subset is None else set(subset)
+        result = {key: set() for key in keys}
+        for idblock, used in self.uses.items():
+            for used_id in used:
+                if used_id in result:
+                    result[used_id].add(idblock)
+        return result
+
+
+# Paths #######################################################################
+
+def _blend_dir():
+    return os.path.dirname(data.filepath)
+
+
+def abspath(path, start=None, library=None):
+    if path.startswith('//'):
+        return os.path.join(start or _blend_dir(), path[2:])
+    return path
+
+
+def relpath(path, start=None):
+    if path.startswith('//'):
+        return path
+    start = start or _blend_dir()
+    if not start:
+        return path
+    return '//' + os.path.relpath(path, start)
+
+
+# Module setup ################################################################
+
+data = BlendData()
+context = types.SimpleNamespace(
+    window_manager=WindowManager(),
+    scene=Scene(),
+    window=None,
+    screen=None,
+)
+ops = _Ops()
+
+
+def reset():
+    """Start again from an empty file"""
+    global data
+    data = BlendData()
+    context.window_manager = WindowManager()
+    context.scene = Scene()
+    _module.data = data
+    _module.path.data = data
+
+
+def install():
+    """Make `import bpy` (and its submodules) return this stub"""
+    if 'bpy' in sys.modules and sys.modules['bpy'] is _module:
+        return _module
+
+    bpy_types = types.ModuleType('bpy.types')
+    for cls in (PropertyGroup, Operator, Panel, Menu, UIList, ID, Mesh,
+                WindowManager, Scene):
+        setattr(bpy_types, cls.__name__, cls)
+
+    bpy_props = types.ModuleType('bpy.props')
+    for prop in (BoolProperty, IntProperty, FloatProperty, StringProperty,
+                 EnumProperty, CollectionProperty, PointerProperty,
+                 FloatVectorProperty):
+        setattr(bpy_props, prop.kind, prop)
+
+    bpy_path = types.ModuleType('bpy.path')
+    bpy_path.abspath = abspath
+    bpy_path.relpath = relpath
+    bpy_path.basename = os.path.basename
+    bpy_path.data = data
+
+    bpy_handlers = types.ModuleType('bpy.app.handlers')
+    bpy_handlers.persistent = lambda func: func
+    bpy_handlers.load_post = []
+    bpy_handlers.save_post = []
+
+    bpy_app = types.ModuleType('bpy.app')
+    bpy_app.handlers = bpy_handlers
+    bpy_app.binary_path = ''
+    bpy_app.background = True
+    bpy_app.version = (2, 78, 0)
+
+    bpy_utils = types.ModuleType('bpy.utils')
+    bpy_utils.register_class = register_class
+    bpy_utils.unregister_class = unregister_class
+
+    bpy_utils_previews = types.ModuleType('bpy.utils.previews')
+    bpy_utils_previews.new = ImagePreviewCollection
+    bpy_utils_previews.remove = ImagePreviewCollection.close
+    bpy_utils.previews = bpy_utils_previews
+
+    _module.types = bpy_types
+    _module.props = bpy_props
+    _module.path = bpy_path
+    _module.app = bpy_app
+    _module.utils = bpy_utils
+    _module.data = data
+    _module.context = context
+    _module.ops = ops
+
+    sys.modules['bpy'] = _module
+    sys.modules['bpy.types'] = bpy_types
+    sys.modules['bpy.props'] = bpy_props
+    sys.modules['bpy.path'] = bpy_path
+    sys.modules['bpy.app'] = bpy_app
+    sys.modules['bpy.app.handlers'] = bpy_handlers
+    sys.modules['bpy.utils'] = bpy_utils
+    sys.modules['bpy.utils.previews'] = bpy_utils_previews
+    return _module
+
+
+_module = types.ModuleType('bpy')
+_module.reset = reset
@@ -0,0 +1,132 @@
+# ***** BEGIN GPL LICENSE BLOCK *****
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software Foundation,
+# Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ***** END GPL LICENCE BLOCK *****
+
+# <pep8 compliant>
+
+"""Generators of synthetic libraries and blend files.
+
+Usage:
+    python -m benchmarks.generate lib.json [--collections N] [--assets M] [--components K]
+"""
+
+import gzip
+import json
+import struct
+import argparse
+
+
+def generate_library(num_collections, num_assets, num_components, num_shared_files=100):
+    """Return a library dict in the lib.json schema.
+
+    Every asset gets `num_components` instance_groups components in files of
+    its own, and one group_reference_objects component in one of
+    `num_shared_files` set files, so files are shared between assets.
+    """
+    library = {}
+    for c in range(num_collections):
+        collection = library['Collection{:03d}'.format(c)] = {}
+        for a in range(num_assets):
+            asset_name = 'Asset{:05d}'.format(a)
+            collection[asset_name] = {
+                'instance_groups': [
+                    ['./col{:03d}/{}_{}.blend'.format(c, asset_name, k), 'Group{}'.format(k)]
+                    for k in range(num_components)
+                ],
+                'group_reference_objects': [
+                    ['./sets/set{:03d}.blend'.format(a % num_shared_files), 'Ref{}'.format(a)],
+                ],
+            }
+    return library
+
+
+def write_library(filepath, num_collections, num_assets, num_components):
+    library = generate_library(num_collections, num_assets, num_components)
+    with open(filepath, 'w') as library_file:
+        json.dump(library, library_file, indent=4, sort_keys=True)
+    return library
+
+
+def _pad4(data):
+    return data + b'\0' * (-len(data) % 4)
+
+
+def blend_file_bytes(group_names, filler_blocks=0, filler_size=4096,
+                     pointer_size=8, big_endian=False):
+    """Return the content of a minimal blend file with the given groups.
+
+    Only the header, a "GR" block per group, `filler_blocks` data blocks,
+    a DNA1 block describing struct ID and ENDB are written. That is all
+    blendfile.py reads; Blender itself would not open such a file.
+    """
+    e = '>' if big_endian else '<'
+    pointer = 'I' if pointer_size == 4 else 'Q'
+
+    names = ['*next', '*prev', '*newid', '*lib', 'name[66]']
+    types = ['char', 'ID']
+    id_size = 4 * pointer_size + 66
+
+    sdna = b'SDNA'
+    sdna += b'NAME' + struct.pack(e + 'i', len(names))
+    sdna += _pad4(b''.join(n.encode() + b'\0' for n in names))
+    sdna += b'TYPE' + struct.pack(e + 'i', len(types))
+    sdna += _pad4(b''.join(t.encode() + b'\0' for t in types))
+    sdna += b'TLEN' + _pad4(struct.pack(e + 'hh', 1, id_size))
+    fields = []
+    for index in range(len(names)):
+        fields += [0, index]
+    sdna += b'STRC' + struct.pack(e + 'i', 1) + struct.pack(e + 'hh', 1, len(names))
+    sdna += struct.pack(e + '{}h'.format(len(fields)), *fields)
+
+    def block(code, data):
+        data = _pad4(data)
+        return struct.pack(e + '4si' + pointer + 'ii', code, len(data), 0, 0, 1) + data
+
+    chunks = [b'BLENDER' + (b'_' if pointer_size == 4 else b'-')
+              + (b'V' if big_endian else b'v') + b'278']
+    filler = block(b'DATA', b'\0' * filler_size)
+    chunks.extend(filler for _ in range(filler_blocks))
+    for group_name in group_names:
+        data = bytearray(id_size + 64)
+        name = b'GR' + group_name.encode('utf-8')
+        data[4 * pointer_size:4 * pointer_size + len(name)] = name
+        chunks.append(block(b'GR\0\0', bytes(data)))
+    chunks.append(block(b'DNA1', sdna))
+    chunks.append(block(b'ENDB', b''))
+    return b''.join(chunks)
+
+
+def write_blend(filepath, group_names, compress=False, **kwargs):
+    data = blend_file_bytes(group_names, **kwargs)
+    if compress:
+        data = gzip.compress(data)
+    with open(filepath, 'wb') as blend_file:
+        blend_file.write(data)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write a synthetic lib.json")
+    parser.add_argument('output')
+    parser.add_argument('--collections', type=int, default=20)
+    parser.add_argument('--assets', type=int, default=500)
+    parser.add_argument('--components', type=int, default=3)
+    args = parser.parse_args()
+    write_library(args.output, args.collections, args.assets, args.components)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,441 @@
+# ***** BEGIN GPL LICENSE BLOCK *****
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software Foundation,
+# Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ***** END GPL LICENCE BLOCK *****
+
+# <pep8 compliant>
+
+"""Timed scenarios of the add-on's hot paths, outside Blender.
+
+Usage, from the add-on directory:
+    python -m benchmarks.run [--output results.json] [--compare old.json]
+                             [--only NAME ...] [size options]
+
+The results are written as JSON, together with the git commit, so runs on
+different commits can be compared with --compare.
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import importlib
+import subprocess
+
+from . import bpy_stub
+from . import generate
+
+
+ADDON_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def import_addon():
+    """Import the add-on package on top of the bpy stub"""
+    bpy = bpy_stub.install()
+    parent_dir = os.path.dirname(ADDON_DIR)
+    if parent_dir not in sys.path:
+        sys.path.insert(0, parent_dir)
+    addon = importlib.import_module(os.path.basename(ADDON_DIR))
+    addon.register()
+    linking = importlib.import_module(addon.__name__ + '.linking')
+    return bpy, addon, linking
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', 'HEAD'], cwd=ADDON_DIR,
+            stderr=subprocess.DEVNULL, universal_newlines=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def measure(func, repeat, setup=None):
+    """Return the best and median time of func() over `repeat` runs"""
+    times = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    times.sort()
+    return {
+        'best_s': times[0],
+        'median_s': times[len(times) // 2],
+        'repeat': repeat,
+    }
+
+
+# Scenarios ###################################################################
+
+class Scenarios:
+    def __init__(self, args, workdir):
+        self.args = args
+        self.workdir = workdir
+        self.bpy, self.addon, self.linking = import_addon()
+
+        self.lib_path = os.path.join(workdir, 'lib.json')
+        generate.write_library(
+            self.lib_path, args.collections, args.assets, args.components)
+        self.num_components = args.collections * args.assets * (args.components + 1)
+
+    def use_library(self):
+        self.bpy.reset()
+        self.addon.register()
+        self.bpy.context.scene['lib_path'] = self.lib_path
+
+    def reload_op(self):
+        return self.addon.ASSET_OT_powerlib_reload_from_json().execute(self.bpy.context)
+
+    def bench_reload_from_json(self):
+        """Read the library and fill the shown collection"""
+        self.use_library()
+        result = measure(self.reload_op, self.args.repeat)
+        result['components'] = self.num_components
+        return result
+
+    def bench_save_to_json(self):
+        """Write the whole library back to JSON"""
+        self.use_library()
+        self.reload_op()
+        save = self.addon.ASSET_OT_powerlib_save_to_json()
+        result = measure(lambda: save.execute(self.bpy.context), self.args.repeat)
+        result['components'] = self.num_components
+        return result
+
+    def bench_reload_from_sqlite(self):
+        """Read the same library from SQLite, filling only the shown collection"""
+        storage = importlib.import_module(self.addon.__name__ + '.storage')
+        lib_path = os.path.join(self.workdir, 'lib.sqlite')
+        if not os.path.exists(lib_path):
+            store = storage.LibraryStore(lib_path)
+            store.import_dict(generate.generate_library(
+                self.args.collections, self.args.assets, self.args.components))
+            store.close()
+        self.bpy.reset()
+        self.addon.register()
+        self.bpy.context.scene['lib_path'] = lib_path
+        result = measure(self.reload_op, self.args.repeat)
+        result['components'] = self.num_components
+        return result
+
+    def bench_name_new_item(self):
+        """Pick a free name in a collection of many "NewAsset.###" items"""
+        self.use_library()
+        items = bpy_stub.Collection(self.bpy.types.PropertyGroup)
+        items.add().name = 'NewAsset'
+        for index in range(1, self.args.assets):
+            items.add().name = 'NewAsset.{:03d}'.format(index)
+        name_new_item = self.addon.ColRequiredOperator.name_new_item
+        result = measure(lambda: name_new_item(items, 'NewAsset'), self.args.repeat)
+        result['items'] = len(items)
+        return result
+
+    def bench_asset_files_plan(self):
+        """Plan the link of every asset of the library"""
+        self.use_library()
+        self.reload_op()
+        library = self.addon.runtime_vars['library']
+        assets = [asset
+                  for collection in library.collections.values()
+                  for asset in collection.assets.values()]
+
+        def plan():
+            files = self.addon.AssetFiles()
+            for asset in assets:
+                files.add_asset(asset)
+
+        result = measure(plan, self.args.repeat)
+        result['assets'] = len(assets)
+        return result
+
+    def bench_validate_library(self):
+        """Validate every component of the library"""
+        self.use_library()
+        self.reload_op()
+        validation = importlib.import_module(self.addon.__name__ + '.validation')
+        library = self.addon.runtime_vars['library']
+        result = measure(
+            lambda: validation.Validator(library, self.lib_path).run(), self.args.repeat)
+        result['components'] = self.num_components
+        return result
+
+    def bench_placement_from_csv(self):
+        """Read 10k instance transforms from CSV and flatten them"""
+        placement = importlib.import_module(self.addon.__name__ + '.placement')
+        filepath = os.path.join(self.workdir, 'crowd.csv')
+        with open(filepath, 'w') as csv_file:
+            csv_file.write('x,y,z,rx,ry,rz\n')
+            for i in range(10000):
+                csv_file.write('{},{},0,0,0,{}\n'.format(i % 100, i // 100, i % 360))
+
+        result = measure(
+            lambda: placement.flat_matrices(placement.matrices_from_csv(filepath)),
+            self.args.repeat)
+        result['instances'] = 10000
+        return result
+
+    def bench_panel_redraw(self):
+        """Redraw the panel showing a collection of 10k assets"""
+        lib_path = os.path.join(self.workdir, 'big_collection.json')
+        generate.write_library(lib_path, 1, 10000, self.args.components)
+        self.bpy.reset()
+        self.addon.register()
+        self.bpy.context.scene['lib_path'] = lib_path
+        self.reload_op()
+
+        props = self.bpy.context.window_manager.powerlib_props
+        asset_collection = props.collections[props.active_col]
+        asset_collection.active_asset = len(asset_collection.assets) // 2
+        panel = self.addon.ASSET_PT_powerlib()
+
+        def redraw():
+            for _ in range(100):
+                panel.layout = bpy_stub.UILayout()
+                panel.draw(self.bpy.context)
+
+        result = measure(redraw, self.args.repeat)
+        result['redraws'] = 100
+        result['assets'] = len(asset_collection.assets)
+        return result
+
+    SEARCH_QUERIES = ['asset00042', 'set017 ref', 'group2', 'col003 asset004']
+
+    def _search_keystrokes(self):
+        return [query[:end] for query in self.SEARCH_QUERIES
+                for end in range(1, len(query) + 1)]
+
+    def bench_search_keystrokes(self):
+        """Search 100k assets after each keystroke of a few queries"""
+        model = importlib.import_module(self.addon.__name__ + '.model')
+        library = model.Library.from_dict(
+            generate.generate_library(100, 1000, self.args.components))
+
+        start = time.perf_counter()
+        library.build_search_index()
+        build_s = time.perf_counter() - start
+
+        keystrokes = self._search_keystrokes()
+
+        def type_queries():
+            for keystroke in keystrokes:
+                library.search(keystroke, limit=100)
+
+        result = measure(type_queries, self.args.repeat)
+        result['assets'] = 100 * 1000
+        result['keystrokes'] = len(keystrokes)
+        result['per_keystroke_ms'] = result['best_s'] / len(keystrokes) * 1000
+        result['index_build_s'] = build_s
+        return result
+
+    def bench_search_field_keystrokes(self):
+        """Type the same queries in the search field of the panel, which
+        shows a collection of 10k assets, over 100k assets
+        """
+        lib_path = os.path.join(self.workdir, 'search_library.json')
+        generate.write_library(lib_path, 10, 10000, self.args.components)
+        self.bpy.reset()
+        self.addon.register()
+        self.bpy.context.scene['lib_path'] = lib_path
+        self.reload_op()
+        props = self.bpy.context.window_manager.powerlib_props
+        # The index is built by the first search
+        props.search = 'asset'
+
+        keystrokes = self._search_keystrokes()
+
+        def type_queries():
+            # Each assignment runs the update callback, like typing does
+            for keystroke in keystrokes:
+                props.search = keystroke
+
+        result = measure(type_queries, self.args.repeat)
+        result['assets'] = 10 * 10000
+        result['keystrokes'] = len(keystrokes)
+        result['per_keystroke_ms'] = result['best_s'] / len(keystrokes) * 1000
+        return result
+
+    def _generate_rig(self):
+        """Fill the stub's user_map source with a rig: a material used by
+        meshes, used by objects in parent chains, used by a group and the
+        scene. All but the scene are linked from a library.
+        """
+        data = self.bpy.data
+        ID = self.bpy.types.ID
+        num_objects = self.args.rig_objects
+        library = ID('rig.blend')
+
+        material = ID('Material')
+        meshes = [ID('Mesh.{:04d}'.format(i)) for i in range(max(1, num_objects // 10))]
+        group = ID('Group')
+        scene = ID('Scene')
+
+        data.uses = {material: set(), group: set(), scene: set()}
+        for mesh in meshes:
+            data.uses[mesh] = {material}
+        parent = None
+        for i in range(num_objects):
+            ob = ID('Ob.{:05d}'.format(i))
+            used = {meshes[i % len(meshes)]}
+            if parent is not None and i % 50:
+                used.add(parent)
+            data.uses[ob] = used
+            data.uses[group].add(ob)
+            data.uses[scene].add(ob)
+            parent = ob
+        for idblock in data.uses:
+            if idblock is not scene:
+                idblock.library = library
+        return material
+
+    def bench_bottom_up_from_idblock(self):
+        """Order a rig for make_local with a single user_map call"""
+        self.bpy.reset()
+        root = self._generate_rig()
+        result = measure(
+            lambda: list(self.linking.bottom_up_from_idblock(root)), self.args.repeat)
+        result['datablocks'] = len(self.bpy.data.uses)
+        return result
+
+    def bench_bottom_up_per_node_user_map(self):
+        """Reference: the same order with one user_map call per datablock"""
+        self.bpy.reset()
+        root = self._generate_rig()
+        data = self.bpy.data
+
+        def per_node():
+            visited = set()
+            order = []
+            stack = [(root, None)]
+            while stack:
+                idblock, users = stack.pop()
+                if users is None:
+                    if idblock in visited:
+                        continue
+                    visited.add(idblock)
+                    users = iter(data.user_map([idblock])[idblock])
+                for user in users:
+                    if user not in visited:
+                        stack.append((idblock, users))
+                        stack.append((user, None))
+                        break
+                else:
+                    order.append(idblock)
+            return order
+
+        result = measure(per_node, max(1, self.args.repeat // 5))
+        result['datablocks'] = len(data.uses)
+        return result
+
+    def bench_make_local_all(self):
+        """Make a linked rig local, ordered with a single user_map call"""
+        rig = {}
+
+        def setup():
+            self.bpy.reset()
+            rig['root'] = self._generate_rig()
+
+        result = measure(
+            lambda: self.linking.make_local_all([rig['root']]), self.args.repeat, setup)
+        result['datablocks'] = len(self.bpy.data.uses)
+        return result
+
+    def bench_blendfile_list_groups(self):
+        """List the groups of a synthetic ~40 MB blend file"""
+        blendfile = importlib.import_module(self.addon.__name__ + '.blendfile')
+        filepath = os.path.join(self.workdir, 'big.blend')
+        generate.write_blend(
+            filepath, ['Group{}'.format(i) for i in range(200)],
+            filler_blocks=10000, filler_size=4096)
+        result = measure(lambda: blendfile.list_groups(filepath), self.args.repeat)
+        result['bytes'] = os.path.getsize(filepath)
+        return result
+
+    def all(self):
+        return sorted(name[len('bench_'):] for name in dir(self)
+                      if name.startswith('bench_'))
+
+    def run(self, name):
+        return getattr(self, 'bench_' + name)()
+
+
+# Main ########################################################################
+
+def compare(results, old_path):
+    with open(old_path) as old_file:
+        old = json.load(old_file)
+    old_results = old.get('results', {})
+
+    print('\nCompared to {} ({}):'.format(old_path, old.get('commit')))
+    for name, result in sorted(results.items()):
+        if name not in old_results:
+            continue
+        ratio = result['best_s'] / old_results[name]['best_s']
+        print('  {:36} {:6.2f}x {}'.format(
+            name, ratio, 'slower' if ratio > 1.0 else 'faster'))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.run')
+    parser.add_argument('--output', default='', help="Write the results to this JSON file")
+    parser.add_argument('--compare', default='', help="Compare with a previous results file")
+    parser.add_argument('--only', nargs='*', default=[], help="Scenarios to run")
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--collections', type=int, default=20)
+    parser.add_argument('--assets', type=int, default=500)
+    parser.add_argument('--components', type=int, default=3)
+    parser.add_argument('--rig-objects', type=int, default=1000)
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix='powerlib-bench-')
+    try:
+        scenarios = Scenarios(args, workdir)
+        results = {}
+        for name in args.only or scenarios.all():
+            results[name] = result = scenarios.run(name)
+            print('{:36} best {:9.4f} s   median {:9.4f} s'.format(
+                name, result['best_s'], result['median_s']))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        'commit': git_commit(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'params': {
+            'collections': args.collections,
+            'assets': args.assets,
+            'components': args.components,
+            'rig_objects': args.rig_objects,
+        },
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            json.dump(report, output_file, indent=4, sort_keys=True)
+    if args.compare:
+        compare(results, args.compare)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
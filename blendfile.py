@@ -0,0 +1,229 @@
+# ***** BEGIN GPL LICENSE BLOCK *****
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software Foundation,
+# Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ***** END GPL LICENCE BLOCK *****
+
+# <pep8 compliant>
+
+"""Minimal reader for the names of the ID blocks in a .blend file.
+
+Only the file-block headers, the ID names and the SDNA block are read, the
+data itself is never decoded. This is enough to list the groups of a file
+without going through bpy.data.libraries.load, so it also works from worker
+threads and from plain Python processes.
+
+File layout, as far as this module is concerned:
+
+    header      "BLENDER" + pointer size ('_' = 4, '-' = 8)
+                + endianness ('v' = little, 'V' = big) + version ("278")
+    blocks      code (4 bytes), data length (int), old pointer,
+                SDNA index (int), count (int), followed by the data.
+                ID blocks (eg. code "GR" for groups) start with struct ID.
+    "DNA1"      the SDNA block, describing the layout of all structs.
+    "ENDB"      end of file.
+
+The offset of ID.name is looked up in the SDNA, like Blender does, since it
+differs between Blender versions.
+
+This module does not depend on bpy.
+"""
+
+import gzip
+import mmap
+import zlib
+import struct
+
+
+class BlendFileError(Exception):
+    pass
+
+
+GZIP_MAGIC = b'\x1f\x8b'
+ZSTD_MAGIC = b'\x28\xb5\x2f\xfd'
+
+ID_NAME_LENGTH = 66
+
+
+def _read_data(fileobj):
+    """Return a buffer with the uncompressed file content.
+
+    Uncompressed files are memory-mapped, gzip compressed files have to be
+    decompressed into memory.
+    """
+    magic = fileobj.read(4)
+    fileobj.seek(0)
+    if magic.startswith(GZIP_MAGIC):
+        try:
+            with gzip.GzipFile(fileobj=fileobj) as gzfile:
+                return gzfile.read()
+        except (OSError, EOFError, zlib.error) as ex:
+            # Truncated or corrupt, like a bad uncompressed file
+            raise BlendFileError("Corrupt gzip compressed blend file: {}".format(ex))
+    if magic == ZSTD_MAGIC:
+        raise BlendFileError("Zstandard compressed blend files are not supported")
+    try:
+        return mmap.mmap(fileobj.fileno(), 0, access=mmap.ACCESS_READ)
+    except ValueError:
+        # Empty file, can not be mapped
+        return b''
+
+
+def _parse_header(data):
+    if len(data) < 12 or data[:7] != b'BLENDER':
+        raise BlendFileError("Not a blend file")
+
+    pointer_size = {b'_': 4, b'-': 8}.get(data[7:8])
+    endian = {b'v': '<', b'V': '>'}.get(data[8:9])
+    if pointer_size is None or endian is None:
+        raise BlendFileError("Unsupported blend file header: {!r}".format(data[:12]))
+    return pointer_size, endian
+
+
+def _iter_blocks(data, pointer_size, endian):
+    """Yield (code, data offset, data length) for each file-block"""
+    header = struct.Struct(endian + '4si' + ('I' if pointer_size == 4 else 'Q') + 'ii')
+    offset = 12
+    end = len(data)
+    while offset + header.size <= end:
+        code, length, _old, _sdna, _count = header.unpack_from(data, offset)
+        offset += header.size
+        if code == b'ENDB':
+            return
+        if length < 0 or offset + length > end:
+            raise BlendFileError("Truncated block {!r}".format(code))
+        yield code, offset, length
+        offset += length
+    raise BlendFileError("Missing ENDB block")
+
+
+def _align4(offset, base):
+    """Align to 4 bytes, relative to the start of the SDNA block"""
+    return base + ((offset - base + 3) & ~3)
+
+
+def _read_strings(data, offset, count, base):
+    strings = []
+    for _ in range(count):
+        nul = data.find(b'\0', offset)
+        if nul == -1:
+            raise BlendFileError("Corrupt SDNA block")
+        strings.append(bytes(data[offset:nul]).decode('ascii', 'replace'))
+        offset = nul + 1
+    return strings, _align4(offset, base)
+
+
+def _expect(data, offset, tag):
+    if data[offset:offset + 4] != tag:
+        raise BlendFileError("Corrupt SDNA block, expected {!r}".format(tag))
+    return offset + 4
+
+
+def _field_size(name, type_length, pointer_size):
+    """Size in bytes of a struct field, eg. "*next", "name[66]", "mat[4][4]" """
+    if name.startswith('*') or name.startswith('(*'):
+        size = pointer_size
+    else:
+        size = type_length
+
+    for part in name.split('[')[1:]:
+        size *= int(part.rstrip(']'))
+    return size
+
+
+def _id_name_offset(data, offset, pointer_size, endian):
+    """Parse the SDNA block at `offset` and return the offset of ID.name"""
+    int_s = struct.Struct(endian + 'i')
+    base = offset
+
+    offset = _expect(data, offset, b'SDNA')
+    offset = _expect(data, offset, b'NAME')
+    count, = int_s.unpack_from(data, offset)
+    names, offset = _read_strings(data, offset + 4, count, base)
+
+    offset = _expect(data, offset, b'TYPE')
+    count, = int_s.unpack_from(data, offset)
+    types, offset = _read_strings(data, offset + 4, count, base)
+
+    offset = _expect(data, offset, b'TLEN')
+    lengths = struct.unpack_from(endian + '{}h'.format(len(types)), data, offset)
+    offset = _align4(offset + 2 * len(types), base)
+
+    offset = _expect(data, offset, b'STRC')
+    count, = int_s.unpack_from(data, offset)
+    offset += 4
+    for _ in range(count):
+        type_index, num_fields = struct.unpack_from(endian + 'hh', data, offset)
+        offset += 4
+        fields = struct.unpack_from(endian + '{}h'.format(2 * num_fields), data, offset)
+        offset += 4 * num_fields
+        if types[type_index] != 'ID':
+            continue
+
+        field_offset = 0
+        for field_type, field_name in zip(fields[0::2], fields[1::2]):
+            name = names[field_name]
+            if name.startswith('name['):
+                return field_offset
+            field_offset += _field_size(name, lengths[field_type], pointer_size)
+        break
+
+    raise BlendFileError("No ID.name in the SDNA")
+
+
+def list_ids(filepath, code=b'GR'):
+    """Return the names of the local ID blocks with the given block code.
+
+    :param filepath: path of the blend file.
+    :param code: the two letter ID code, eg. b'GR' for groups, b'OB' for objects.
+    :returns: list of names, without the ID code prefix.
+    :raises BlendFileError: when the file can not be read as a blend file.
+    """
+    block_code = code.ljust(4, b'\0')
+
+    with open(filepath, 'rb') as fileobj:
+        data = _read_data(fileobj)
+        try:
+            pointer_size, endian = _parse_header(data)
+
+            id_blocks = []
+            name_offset = None
+            for bcode, offset, length in _iter_blocks(data, pointer_size, endian):
+                if bcode == block_code:
+                    id_blocks.append((offset, length))
+                elif bcode == b'DNA1':
+                    name_offset = _id_name_offset(data, offset, pointer_size, endian)
+
+            if name_offset is None:
+                raise BlendFileError("Missing DNA1 block")
+
+            result = []
+            for offset, length in id_blocks:
+                if length < name_offset + ID_NAME_LENGTH:
+                    raise BlendFileError("ID block too short")
+                start = offset + name_offset + 2  # skip the ID code
+                raw = bytes(data[start:offset + name_offset + ID_NAME_LENGTH])
+                result.append(raw.split(b'\0', 1)[0].decode('utf-8', 'replace'))
+            return result
+        except (struct.error, IndexError, ValueError) as ex:
+            raise BlendFileError("Corrupt blend file: {}".format(ex))
+        finally:
+            if isinstance(data, mmap.mmap):
+                data.close()
+
+
+def list_groups(filepath):
+    """Return the names of the groups in a blend file"""
+    return list_ids(filepath, b'GR')
@@ -0,0 +1,94 @@
+# ***** BEGIN GPL LICENSE BLOCK *****
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software Foundation,
+# Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ***** END GPL LICENCE BLOCK *****
+
+# <pep8 compliant>
+
+"""Convert a library between JSON and SQLite.
+
+Usage:
+    python3 convert_library.py SOURCE DESTINATION
+
+The direction follows the extensions: a .sqlite, .sqlite3 or .db path is an
+SQLite library (see storage.py), anything else JSON. DESTINATION is replaced
+as a whole. Component paths are copied as they are, so both files should be
+in the same directory.
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+
+if __package__:
+    from . import storage
+else:
+    import storage
+
+
+def read_library_dict(library_path):
+    """Return a library file in the JSON schema, checked by model.Library
+
+    :raises ValueError: when the content is malformed.
+    """
+    return storage.read_library_file(library_path).to_dict()
+
+
+def write_library_dict(library_dict, library_path):
+    if storage.is_sqlite_path(library_path):
+        store = storage.LibraryStore(library_path)
+        try:
+            store.import_dict(library_dict)
+        finally:
+            store.close()
+        return
+
+    tmp_path = library_path + '.tmp'
+    with open(tmp_path, 'w') as library_file:
+        json.dump(library_dict, library_file, indent=4, sort_keys=True)
+    os.replace(tmp_path, library_path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='convert_library.py',
+        description="Convert a powerlib library between JSON and SQLite")
+    parser.add_argument('source', help="Library file to read")
+    parser.add_argument('destination', help="Library file to write")
+    args = parser.parse_args(argv)
+
+    if storage.is_sqlite_path(args.source) == storage.is_sqlite_path(args.destination):
+        parser.error("one of the libraries must be SQLite ({}) and the other JSON".format(
+            ', '.join(sorted(storage.SQLITE_EXTENSIONS))))
+
+    start = time.time()
+    try:
+        library_dict = read_library_dict(args.source)
+        write_library_dict(library_dict, args.destination)
+    except (OSError, ValueError) as ex:
+        print('Could not convert {}: {}'.format(args.source, ex))
+        return 1
+
+    print('{} collections, {} assets, {:.1f} s'.format(
+        len(library_dict), sum(len(assets) for assets in library_dict.values()),
+        time.time() - start))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
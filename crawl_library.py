@@ -0,0 +1,220 @@
+# ***** BEGIN GPL LICENSE BLOCK *****
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software Foundation,
+# Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ***** END GPL LICENCE BLOCK *****
+
+# <pep8 compliant>
+
+"""Build a library JSON file from a tree of blend files.
+
+Usage:
+    python3 crawl_library.py ASSET_ROOT LIBRARY_JSON [--jobs N] [--merge]
+
+Every top-level directory of ASSET_ROOT becomes a collection, and every blend
+file below it an asset named after the file, with one "instance_groups"
+component per group in the file. Component paths are written relative to the
+directory of LIBRARY_JSON, like the add-on does.
+
+The groups are listed by worker processes with blendfile.py, Blender is not
+needed. The mtime, size and groups of every file are kept in the group cache
+next to the library (see groupcache.py), so a later crawl only reads the files
+that changed. The add-on uses the same cache when showing the library.
+
+With --merge, the existing library is kept and only the "instance_groups" of
+the crawled assets are replaced. Otherwise the library is written from scratch.
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+if __package__:
+    from . import blendfile, groupcache, model
+else:
+    import blendfile
+    import groupcache
+    import model
+
+
+COMPONENT_TYPE = 'instance_groups'
+
+
+def find_blend_files(root):
+    """Return the sorted paths of the blend files in the collection
+    directories of root, relative to root.
+    """
+    found = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        # Hidden directories, eg. .svn, are not part of the library
+        dirnames[:] = [d for d in dirnames if not d.startswith('.')]
+        if os.path.samefile(dirpath, root):
+            # Files outside of a collection directory have no collection
+            continue
+        for filename in filenames:
+            if filename.endswith('.blend'):
+                found.append(os.path.relpath(os.path.join(dirpath, filename), root))
+    found.sort()
+    return found
+
+
+def _list_groups(abspath):
+    """Worker: return (abspath, group names or None, error message)"""
+    try:
+        return abspath, blendfile.list_groups(abspath), None
+    except (OSError, blendfile.BlendFileError) as ex:
+        return abspath, None, str(ex)
+
+
+class Crawler:
+    def __init__(self, root, library_path, jobs=None):
+        self.root = os.path.abspath(root)
+        self.library_path = os.path.abspath(library_path)
+        self.library_dir = os.path.dirname(self.library_path)
+        self.jobs = jobs or os.cpu_count() or 1
+        self.group_cache = groupcache.GroupCache(
+            groupcache.store_path_for_library(self.library_path))
+        self.errors = []
+        self.scanned = 0
+        self.unchanged = 0
+
+    def list_groups(self, relpaths):
+        """Return a dict of root-relative path -> group names, reading only
+        the files that changed since the last crawl.
+        """
+        cache = self.group_cache
+        cache.max_entries = max(cache.max_entries, len(relpaths))
+        cache.load()
+
+        result = {}
+        to_scan = {}
+        for relpath in relpaths:
+            abspath = os.path.join(self.root, relpath)
+            try:
+                stat = os.stat(abspath)
+            except OSError as ex:
+                self.errors.append((relpath, str(ex)))
+                continue
+            groups = cache.lookup(abspath, stat.st_mtime, stat.st_size)
+            if groups is None:
+                to_scan[abspath] = (relpath, stat)
+            else:
+                result[relpath] = groups
+        self.unchanged = len(result)
+
+        if to_scan:
+            with ProcessPoolExecutor(max_workers=self.jobs) as executor:
+                for abspath, groups, error in executor.map(
+                        _list_groups, list(to_scan), chunksize=16):
+                    relpath, stat = to_scan[abspath]
+                    if error is not None:
+                        # Not cached, it is tried again on the next crawl
+                        self.errors.append((relpath, error))
+                        continue
+                    cache.put(abspath, stat.st_mtime, stat.st_size, groups)
+                    result[relpath] = groups
+        self.scanned = len(to_scan)
+
+        cache.save()
+        return result
+
+    def component_path(self, relpath):
+        """Return the path of a file relative to the library, in the style
+        of the library JSON.
+        """
+        path = os.path.relpath(os.path.join(self.root, relpath), self.library_dir)
+        path = path.replace(os.sep, '/')
+        return path if path.startswith('../') else './' + path
+
+    def collections(self, groups_by_file):
+        """Return the crawled content as {collection: {asset: asset dict}}"""
+        collections = {}
+        for relpath in sorted(groups_by_file):
+            parts = relpath.split(os.sep)
+            assets = collections.setdefault(parts[0], {})
+
+            name = os.path.splitext(parts[-1])[0]
+            if name in assets:
+                # Same file name in two subdirectories of the collection
+                name = os.path.splitext('/'.join(parts[1:]))[0]
+
+            filepath = self.component_path(relpath)
+            assets[name] = {
+                COMPONENT_TYPE: [[filepath, group] for group in groups_by_file[relpath]],
+            }
+        return collections
+
+    def build_library(self, merge=False):
+        """Crawl the tree and return the resulting model.Library"""
+        groups_by_file = self.list_groups(find_blend_files(self.root))
+        crawled = self.collections(groups_by_file)
+
+        if not merge:
+            return model.Library.from_dict(crawled)
+
+        with open(self.library_path) as library_file:
+            library = model.Library.from_dict(json.load(library_file))
+        for collection_name, assets in crawled.items():
+            collection = library.add_collection(collection_name)
+            for asset_name, asset_dict in assets.items():
+                old_asset = collection.assets.get(asset_name)
+                if old_asset is not None:
+                    # Keep the other component types, added by hand
+                    old_dict = old_asset.to_dict()
+                    old_dict.update(asset_dict)
+                    asset_dict = old_dict
+                library.set_asset(collection, asset_name, asset_dict)
+        return library
+
+
+def write_library(library, library_path):
+    tmp_path = library_path + '.tmp'
+    with open(tmp_path, 'w') as library_file:
+        json.dump(library.to_dict(), library_file, indent=4, sort_keys=True)
+    os.replace(tmp_path, library_path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='crawl_library.py',
+        description="Build a powerlib library JSON from a tree of blend files")
+    parser.add_argument('root', help="Asset root, its directories become collections")
+    parser.add_argument('library', help="Library JSON file to write")
+    parser.add_argument('--jobs', type=int, default=0,
+                        help="Number of worker processes, defaults to the CPU count")
+    parser.add_argument('--merge', action='store_true',
+                        help="Update the existing library instead of replacing it")
+    args = parser.parse_args(argv)
+
+    start = time.time()
+    crawler = Crawler(args.root, args.library, args.jobs)
+    if args.merge and not os.path.isfile(crawler.library_path):
+        parser.error("--merge needs an existing library file")
+    library = crawler.build_library(args.merge)
+    write_library(library, crawler.library_path)
+
+    for relpath, error in crawler.errors:
+        print('Skipped {}: {}'.format(relpath, error))
+    print('{} collections, {} files read, {} unchanged, {} skipped, {:.1f} s'.format(
+        len(library), crawler.scanned, crawler.unchanged, len(crawler.errors),
+        time.time() - start))
+    return 1 if crawler.errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,179 @@
+# ***** BEGIN GPL LICENSE BLOCK *****
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software Foundation,
+# Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ***** END GPL LICENCE BLOCK *****
+
+# <pep8 compliant>
+
+"""Cache of the group names found in blend files.
+
+Listing the groups of a blend file means opening it, so the result is kept
+per absolute path together with the mtime and size of the file. An entry is
+only used while the file on disk still has the same mtime and size.
+
+The cache can be stored in a JSON file, usually next to the library JSON,
+so that it survives Blender sessions. The file is shared by the add-on and
+crawl_library.py, so it also keeps the largest max_entries it was saved
+with: a cache loaded from it is never truncated below that.
+
+This module does not depend on bpy.
+"""
+
+import os
+import json
+from collections import OrderedDict
+
+
+STORE_VERSION = 1
+
+
+def store_path_for_library(library_path):
+    """Return the path of the cache file that belongs to a library JSON"""
+    return os.path.splitext(library_path)[0] + '.groupcache.json'
+
+
+class GroupCache:
+    """LRU cache of absolute blend file path -> list of group names."""
+
+    def __init__(self, store_path=None, max_entries=10000):
+        self.store_path = store_path
+        self.max_entries = max_entries
+        # abspath -> (mtime, size, [group names]), least recently used first
+        self._entries = OrderedDict()
+        self._dirty = False
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'entries': len(self._entries),
+        }
+
+    def get(self, abspath, lister):
+        """Return the group names of a blend file.
+
+        :param abspath: absolute path of the blend file.
+        :param lister: callable taking the path and returning the group names,
+            only called when there is no valid cache entry.
+        :returns: list of group names, or None if the file can not be found.
+        """
+        try:
+            stat = os.stat(abspath)
+        except OSError:
+            self.invalidate(abspath)
+            return None
+
+        entry = self._entries.get(abspath)
+        if entry is not None:
+            mtime, size, groups = entry
+            if mtime == stat.st_mtime and size == stat.st_size:
+                self._entries.move_to_end(abspath)
+                self.hits += 1
+                return groups
+            # Stale, the file changed since it was listed
+            del self._entries[abspath]
+
+        self.misses += 1
+        groups = list(lister(abspath))
+        self.put(abspath, stat.st_mtime, stat.st_size, groups)
+        return groups
+
+    def lookup(self, abspath, mtime, size):
+        """Return the cached group names if the entry matches the given
+        mtime and size, None otherwise. The file itself is not looked at.
+        """
+        entry = self._entries.get(abspath)
+        if entry is None or entry[0] != mtime or entry[1] != size:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(abspath)
+        self.hits += 1
+        return entry[2]
+
+    def put(self, abspath, mtime, size, groups):
+        self._entries[abspath] = (mtime, size, groups)
+        self._entries.move_to_end(abspath)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        self._dirty = True
+
+    def invalidate(self, abspath):
+        if self._entries.pop(abspath, None) is not None:
+            self._dirty = True
+
+    def clear(self):
+        self._entries.clear()
+        self._dirty = True
+
+    # Persistence
+
+    def load(self):
+        """Read the entries from the store file, if there is one"""
+        if not self.store_path or not os.path.isfile(self.store_path):
+            return
+        try:
+            with open(self.store_path) as store_file:
+                data = json.load(store_file)
+        except (OSError, ValueError):
+            # A broken cache is as good as no cache
+            return
+        if not isinstance(data, dict) or data.get('version') != STORE_VERSION:
+            return
+
+        entries = OrderedDict()
+        try:
+            for abspath, (mtime, size, groups) in data['entries']:
+                if not isinstance(abspath, str) or not isinstance(groups, list):
+                    return
+                entries[abspath] = (mtime, size, groups)
+            max_entries = int(data.get('max_entries', 0))
+        except (KeyError, TypeError, ValueError):
+            return
+
+        # Another user of the file, eg. the crawler, may need more entries
+        self.max_entries = max(self.max_entries, max_entries, len(entries))
+        self._entries.update(entries)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        self._dirty = False
+
+    def save(self):
+        """Write the entries to the store file if they changed"""
+        if not self.store_path or not self._dirty:
+            return
+        data = {
+            'version': STORE_VERSION,
+            'max_entries': self.max_entries,
+            # A list keeps the LRU order
+            'entries': [
+                [abspath, list(entry)]
+                for abspath, entry in self._entries.items()
+            ],
+        }
+        tmp_path = self.store_path + '.tmp'
+        try:
+            with open(tmp_path, 'w') as store_file:
+                json.dump(data, store_file)
+            os.replace(tmp_path, self.store_path)
+        except OSError:
+            # Read-only library location, keep the in-memory cache only
+            return
+        self._dirty = False
@@ -1,6 +1,13 @@
 import os
+import hashlib
+from collections import Counter
+
 import bpy
 
+from .objectdiff import diff_objects
+from .paths import PathCache
+from .profiling import profiler
+
 
 VERBOSE = False # enable this for debugging
 
@@ -10,9 +17,33 @@ def debug_print(*args):
         print(*args)
 
 
+_path_cache = PathCache(relpath=bpy.path.relpath)
+
+
+def library_paths():
+    """Return the PathCache for the current library and blend file.
+
+    The cache is reset when the library path or the location of the blend
+    file changed since the last call.
+    """
+    scene = bpy.context.scene
+    # The ID property, also set when the add-on is not registered, eg. by
+    # the batch_link.py workers
+    lib_path = scene.get('lib_path')
+    if lib_path is None:
+        lib_path = getattr(scene, 'lib_path', '')
+    key = (lib_path, bpy.data.filepath)
+    if _path_cache.key != key:
+        _path_cache.reset(
+            key,
+            os.path.dirname(absolute_path_from_file(lib_path)),
+            os.path.dirname(bpy.data.filepath))
+    return _path_cache
+
+
 def relative_path_to_file(filepath):
     """Makes a path relative to the current file"""
-    return bpy.path.relpath(filepath)
+    return library_paths().relative_to_blend(filepath)
 
 
 def absolute_path_from_file(rel_filepath):
@@ -21,56 +52,136 @@ def absolute_path_from_file(rel_filepath):
 
 def relative_path_to_lib(filepath):
     """Makes a path relative to the current library"""
-    filepath = absolute_path_from_file(filepath)
-    libpath = os.path.dirname(
-        absolute_path_from_file(bpy.context.scene['lib_path']))
-    rel_path = os.path.relpath(filepath, libpath)
-    return rel_path
+    return library_paths().relative_to_library(absolute_path_from_file(filepath))
 
 
-def bottom_up_from_idblock(idblock):
-    """Generator, yields datablocks from the bottom (i.e. uses nothing) upward.
+def localization_order(roots, user_map):
+    """Return the datablocks reachable from roots through their users, each
+    one after all of its users.
 
-    Stupid in that it doesn't detect cycles yet.
+    Cycles (eg. an object driving a property of its own data) are detected
+    as strongly connected components; the members of a cycle are returned
+    next to each other, after the users of the cycle.
+
+    :param roots: the idblocks to start from.
+    :param user_map: mapping of idblock -> set of its users, as returned by
+        bpy.data.user_map(). Idblocks missing from it are taken as unused.
+    :returns: list of idblocks.
+    """
+    # Iterative version of Tarjan's algorithm, since rigs can be deep enough
+    # to hit the recursion limit. A component is only emitted once all the
+    # components of its users have been emitted, which is the order we need.
+    index_of = {}
+    lowlink = {}
+    stack = []
+    on_stack = set()
+    order = []
+    no_users = ()
+
+    for root in roots:
+        if root in index_of:
+            continue
+
+        index_of[root] = lowlink[root] = len(index_of)
+        stack.append(root)
+        on_stack.add(root)
+        work = [(root, iter(user_map.get(root, no_users)))]
+
+        while work:
+            node, users = work[-1]
+            for user in users:
+                if user not in index_of:
+                    index_of[user] = lowlink[user] = len(index_of)
+                    stack.append(user)
+                    on_stack.add(user)
+                    work.append((user, iter(user_map.get(user, no_users))))
+                    break
+                elif user in on_stack:
+                    lowlink[node] = min(lowlink[node], index_of[user])
+            else:
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    lowlink[parent] = min(lowlink[parent], lowlink[node])
+
+                if lowlink[node] == index_of[node]:
+                    component = []
+                    while True:
+                        member = stack.pop()
+                        on_stack.discard(member)
+                        component.append(member)
+                        if member is node:
+                            break
+                    if len(component) > 1:
+                        debug_print('Dependency cycle: {}'.format(component))
+                    order.extend(reversed(component))
+
+    return order
+
+
+def bottom_up_from_idblock(idblock, user_map=None):
+    """Generator, yields datablocks from the bottom (i.e. uses nothing) upward.
 
     :param idblock: the idblock whose users to yield.
+    :param user_map: result of bpy.data.user_map(), computed if not given.
     """
+    if user_map is None:
+        user_map = bpy.data.user_map()
+    yield from localization_order([idblock], user_map)
 
-    visited = set()
 
-    def visit(idblock):
-        # Prevent visiting the same idblock multiple times
-        if idblock in visited:
-            return
-        visited.add(idblock)
+def make_local(ob):
+    with profiler.run('make_local'):
+        make_local_all([ob])
+
 
-        user_map = bpy.data.user_map([idblock])
-        # There is only one entry here, for the idblock we requested.
-        for user in user_map[idblock]:
-            yield from visit(user)
-        yield idblock
+def make_local_all(idblocks):
+    """Make the idblocks and everything that depends on them local.
 
-    yield from visit(idblock)
+    The users of all datablocks are looked up with a single user_map call,
+    instead of one call (and one scan of the whole database) per datablock.
+    """
+    for _ in iter_make_local_all(idblocks):
+        pass
 
 
-def make_local(ob):
+def iter_make_local_all(idblocks):
+    """Generator version of make_local_all, yields the fraction done after
+    each datablock made local.
+    """
     # make local like a boss (using the patch from Sybren Stuvel)
-    for idblock in bottom_up_from_idblock(ob):
+    with profiler.phase('user_map'):
+        user_map = bpy.data.user_map()
+        order = localization_order(idblocks, user_map)
+
+    total = len(order)
+    for index, idblock in enumerate(order):
 
         if idblock.library is None:
             # Already local
             continue
 
-        debug_print('Should make %r local: ' % idblock)
-        debug_print('   - result: %s' % idblock.make_local(clear_proxy=True))
+        with profiler.phase('make_local'):
+            debug_print('Should make %r local: ' % idblock)
+            debug_print('   - result: %s' % idblock.make_local(clear_proxy=True))
+        profiler.count('made_local')
 
         # this shouldn't happen, but it does happen :/
         if idblock.library:
             pass
 
+        yield (index + 1) / total
+
 
 def treat_ob(ob, grp):
-    """Remap existing ob to the new ob"""
+    """Remap existing ob to the new ob
+
+    The object is left linked, it has to be made local afterwards, together
+    with the other objects (see process_group_reference_objects).
+
+    :returns: True when the object is new to this file and has to be added
+        to grp once it is local.
+    """
     ob_name = ob.name
     debug_print('Processing {}'.format(ob_name))
 
@@ -80,19 +191,16 @@ def treat_ob(ob, grp):
     except KeyError:
         debug_print('Not yet in Blender, just linking to scene.')
         bpy.context.scene.objects.link(ob)
-
-        make_local(ob)
-        ob = bpy.data.objects[ob_name, None]
-
-        debug_print('GRP: ', grp.name)
-        grp.objects.link(ob)
+        return True
 
     else:
         debug_print('Updating {}'.format(ob.name))
         # when an object already exists:
         # - find local version
         # - user_remap() it
-        existing.user_remap(ob)
+        with profiler.phase('user_remap'):
+            existing.user_remap(ob)
+        profiler.count('remapped')
         existing.name = '(PRE-SPLODE LOCAL) %s' % existing.name
 
         # Preserve visible or hidden state
@@ -104,63 +212,310 @@ def treat_ob(ob, grp):
             ob.animation_data.action = existing.animation_data.action
 
         bpy.data.objects.remove(existing)
-        make_local(ob)
+        return False
 
 
-def load_group_reference_objects(filepath, group_names):
-    # We load one group at a time
-    debug_print('Loading groups {} : {}'.format(filepath, group_names))
+def remove_objects(objects):
+    """Remove objects, and the meshes and materials only they used.
+
+    Everything is removed with a single bpy.data.batch_remove call, without
+    going through operators, so it does not depend on the context or on
+    what happens to be selected.
+    """
+    objects = set(objects)
+    if not objects:
+        return
+
+    # Meshes and materials whose users all go away with the objects
+    mesh_refs = Counter(
+        ob.data for ob in objects
+        if isinstance(ob.data, bpy.types.Mesh))
+    meshes = {
+        mesh for mesh, count in mesh_refs.items()
+        if mesh.users == count and not mesh.use_fake_user}
+
+    material_refs = Counter()
+    for mesh in meshes:
+        material_refs.update(mat for mat in mesh.materials if mat is not None)
+    for ob in objects:
+        material_refs.update(
+            slot.material for slot in ob.material_slots
+            if slot.link == 'OBJECT' and slot.material is not None)
+    materials = {
+        mat for mat, count in material_refs.items()
+        if mat.users == count and not mat.use_fake_user}
+
+    debug_print('Removing {} objects, {} meshes, {} materials'.format(
+        len(objects), len(meshes), len(materials)))
+
+    batch_remove = getattr(bpy.data, 'batch_remove', None)
+    if batch_remove is not None:
+        batch_remove(ids=list(objects | meshes | materials))
+        return
+
+    # Blender versions without batch_remove, still no operators involved
+    for ob in objects:
+        bpy.data.objects.remove(ob, do_unlink=True)
+    for mesh in meshes:
+        bpy.data.meshes.remove(mesh, do_unlink=True)
+    for mat in materials:
+        bpy.data.materials.remove(mat, do_unlink=True)
+
+
+# Custom property of a __REF group, identifying the version of the source
+# file its objects were last updated from
+FINGERPRINT_PROP = 'powerlib_fingerprint'
+
+
+# normalized path -> (mtime, size, SHA-1 hex digest) of the source files
+# hashed by source_fingerprint
+_content_hashes = {}
+
+
+def _content_hash(filepath, stat):
+    """Return the SHA-1 of a file, hashed again only when its mtime or size
+    changed since the last call.
+    """
+    cached = _content_hashes.get(filepath)
+    if cached is not None and cached[:2] == (stat.st_mtime, stat.st_size):
+        return cached[2]
+
+    sha = hashlib.sha1()
+    with open(filepath, 'rb') as source_file:
+        for chunk in iter(lambda: source_file.read(1 << 20), b''):
+            sha.update(chunk)
+    digest = sha.hexdigest()
+    _content_hashes[filepath] = (stat.st_mtime, stat.st_size, digest)
+    return digest
+
+
+def source_fingerprint(filepath, content_hash=False):
+    """Return a string identifying the version of a source blend file.
+
+    :param content_hash: identify the version by size and content instead
+        of size and mtime, for when the mtime can not be trusted, eg. files
+        restored from an archive.
+    :returns: the fingerprint, or None if the file can not be read.
+    """
+    filepath = os.path.normpath(filepath)
+    try:
+        stat = os.stat(filepath)
+        if content_hash:
+            parts = [filepath, str(stat.st_size), _content_hash(filepath, stat)]
+        else:
+            parts = [filepath, repr(stat.st_mtime), str(stat.st_size)]
+    except OSError:
+        return None
+    return '|'.join(parts)
+
+
+def reference_group_up_to_date(group_name, fingerprint):
+    """Whether the __REF group of a group was last updated from the source
+    file version with this fingerprint.
+    """
+    ref_group = bpy.data.groups.get('__REF{}'.format(group_name))
+    return (fingerprint is not None and ref_group is not None
+            and ref_group.get(FINGERPRINT_PROP) == fingerprint)
+
+
+def set_reference_group_fingerprint(group_name, fingerprint):
+    ref_group = bpy.data.groups.get('__REF{}'.format(group_name))
+    if ref_group is not None and fingerprint is not None:
+        ref_group[FINGERPRINT_PROP] = fingerprint
+
+
+def link_groups(filepath, group_names):
+    """Link groups from a blend file, opening it only once.
+
+    :returns: dict of requested group name -> linked group. Groups that are
+        not in the file are left out.
+    """
+    debug_print('Linking groups {} : {}'.format(filepath, group_names))
     rel_path = relative_path_to_file(filepath)
+    group_names = list(group_names)
+
+    with profiler.phase('libraries.load'):
+        with bpy.data.libraries.load(rel_path, link=True) as (data_from, data_to):
+            data_to.groups = group_names
+    profiler.count('files_opened')
+
+    return {
+        name: group
+        for name, group in zip(group_names, data_to.groups)
+        if group is not None
+    }
+
+
+def prepare_group_reference_objects(groups, remove_linked=True, removed=None):
+    """Create or update the local __REF group of each linked group.
+
+    :param groups: linked groups.
+    :param remove_linked: remove the linked groups once their objects are
+        known. Pass False when the same groups are also instanced.
+    :param removed: list to extend with the objects dropped from the __REF
+        groups, for the caller to pass to remove_objects() once for a whole
+        update. When None they are removed here, in one batch.
+    :returns: dict of local __REF group -> objects to add to it or update,
+        the objects that did not change are left out (see objectdiff.py).
+    """
+    with profiler.phase('prepare_reference_groups'):
+        if removed is not None:
+            return _prepare_group_reference_objects(groups, remove_linked, removed)
+        removed = []
+        data = _prepare_group_reference_objects(groups, remove_linked, removed)
+        remove_objects(removed)
+        return data
 
-    # Road a object scene we know the name of.
-    with bpy.data.libraries.load(rel_path, link=True) as (data_from, data_to):
-        data_to.groups = group_names
 
+def _prepare_group_reference_objects(groups, remove_linked, removed):
     data = {}
-    for group in data_to.groups:
+    for group in groups:
         debug_print('Handling group {}'.format(group.name))
         ref_group_name = '__REF{}'.format(group.name)
 
         if ref_group_name in bpy.data.groups:
-            object_names_from = [ob.name for ob in group.objects]
-            object_names_to = [ob.name for ob in bpy.data.groups[ref_group_name].objects]
-            object_names_diff = list(set(object_names_to) - set(object_names_from))
-
-            # Delete removed objects
-            for ob in object_names_diff:
-                bpy.data.objects[ob].select = True
-                bpy.ops.object.delete()
+            with profiler.phase('diff_objects'):
+                diff = diff_objects(group.objects, bpy.data.groups[ref_group_name].objects)
+            debug_print('Objects of {}: {}'.format(group.name, diff))
+            profiler.count('objects_unchanged', len(diff.unchanged))
+
+            # Deleted by the caller, together with the other groups'
+            removed.extend(diff.removed)
+
+            # The unchanged objects are left alone
+            objects = diff.to_update()
         else:
             bpy.ops.group.create(name=ref_group_name)
+            objects = [ob for ob in group.objects]
 
-        # store all the objects that are in the group
-        data[bpy.data.groups[ref_group_name]] = [ob for ob in group.objects]
+        # store the objects to add or update
+        data[bpy.data.groups[ref_group_name]] = objects
 
-        # remove the groups
-        bpy.data.groups.remove(group, do_unlink=True)
+        if remove_linked:
+            # remove the groups
+            bpy.data.groups.remove(group, do_unlink=True)
 
-    # add the new objects and make them local
-    process_group_reference_objects(data)
+    return data
 
 
-def process_group_reference_objects(data):
-    for group, objects in data.items():
-        for ob in objects:
-            treat_ob(ob, group)
+def load_group_reference_objects(filepath, group_names):
+    with profiler.run('load_group_reference_objects'):
+        # We load one group at a time
+        groups = link_groups(filepath, group_names)
+        data = prepare_group_reference_objects(groups.values())
 
+        # add the new objects and make them local
+        process_group_reference_objects(data)
+
+
+def process_group_reference_objects(data):
+    for _ in iter_process_group_reference_objects(data):
+        pass
 
-def load_instance_groups(filepath, group_names):
-    debug_print('Loading groups {} : {}'.format(filepath, group_names))
-    rel_path = relative_path_to_file(filepath)
 
-    # Road a object scene we know the name of.
-    with bpy.data.libraries.load(rel_path, link=True) as (data_from, data_to):
-        data_to.groups = group_names
+def iter_process_group_reference_objects(data, cancelled=None):
+    """Generator version of process_group_reference_objects, yields the
+    fraction done after each object, so the work can be spread over several
+    modal steps.
 
+    :param cancelled: function returning True when the remaining objects
+        should be skipped. It is checked between objects; the objects
+        treated so far are still made local and added to their group, so the
+        scene is left consistent.
+    """
+    objects = [(group, ob) for group, obs in data.items() for ob in obs]
+    total = len(objects)
+
+    new_objects = []
+    treated = []
+    for index, (group, ob) in enumerate(objects):
+        if cancelled is not None and cancelled():
+            debug_print('Cancelled after {} of {} objects'.format(index, total))
+            break
+        with profiler.phase('treat_ob'):
+            if treat_ob(ob, group):
+                new_objects.append((ob.name, group))
+        treated.append(ob)
+        yield 0.5 * (index + 1) / total
+    profiler.count('objects', len(treated))
+
+    # Make everything local in one pass
+    for fraction in iter_make_local_all(treated):
+        yield 0.5 + 0.5 * fraction
+
+    for ob_name, group in new_objects:
+        debug_print('GRP: ', group.name)
+        group.objects.link(bpy.data.objects[ob_name, None])
+
+
+def instance_groups(groups):
+    """Add an empty instancing each of the linked groups to the scene"""
     scene = bpy.context.scene
-    for group in group_names:
-        instance = bpy.data.objects.new(group.name, None)
-        instance.dupli_type = 'GROUP'
-        instance.dupli_group = group
-        scene.objects.link(instance)
+    with profiler.phase('instance_groups'):
+        for group in groups:
+            instance = bpy.data.objects.new(group.name, None)
+            instance.dupli_type = 'GROUP'
+            instance.dupli_group = group
+            scene.objects.link(instance)
+            profiler.count('instances')
+
+
+# Longest object name, in bytes, Blender 2.7x keeps 63
+MAX_NAME_BYTES = 63
+
+
+def unique_names(base, count, taken):
+    """Return `count` names 'base.001', 'base.002'... that are not in taken"""
+    # Room for the longest suffix, so that truncation makes no duplicates
+    room = MAX_NAME_BYTES - len('.{:03d}'.format(count + len(taken)))
+    base = base.encode('utf-8')[:room].decode('utf-8', 'ignore')
+    names = []
+    number = 0
+    while len(names) < count:
+        number += 1
+        name = '{}.{:03d}'.format(base, number)
+        if name not in taken:
+            names.append(name)
+    return names
+
+
+def instance_group_many(group, flat_matrices, count):
+    """Add `count` empties instancing a linked group to the scene.
+
+    The objects are created one by one, there is no bulk API for that, but
+    their matrices are set with a single foreach_set call through a
+    temporary group holding them. They are given unique names up front:
+    Blender 2.7x otherwise looks for a free number by scanning the names in
+    use for every new object of the same name, which is quadratic.
+
+    :param flat_matrices: 16 * count floats, column-major, see
+        placement.flat_matrices.
+    :returns: the new instance objects.
+    """
+    scene = bpy.context.scene
+    new_object = bpy.data.objects.new
+    link_to_scene = scene.objects.link
+
+    with profiler.phase('instance_groups'):
+        placing = bpy.data.groups.new('__powerlib_placing')
+        link_to_group = placing.objects.link
+        names = unique_names(group.name, count, set(bpy.data.objects.keys()))
+        instances = []
+        for name in names:
+            instance = new_object(name, None)
+            instance.dupli_type = 'GROUP'
+            instance.dupli_group = group
+            link_to_scene(instance)
+            link_to_group(instance)
+            instances.append(instance)
+
+        placing.objects.foreach_set('matrix_world', flat_matrices)
+        bpy.data.groups.remove(placing, do_unlink=True)
+    profiler.count('instances', count)
+    return instances
+
 
+def load_instance_groups(filepath, group_names):
+    with profiler.run('load_instance_groups'):
+        groups = link_groups(filepath, group_names)
+        instance_groups(groups.values())
@@ -0,0 +1,476 @@
+# ***** BEGIN GPL LICENSE BLOCK *****
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software Foundation,
+# Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ***** END GPL LICENCE BLOCK *****
+
+# <pep8 compliant>
+
+"""In-memory model of a powerlib library.
+
+The library JSON is read into plain, slotted Python records. They are cheap
+to build compared to Blender PropertyGroups, so the whole library lives here
+and only the collection shown in the panel is copied into PropertyGroups.
+
+This module does not depend on bpy.
+"""
+
+import threading
+from collections import OrderedDict
+
+if __package__:
+    from .search import SearchIndex
+else:
+    from search import SearchIndex
+
+
+class Component:
+    """A single component of an asset: a group name in a blend file."""
+    __slots__ = ('asset', 'type_name', 'filepath', 'id')
+
+    def __init__(self, asset, type_name, filepath, id):
+        self.asset = asset
+        self.type_name = type_name
+        self.filepath = filepath
+        self.id = id
+
+    def __repr__(self):
+        return '<Component {!r} {!r}:{!r}>'.format(
+            self.type_name, self.filepath, self.id)
+
+
+class Asset:
+    """An asset, with its components organized by type name."""
+    __slots__ = ('collection', 'name', 'components_by_type')
+
+    def __init__(self, collection, name):
+        self.collection = collection
+        self.name = name
+        # type name (eg. 'instance_groups') -> list of Component
+        self.components_by_type = {}
+
+    def __repr__(self):
+        return '<Asset {!r}/{!r}>'.format(self.collection.name, self.name)
+
+    def components(self):
+        """Iterate over the components of all types"""
+        for components in self.components_by_type.values():
+            yield from components
+
+    def to_dict(self):
+        return {
+            type_name: [[c.filepath, c.id] for c in components]
+            for type_name, components in self.components_by_type.items()
+        }
+
+
+class Collection:
+    """A named set of assets, eg. "Characters"."""
+    __slots__ = ('name', 'assets')
+
+    def __init__(self, name):
+        self.name = name
+        # asset name -> Asset
+        self.assets = {}
+
+    def __repr__(self):
+        return '<Collection {!r}>'.format(self.name)
+
+    def to_dict(self):
+        return {name: asset.to_dict() for name, asset in self.assets.items()}
+
+
+class Library:
+    """All collections of a library, indexed by collection, asset and file.
+
+    The indexes are kept up to date by the methods below, so the records
+    should not be added or removed by hand.
+    """
+    __slots__ = ('collections', 'assets_by_name', 'components_by_file', 'search_index',
+                 'unloaded', 'read_search_texts', 'changes', '_search_build',
+                 '_placeholders')
+
+    def __init__(self):
+        # collection name -> Collection
+        self.collections = {}
+        # asset name -> OrderedDict of Asset -> None, over all collections.
+        # Ordered sets rather than lists, so that unindexing is not a scan.
+        self.assets_by_name = {}
+        # component filepath (relative to the library) -> OrderedDict of
+        # Component -> None
+        self.components_by_file = {}
+        # Assets by name, group names and file paths, built on first search
+        self.search_index = None
+        # (thread, SearchIndex, [(indexed, asset)] edited meanwhile,
+        # placeholders) of the search index built in the background, see
+        # start_search_index
+        self._search_build = None
+        # Names of the collections whose assets are not read yet, for
+        # storages that read them on demand (see storage.py)
+        self.unloaded = set()
+        # Function of the storage returning the search texts of unloaded
+        # collections, see storage.LibraryStore.read_search_texts
+        self.read_search_texts = None
+        # Collection -> list of Asset without components, standing in the
+        # search index for the assets of an unloaded collection
+        self._placeholders = {}
+        # Edits as (kind, *arguments) in the order they were made, for
+        # storages that write them one by one. None when not recorded.
+        self.changes = None
+
+    @classmethod
+    def from_dict(cls, library_dict):
+        """Build a library from the parsed JSON data"""
+        library = cls()
+        for collection_name, collection_dict in library_dict.items():
+            library.set_collection(collection_name, collection_dict)
+        return library
+
+    def to_dict(self):
+        """Return the library in the JSON schema"""
+        return {name: col.to_dict() for name, col in self.collections.items()}
+
+    def __len__(self):
+        return len(self.collections)
+
+    # Lookups
+
+    def find_asset(self, collection_name, asset_name):
+        collection = self.collections.get(collection_name)
+        if collection is None:
+            return None
+        return collection.assets.get(asset_name)
+
+    def components_in_file(self, filepath):
+        return list(self.components_by_file.get(filepath, ()))
+
+    def search(self, query, limit=None):
+        """Return the assets matching a query, see search.py"""
+        if self.search_index is None:
+            if self._search_build is not None:
+                self._finish_search_index()
+            else:
+                self.build_search_index()
+        return self.search_index.search(query, limit)
+
+    # Edits
+
+    def _record(self, *change):
+        if self.changes is not None:
+            self.changes.append(change)
+
+    def add_collection(self, name):
+        collection = self.collections.get(name)
+        if collection is None:
+            collection = self.collections[name] = Collection(name)
+            self._record('add_collection', name)
+        return collection
+
+    def remove_collection(self, name):
+        collection = self.collections.pop(name, None)
+        if collection is None:
+            return
+        self.unloaded.discard(name)
+        self._record('remove_collection', name)
+        for asset in list(collection.assets.values()):
+            self._unindex_asset(asset)
+        # Also when the collection is loaded, its assets replace these
+        for asset in self._placeholders.pop(collection, ()):
+            if self.search_index is not None:
+                self.search_index.remove(asset)
+
+    def rename_collection(self, old_name, new_name):
+        """Rename a collection, unless new_name is taken by another one.
+
+        :returns: whether the collection was renamed.
+        """
+        if (old_name == new_name or old_name not in self.collections
+                or new_name in self.collections):
+            return False
+        collection = self.collections.pop(old_name)
+        collection.name = new_name
+        self.collections[new_name] = collection
+        if old_name in self.unloaded:
+            self.unloaded.remove(old_name)
+            self.unloaded.add(new_name)
+        self._record('rename_collection', old_name, new_name)
+        return True
+
+    def load_collection(self, name, collection_dict):
+        """Fill an unloaded collection, the assets are not recorded as edits"""
+        changes, self.changes = self.changes, None
+        try:
+            collection = self.set_collection(name, collection_dict)
+        finally:
+            self.changes = changes
+        self.unloaded.discard(name)
+        return collection
+
+    def set_collection(self, name, collection_dict):
+        """Replace the content of a collection with the given JSON data"""
+        self.remove_collection(name)
+        collection = self.add_collection(name)
+        for asset_name, asset_dict in collection_dict.items():
+            self.set_asset(collection, asset_name, asset_dict)
+        return collection
+
+    def update_collection(self, name, collection_dict):
+        """Like set_collection, but only replaces the assets that changed.
+
+        :returns: True if anything changed.
+        """
+        collection = self.collections.get(name)
+        if collection is None:
+            self.set_collection(name, collection_dict)
+            return True
+
+        changed = list(collection.assets) != list(collection_dict)
+        for asset_name in [n for n in collection.assets if n not in collection_dict]:
+            self.remove_asset(collection, asset_name)
+        for asset_name, asset_dict in collection_dict.items():
+            asset = collection.assets.get(asset_name)
+            if asset is None or asset.to_dict() != asset_dict:
+                self.set_asset(collection, asset_name, asset_dict)
+                changed = True
+        # Same order as collection_dict
+        collection.assets = {n: collection.assets[n] for n in collection_dict}
+        return changed
+
+    def set_asset(self, collection, asset_name, asset_dict):
+        """Add or replace an asset of a collection with the given JSON data"""
+        old_asset = collection.assets.get(asset_name)
+        if old_asset is not None:
+            self._unindex_asset(old_asset)
+
+        asset = Asset(collection, asset_name)
+        for type_name, components in asset_dict.items():
+            asset.components_by_type[type_name] = [
+                Component(asset, type_name, filepath, id)
+                for filepath, id in components
+            ]
+        collection.assets[asset_name] = asset
+        self._index_asset(asset)
+        self._record('set_asset', collection.name, asset_name, asset_dict)
+        return asset
+
+    def remove_asset(self, collection, asset_name):
+        asset = collection.assets.pop(asset_name, None)
+        if asset is not None:
+            self._unindex_asset(asset)
+            self._record('remove_asset', collection.name, asset_name)
+
+    # Indexes
+
+    def build_search_index(self):
+        """Index all assets for search(), the index is then kept up to date.
+
+        The assets of unloaded collections are indexed without loading them,
+        search() returns Asset records without components for them.
+        """
+        self._search_build = None
+        index = SearchIndex()
+        for collection in self.collections.values():
+            for asset in collection.assets.values():
+                self._index_search(index, asset)
+        self._placeholders = self._index_unloaded(index, self._unloaded_collections())
+        self.search_index = index
+
+    def start_search_index(self):
+        """Like build_search_index, but index the assets in a thread.
+
+        The edits made until the thread is done are replayed on the index by
+        the first search, which waits for the thread if needed.
+        """
+        if self.search_index is not None:
+            return
+        assets = [asset for collection in self.collections.values()
+                  for asset in collection.assets.values()]
+        unloaded = self._unloaded_collections()
+        index = SearchIndex()
+        placeholders = {}
+
+        def build():
+            # Edits replace the Asset records rather than change them, so
+            # the listed ones can be read while the library is edited
+            for asset in assets:
+                self._index_search(index, asset)
+            placeholders.update(self._index_unloaded(index, unloaded))
+
+        thread = threading.Thread(target=build, daemon=True)
+        self._search_build = (thread, index, [], placeholders)
+        thread.start()
+
+    def _finish_search_index(self):
+        thread, index, edits, placeholders = self._search_build
+        thread.join()
+        for indexed, asset in edits:
+            if indexed:
+                self._index_search(index, asset)
+            else:
+                index.remove(asset)
+        # Collections loaded or removed meanwhile are indexed by their assets
+        for collection, assets in list(placeholders.items()):
+            if (self.collections.get(collection.name) is not collection
+                    or collection.name not in self.unloaded):
+                for asset in assets:
+                    index.remove(asset)
+                del placeholders[collection]
+        self._search_build = None
+        self._placeholders = placeholders
+        self.search_index = index
+
+    def _unloaded_collections(self):
+        """Return {name: Collection} of the unloaded collections"""
+        if self.read_search_texts is None:
+            return {}
+        return {name: self.collections[name] for name in self.unloaded}
+
+    def _index_unloaded(self, index, unloaded):
+        """Index the assets of unloaded collections by the texts read by the
+        storage, which does not touch the library so it can run in a thread.
+
+        :param unloaded: {name: Collection} from _unloaded_collections.
+        :returns: {Collection: [Asset]} of the placeholders indexed.
+        """
+        placeholders = {}
+        if not unloaded:
+            return placeholders
+        for collection_name, asset_name, texts in self.read_search_texts(list(unloaded)):
+            collection = unloaded[collection_name]
+            asset = Asset(collection, asset_name)
+            index.add(asset, asset_name, texts)
+            placeholders.setdefault(collection, []).append(asset)
+        return placeholders
+
+    @staticmethod
+    def _index_search(index, asset):
+        texts = []
+        for component in asset.components():
+            texts.append(component.id)
+            texts.append(component.filepath)
+        index.add(asset, asset.name, texts)
+
+    def _index_asset(self, asset):
+        self.assets_by_name.setdefault(asset.name, OrderedDict())[asset] = None
+        by_file = self.components_by_file
+        for component in asset.components():
+            by_file.setdefault(component.filepath, OrderedDict())[component] = None
+        if self.search_index is not None:
+            self._index_search(self.search_index, asset)
+        elif self._search_build is not None:
+            self._search_build[2].append((True, asset))
+
+    def _unindex_asset(self, asset):
+        if self.search_index is not None:
+            self.search_index.remove(asset)
+        elif self._search_build is not None:
+            self._search_build[2].append((False, asset))
+
+        assets = self.assets_by_name.get(asset.name)
+        if assets is not None:
+            assets.pop(asset, None)
+            if not assets:
+                del self.assets_by_name[asset.name]
+
+        by_file = self.components_by_file
+        for component in asset.components():
+            components = by_file.get(component.filepath)
+            if components is None:
+                continue
+            components.pop(component, None)
+            if not components:
+                del by_file[component.filepath]
+
+
+# Diffing #####################################################################
+
+class CollectionDiff:
+    """Names of the assets added, removed and changed in a collection."""
+    __slots__ = ('added', 'removed', 'changed')
+
+    def __init__(self, added, removed, changed):
+        self.added = added
+        self.removed = removed
+        self.changed = changed
+
+    def __bool__(self):
+        return bool(self.added or self.removed or self.changed)
+
+
+class LibraryDiff:
+    """Structural difference between two libraries.
+
+    added and removed hold collection names, changed maps the name of a
+    collection present in both libraries to its CollectionDiff.
+    """
+    __slots__ = ('added', 'removed', 'changed')
+
+    def __init__(self, added, removed, changed):
+        self.added = added
+        self.removed = removed
+        self.changed = changed
+
+    def __bool__(self):
+        return bool(self.added or self.removed or self.changed)
+
+
+def _asset_key(asset):
+    return {
+        type_name: [(c.filepath, c.id) for c in components]
+        for type_name, components in asset.components_by_type.items()
+    }
+
+
+def diff_collections(old, new):
+    old_names = set(old.assets)
+    new_names = set(new.assets)
+    changed = sorted(
+        name for name in old_names & new_names
+        if _asset_key(old.assets[name]) != _asset_key(new.assets[name]))
+    return CollectionDiff(
+        sorted(new_names - old_names), sorted(old_names - new_names), changed)
+
+
+def diff_libraries(old, new):
+    """Return the LibraryDiff that turns the library old into new"""
+    old_names = set(old.collections)
+    new_names = set(new.collections)
+
+    changed = {}
+    for name in old_names & new_names:
+        col_diff = diff_collections(old.collections[name], new.collections[name])
+        if col_diff:
+            changed[name] = col_diff
+
+    return LibraryDiff(
+        sorted(new_names - old_names), sorted(old_names - new_names), changed)
+
+
+def apply_diff(library, diff, new):
+    """Apply a LibraryDiff, computed against new, to library"""
+    for name in diff.removed:
+        library.remove_collection(name)
+    for name in diff.added:
+        library.set_collection(name, new.collections[name].to_dict())
+
+    for name, col_diff in diff.changed.items():
+        collection = library.collections[name]
+        new_collection = new.collections[name]
+        for asset_name in col_diff.removed:
+            library.remove_asset(collection, asset_name)
+        for asset_name in col_diff.added + col_diff.changed:
+            library.set_asset(
+                collection, asset_name,
+                new_collection.assets[asset_name].to_dict())
@@ -0,0 +1,224 @@
+# ***** BEGIN GPL LICENSE BLOCK *****
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software Foundation,
+# Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ***** END GPL LICENCE BLOCK *****
+
+# <pep8 compliant>
+
+"""Differences between linked objects and their local versions.
+
+When the objects of a __REF group are updated, only the objects that differ
+from their local version need to be remapped and made local again. Objects
+are compared on:
+
+    - their type, transform, parent, dupli settings and visibility layers,
+    - their data: vertex positions and topology for meshes, bones for
+      armatures, points for curves, the plain properties for anything else,
+    - their modifiers and constraints, property by property,
+    - their material slots.
+
+An unchanged object used by an updated one (as parent, modifier target...)
+is updated too, otherwise the updated object would keep pointing at the
+linked version.
+"""
+
+import hashlib
+from array import array
+
+import bpy
+
+
+class ObjectDiff:
+    """Linked objects of a group compared to the local objects of its __REF
+    group.
+    """
+    __slots__ = ('added', 'changed', 'unchanged', 'removed')
+
+    def __init__(self):
+        # Linked objects without a local version
+        self.added = []
+        # Linked objects that differ from their local version
+        self.changed = []
+        # (linked object, local object) pairs that are the same
+        self.unchanged = []
+        # Local objects that are no longer in the group
+        self.removed = []
+
+    def __repr__(self):
+        return '<ObjectDiff +{} ~{} ={} -{}>'.format(
+            len(self.added), len(self.changed), len(self.unchanged), len(self.removed))
+
+    def to_update(self):
+        """The linked objects to remap and make local"""
+        return self.added + self.changed
+
+
+# Signatures ##################################################################
+
+_SIMPLE_PROPERTY_TYPES = {'BOOLEAN', 'INT', 'FLOAT', 'STRING', 'ENUM'}
+
+
+def _id_name(idblock):
+    return idblock.name if idblock is not None else None
+
+
+def rna_signature(struct):
+    """Return the values of the plain properties of an RNA struct.
+
+    ID pointers are compared by name, since the linked and the local version
+    of an object point at different datablocks with the same name.
+    """
+    values = []
+    for prop in struct.bl_rna.properties:
+        identifier = prop.identifier
+        if identifier == 'rna_type':
+            continue
+        if prop.type in _SIMPLE_PROPERTY_TYPES:
+            value = getattr(struct, identifier)
+            if isinstance(value, set):
+                # Enum flags
+                value = frozenset(value)
+            elif getattr(prop, 'array_length', 0):
+                value = tuple(value)
+        elif prop.type == 'POINTER':
+            value = getattr(struct, identifier)
+            if not isinstance(value, bpy.types.ID):
+                continue
+            value = value.name
+        else:
+            continue
+        values.append((identifier, value))
+    return tuple(values)
+
+
+def _digest(collection, attribute, typecode, size):
+    """Hash of an attribute of all the items of a collection"""
+    values = array(typecode, [0]) * (len(collection) * size)
+    collection.foreach_get(attribute, values)
+    return hashlib.sha1(values.tobytes()).hexdigest()
+
+
+def data_signature(data):
+    if data is None:
+        return None
+
+    if isinstance(data, bpy.types.Mesh):
+        return (
+            'MESH',
+            len(data.vertices), len(data.edges), len(data.polygons),
+            _digest(data.vertices, 'co', 'f', 3),
+            _digest(data.loops, 'vertex_index', 'i', 1),
+            _digest(data.polygons, 'loop_total', 'i', 1),
+            tuple(_id_name(mat) for mat in data.materials),
+        )
+
+    if isinstance(data, bpy.types.Armature):
+        return (
+            'ARMATURE',
+            tuple((bone.name, _id_name(bone.parent),
+                   tuple(bone.head_local), tuple(bone.tail_local))
+                  for bone in data.bones),
+        )
+
+    if isinstance(data, bpy.types.Curve):
+        splines = []
+        for spline in data.splines:
+            points = spline.bezier_points if spline.type == 'BEZIER' else spline.points
+            splines.append((spline.type, tuple(tuple(point.co) for point in points)))
+        return ('CURVE', rna_signature(data), tuple(splines))
+
+    return (type(data).__name__, rna_signature(data))
+
+
+def object_signature(ob, with_data=True):
+    """Return what identifies the content of an object, see the module
+    docstring.
+
+    :param with_data: also compare the object data, not needed when the
+        objects share it.
+    """
+    return (
+        ob.type,
+        tuple(tuple(row) for row in ob.matrix_basis),
+        _id_name(ob.parent), ob.parent_type, ob.parent_bone,
+        ob.dupli_type, _id_name(ob.dupli_group),
+        tuple(ob.layers),
+        data_signature(ob.data) if with_data else None,
+        tuple(rna_signature(modifier) for modifier in ob.modifiers),
+        tuple(rna_signature(constraint) for constraint in ob.constraints),
+        tuple((slot.link, _id_name(slot.material)) for slot in ob.material_slots),
+    )
+
+
+# Diffing #####################################################################
+
+def _same(linked, local):
+    # The local object may still use the linked data
+    with_data = linked.data is None or linked.data != local.data
+    return object_signature(linked, with_data) == object_signature(local, with_data)
+
+
+def diff_objects(incoming, existing):
+    """Compare the linked objects of a group to their local versions.
+
+    :param incoming: the linked objects, as in the group in the library.
+    :param existing: the local objects of the __REF group.
+    :returns: ObjectDiff.
+    """
+    diff = ObjectDiff()
+
+    incoming = list(incoming)
+    incoming_names = set()
+    for linked in incoming:
+        incoming_names.add(linked.name)
+        # The same lookup as treat_ob, which does the update
+        try:
+            local = bpy.data.objects[linked.name, None]
+        except KeyError:
+            diff.added.append(linked)
+            continue
+        if _same(linked, local):
+            diff.unchanged.append((linked, local))
+        else:
+            diff.changed.append(linked)
+
+    diff.removed = [ob for ob in existing if ob.name not in incoming_names]
+
+    _update_dependencies(diff)
+    return diff
+
+
+def _update_dependencies(diff):
+    """Move the unchanged objects used by updated objects to changed"""
+    updated = set(diff.to_update())
+    if not diff.unchanged or not updated:
+        return
+
+    user_map = bpy.data.user_map(
+        subset=[linked for linked, local in diff.unchanged], value_types={'OBJECT'})
+
+    moved = True
+    while moved:
+        moved = False
+        unchanged = []
+        for linked, local in diff.unchanged:
+            if user_map[linked] & updated:
+                diff.changed.append(linked)
+                updated.add(linked)
+                moved = True
+            else:
+                unchanged.append((linked, local))
+        diff.unchanged = unchanged
@@ -0,0 +1,150 @@
+# ***** BEGIN GPL LICENSE BLOCK *****
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software Foundation,
+# Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ***** END GPL LICENCE BLOCK *****
+
+# <pep8 compliant>
+
+"""Cached resolution of the component file paths.
+
+Component paths are stored relative to the library and shown relative to the
+current blend file. Resolving them means joining, normalizing and checking
+that the file exists, for every component. PathCache keeps the results, and
+checks existence by listing each directory once instead of calling stat per
+file. That matters for libraries on network mounts.
+
+A name missing from the listing is checked once with os.path.isfile, since
+the listing is case-sensitive while the file system may not be (Windows,
+macOS). Missing files are cached too, so a library referencing a missing file
+many times does not stat it each time; invalidate() forgets them once files
+may have been added, eg. when the library is reloaded.
+
+A PathCache is only valid for one library location and one blend file
+location; the owner resets it when either changes.
+
+This module does not depend on bpy.
+"""
+
+import os
+
+
+class PathCache:
+    def __init__(self, relpath=None):
+        """
+        :param relpath: function making an absolute path relative to the
+            blend file, defaults to a '//' prefixed os.path.relpath.
+        """
+        self._relpath = relpath
+        self.key = None
+        self.library_dir = ''
+        self.blend_dir = ''
+        self.reset(None, '', '')
+
+    def reset(self, key, library_dir, blend_dir):
+        """Forget everything, and resolve relative to new locations.
+
+        :param key: anything identifying the locations, see PathCache.key.
+        """
+        self.key = key
+        self.library_dir = library_dir
+        self.blend_dir = blend_dir
+        # path relative to the library -> normalized absolute path, or None
+        # for a missing file
+        self._absolute = {}
+        # absolute path -> path relative to the blend file
+        self._relative_to_blend = {}
+        # absolute path -> path relative to the library
+        self._relative_to_library = {}
+        # directory -> set of the names of the files in it
+        self._listings = {}
+        # directory -> set of the names checked and not found in it
+        self._missing = {}
+
+    def invalidate(self):
+        """Forget the cached results, eg. after files were added on disk"""
+        self.reset(self.key, self.library_dir, self.blend_dir)
+
+    def _files_in(self, directory):
+        files = self._listings.get(directory)
+        if files is None:
+            try:
+                files = {
+                    entry.name for entry in os.scandir(directory)
+                    if entry.is_file()}
+            except OSError:
+                # Missing or unreadable directory, nothing in it
+                files = set()
+            self._listings[directory] = files
+        return files
+
+    def is_file(self, abspath):
+        directory, name = os.path.split(abspath)
+        if name in self._files_in(directory):
+            return True
+        missing = self._missing.setdefault(directory, set())
+        if name in missing:
+            return False
+        if os.path.isfile(abspath):
+            return True
+        missing.add(name)
+        return False
+
+    def absolute(self, filepath):
+        """Return the normalized absolute path of a path relative to the
+        library, or None if there is no such file.
+        """
+        try:
+            return self._absolute[filepath]
+        except KeyError:
+            pass
+
+        normpath = os.path.normpath(os.path.join(self.library_dir, filepath))
+        if not self.is_file(normpath):
+            normpath = None
+        self._absolute[filepath] = normpath
+        return normpath
+
+    def absolute_many(self, filepaths):
+        """Resolve many paths relative to the library at once.
+
+        :returns: dict of path -> absolute path or None.
+        """
+        return {filepath: self.absolute(filepath) for filepath in set(filepaths)}
+
+    def relative_to_blend(self, abspath):
+        """Return an absolute path relative to the current blend file"""
+        try:
+            return self._relative_to_blend[abspath]
+        except KeyError:
+            pass
+
+        if self._relpath is not None:
+            result = self._relpath(abspath)
+        else:
+            result = '//' + os.path.relpath(abspath, self.blend_dir)
+        self._relative_to_blend[abspath] = result
+        return result
+
+    def relative_to_library(self, abspath):
+        """Return an absolute path relative to the library"""
+        try:
+            return self._relative_to_library[abspath]
+        except KeyError:
+            pass
+
+        result = os.path.relpath(abspath, self.library_dir)
+        self._relative_to_library[abspath] = result
+        return result
@@ -0,0 +1,168 @@
+# ***** BEGIN GPL LICENSE BLOCK *****
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software Foundation,
+# Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ***** END GPL LICENCE BLOCK *****
+
+# <pep8 compliant>
+
+"""Transforms for placing many group instances at once.
+
+Transforms are handed to Blender as one flat sequence of floats, 16 per
+instance, in the order of Object.matrix_world as seen by foreach_set:
+column by column. flat_matrices() turns the supported inputs into that:
+
+    - a NumPy array of shape (N, 4, 4) or (N, 16), row-major like
+      mathutils.Matrix,
+    - a list of 4x4 matrices (mathutils.Matrix or nested sequences),
+    - the rows of a CSV file, see matrices_from_csv,
+    - points, see matrices_from_points.
+
+NumPy is used when it is available (it ships with Blender), plain Python
+otherwise.
+
+This module does not depend on bpy.
+"""
+
+import csv
+import math
+from array import array
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+def compose(location, rotation=(0.0, 0.0, 0.0), scale=(1.0, 1.0, 1.0)):
+    """Return the row-major 4x4 matrix of a location, an XYZ Euler rotation
+    in radians and a scale, as nested lists.
+    """
+    cx, cy, cz = (math.cos(angle) for angle in rotation)
+    sx, sy, sz = (math.sin(angle) for angle in rotation)
+    # Rz * Ry * Rx, like mathutils.Euler((x, y, z), 'XYZ').to_matrix()
+    rot = (
+        (cy * cz, sx * sy * cz - cx * sz, cx * sy * cz + sx * sz),
+        (cy * sz, sx * sy * sz + cx * cz, cx * sy * sz - sx * cz),
+        (-sy, sx * cy, cx * cy),
+    )
+    return [
+        [rot[row][0] * scale[0], rot[row][1] * scale[1], rot[row][2] * scale[2],
+         location[row]]
+        for row in range(3)
+    ] + [[0.0, 0.0, 0.0, 1.0]]
+
+
+def matrices_from_csv(filepath):
+    """Read transforms from a CSV file, one instance per row.
+
+    A row holds either 16 values, a row-major 4x4 matrix, or
+    x, y, z [, rx, ry, rz [, sx, sy, sz]] with the rotation in degrees. A
+    first row that is not numeric is taken as a header.
+
+    :returns: list of row-major 4x4 matrices.
+    :raises ValueError: on a malformed row.
+    """
+    matrices = []
+    with open(filepath, newline='') as csv_file:
+        for line_number, row in enumerate(csv.reader(csv_file), 1):
+            row = [value.strip() for value in row if value.strip()]
+            if not row:
+                continue
+            try:
+                values = [float(value) for value in row]
+            except ValueError:
+                if line_number == 1:
+                    continue
+                raise ValueError("Line {}: not a number in {}".format(line_number, row))
+
+            if len(values) == 16:
+                matrices.append([values[0:4], values[4:8], values[8:12], values[12:16]])
+            elif len(values) in {3, 6, 9}:
+                rotation = [math.radians(v) for v in values[3:6]] or (0.0, 0.0, 0.0)
+                scale = values[6:9] or (1.0, 1.0, 1.0)
+                matrices.append(compose(values[0:3], rotation, scale))
+            else:
+                raise ValueError("Line {}: expected 3, 6, 9 or 16 values, got {}".format(
+                    line_number, len(values)))
+    return matrices
+
+
+def transform_points(points, matrix):
+    """Apply a row-major 4x4 matrix, eg. an object's matrix_world, to points.
+
+    :param points: flat sequence of x, y, z coordinates.
+    :returns: flat sequence of the transformed coordinates.
+    """
+    rows = [tuple(row) for row in matrix]
+    if numpy is not None:
+        mat = numpy.array(rows, dtype=numpy.float32)
+        points = numpy.asarray(points, dtype=numpy.float32).reshape(-1, 3)
+        return (points.dot(mat[:3, :3].T) + mat[:3, 3]).ravel()
+
+    result = array('f')
+    for i in range(0, len(points), 3):
+        x, y, z = points[i:i + 3]
+        result.extend(r[0] * x + r[1] * y + r[2] * z + r[3] for r in rows[:3])
+    return result
+
+
+def matrices_from_points(points, scale=1.0):
+    """Return translation matrices placing an instance on each point.
+
+    :param points: flat sequence of x, y, z coordinates, eg. filled by
+        mesh.vertices.foreach_get('co', ...), or a NumPy array of shape (N, 3).
+    :returns: a NumPy array of shape (N, 4, 4) when NumPy is available,
+        a list of row-major matrices otherwise.
+    """
+    if numpy is not None:
+        points = numpy.asarray(points, dtype=numpy.float32).reshape(-1, 3)
+        matrices = numpy.zeros((len(points), 4, 4), dtype=numpy.float32)
+        matrices[:, 0, 0] = matrices[:, 1, 1] = matrices[:, 2, 2] = scale
+        matrices[:, 3, 3] = 1.0
+        matrices[:, :3, 3] = points
+        return matrices
+
+    points = list(points)
+    return [
+        [[scale, 0.0, 0.0, points[i]],
+         [0.0, scale, 0.0, points[i + 1]],
+         [0.0, 0.0, scale, points[i + 2]],
+         [0.0, 0.0, 0.0, 1.0]]
+        for i in range(0, len(points), 3)
+    ]
+
+
+def flat_matrices(matrices):
+    """Return the transforms as one flat sequence for foreach_set.
+
+    :param matrices: row-major 4x4 matrices, see the module docstring.
+    :returns: (count, flat sequence of 16 * count floats, column-major).
+    """
+    if numpy is not None:
+        arr = numpy.asarray(matrices, dtype=numpy.float32)
+        if arr.size == 0:
+            return 0, arr.ravel()
+        arr = arr.reshape(-1, 4, 4)
+        return len(arr), numpy.ascontiguousarray(arr.transpose(0, 2, 1)).ravel()
+
+    flat = array('f')
+    count = 0
+    for matrix in matrices:
+        rows = [tuple(row) for row in matrix]
+        for col in range(4):
+            flat.extend(rows[row][col] for row in range(4))
+        count += 1
+    return count, flat
@@ -0,0 +1,186 @@
+# ***** BEGIN GPL LICENSE BLOCK *****
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software Foundation,
+# Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ***** END GPL LICENCE BLOCK *****
+
+# <pep8 compliant>
+
+"""Preview images of the assets, rendered by background Blender processes.
+
+A preview is a PNG file in a cache directory next to the library JSON, named
+after the fingerprint of the source blend file (see
+linking.source_fingerprint) and the group name. A changed source file gets
+new previews, the old ones are evicted once the cache grows over its size
+cap, least recently used first.
+
+Renders are requested while drawing and started in batches by flush(), one
+Blender process per source file running render_previews.py.
+
+This module does not depend on bpy.
+"""
+
+import os
+import json
+import hashlib
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+
+RESULT_PREFIX = 'POWERLIB_PREVIEWS '
+RENDER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             'render_previews.py')
+
+
+def cache_dir_for_library(library_path):
+    """Return the preview directory that belongs to a library JSON"""
+    return os.path.splitext(library_path)[0] + '.previews'
+
+
+def preview_key(fingerprint, group_name):
+    return hashlib.sha1('{}|{}'.format(fingerprint, group_name).encode('utf-8')).hexdigest()
+
+
+class PreviewCache:
+    """Directory of preview PNG files with a size cap"""
+
+    def __init__(self, cache_dir, max_bytes=100 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+
+    def path(self, key):
+        return os.path.join(self.cache_dir, key + '.png')
+
+    def get(self, key):
+        """Return the path of a cached preview, or None"""
+        path = self.path(key)
+        try:
+            # The mtime is the last use, for the eviction order
+            os.utime(path)
+        except OSError:
+            return None
+        return path
+
+    def evict(self):
+        """Remove the least recently used previews until the cache fits in
+        max_bytes.
+
+        :returns: number of previews removed.
+        """
+        try:
+            entries = [entry for entry in os.scandir(self.cache_dir)
+                       if entry.name.endswith('.png') and entry.is_file()]
+        except OSError:
+            return 0
+
+        stats = [(entry.stat().st_mtime, entry.stat().st_size, entry.path)
+                 for entry in entries]
+        total = sum(size for _, size, _ in stats)
+        removed = 0
+        for _, size, path in sorted(stats):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            removed += 1
+        return removed
+
+
+class PreviewRenderer:
+    """Render queue of background Blender processes"""
+
+    def __init__(self, cache, blender, jobs=2, size=128, timeout=120):
+        self.cache = cache
+        self.blender = blender
+        self.size = size
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=jobs)
+        self._lock = threading.Lock()
+        # abspath -> {key: group name}, waiting for flush()
+        self._queued = {}
+        # Keys queued or being rendered, and keys that failed to render
+        self._pending = set()
+        self._failed = set()
+        # Keys rendered since the last take_finished()
+        self._finished = []
+
+    def request(self, abspath, group_name, key):
+        """Queue the render of a preview, unless it is already on its way"""
+        with self._lock:
+            if key in self._pending or key in self._failed:
+                return
+            self._pending.add(key)
+            self._queued.setdefault(abspath, {})[key] = group_name
+
+    def flush(self):
+        """Start a Blender process for each source file with queued renders"""
+        with self._lock:
+            queued, self._queued = self._queued, {}
+        for abspath, groups in queued.items():
+            self._executor.submit(self._render, abspath, groups)
+        return len(queued)
+
+    def busy(self):
+        with self._lock:
+            return bool(self._pending)
+
+    def take_finished(self):
+        """Return the keys of the previews rendered since the last call"""
+        with self._lock:
+            finished, self._finished = self._finished, []
+        return finished
+
+    def shutdown(self):
+        with self._lock:
+            self._queued.clear()
+        self._executor.shutdown(wait=False)
+
+    def _render(self, abspath, groups):
+        os.makedirs(self.cache.cache_dir, exist_ok=True)
+        job = {
+            'file': abspath,
+            'size': self.size,
+            'previews': [[group_name, self.cache.path(key)]
+                         for key, group_name in groups.items()],
+        }
+        cmd = [
+            self.blender, '-b', '--factory-startup',
+            '-P', RENDER_SCRIPT,
+            '--', json.dumps(job),
+        ]
+        rendered = set()
+        try:
+            proc = subprocess.run(
+                cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                universal_newlines=True, timeout=self.timeout)
+            for line in reversed(proc.stdout.splitlines()):
+                if line.startswith(RESULT_PREFIX):
+                    rendered = set(json.loads(line[len(RESULT_PREFIX):])['rendered'])
+                    break
+        except (OSError, ValueError, subprocess.TimeoutExpired):
+            pass
+
+        with self._lock:
+            for key, group_name in groups.items():
+                self._pending.discard(key)
+                if group_name in rendered:
+                    self._finished.append(key)
+                else:
+                    # Not retried until the source file changes
+                    self._failed.add(key)
@@ -0,0 +1,227 @@
+# ***** BEGIN GPL LICENSE BLOCK *****
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software Foundation,
+# Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ***** END GPL LICENCE BLOCK *****
+
+# <pep8 compliant>
+
+"""Per-phase timing of the load and link operations.
+
+    with profiler.run('link'):
+        with profiler.phase('libraries.load'):
+            ...
+        profiler.count('files_opened')
+
+A run records the time spent in each named phase (summed when a phase is
+entered several times) and counters, eg. of datablocks touched. The last
+runs are kept in memory and can also be appended to a JSON-lines trace file.
+
+An operation spread over several modal steps is profiled as one run:
+
+    run = profiler.start('link')        # in invoke
+    with profiler.resume(run):          # around each step
+        ...
+    profiler.finish(run)                # once done
+
+The current run is per thread: phase() and count() called from a thread
+that is not running the profiled operation, eg. a reader thread, do
+nothing. A thread may resume() a run while no other thread uses it.
+
+While the profiler is disabled, run() and phase() return a shared do-nothing
+context manager and count() returns right away.
+
+This module does not depend on bpy.
+"""
+
+import json
+import time
+import threading
+from collections import OrderedDict, deque
+
+
+class _NullContext:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+
+NULL_CONTEXT = _NullContext()
+
+
+class Run:
+    """Timings and counters of one profiled operation."""
+    __slots__ = ('name', 'start', 'duration', 'phases', 'counts')
+
+    def __init__(self, name):
+        self.name = name
+        self.start = time.time()
+        self.duration = 0.0
+        # phase name -> seconds, in the order the phases were first entered
+        self.phases = OrderedDict()
+        self.counts = OrderedDict()
+
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'start': self.start,
+            'duration': self.duration,
+            'phases': self.phases,
+            'counts': self.counts,
+        }
+
+
+class _RunContext:
+    __slots__ = ('profiler', 'run', 't0')
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.run = Run(name)
+
+    def __enter__(self):
+        self.profiler._current = self.run
+        self.t0 = time.perf_counter()
+        return self.run
+
+    def __exit__(self, *args):
+        self.run.duration = time.perf_counter() - self.t0
+        self.profiler._current = None
+        self.profiler._finish(self.run)
+        return False
+
+
+class _ResumeContext:
+    __slots__ = ('profiler', 'run', 'previous', 't0')
+
+    def __init__(self, profiler, run):
+        self.profiler = profiler
+        self.run = run
+
+    def __enter__(self):
+        self.previous = self.profiler._current
+        self.profiler._current = self.run
+        self.t0 = time.perf_counter()
+        return self.run
+
+    def __exit__(self, *args):
+        self.run.duration += time.perf_counter() - self.t0
+        self.profiler._current = self.previous
+        return False
+
+
+class _PhaseContext:
+    __slots__ = ('phases', 'name', 't0')
+
+    def __init__(self, run, name):
+        self.phases = run.phases
+        self.name = name
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *args):
+        elapsed = time.perf_counter() - self.t0
+        self.phases[self.name] = self.phases.get(self.name, 0.0) + elapsed
+        return False
+
+
+class Profiler:
+    def __init__(self, history=10):
+        self.enabled = False
+        self.runs = deque(maxlen=history)
+        # Append each finished run to this JSON-lines file, if set
+        self.trace_path = ''
+        # .run is the current run of the thread
+        self._local = threading.local()
+
+    @property
+    def _current(self):
+        return getattr(self._local, 'run', None)
+
+    @_current.setter
+    def _current(self, run):
+        self._local.run = run
+
+    def run(self, name):
+        """Context manager profiling an operation.
+
+        An operation started inside another one is recorded as a phase of
+        the outer run.
+        """
+        if not self.enabled:
+            return NULL_CONTEXT
+        if self._current is not None:
+            return _PhaseContext(self._current, name)
+        return _RunContext(self, name)
+
+    def start(self, name):
+        """Start a run spread over several steps, see resume() and finish().
+
+        :returns: the Run, or None while the profiler is disabled.
+        """
+        if not self.enabled:
+            return None
+        return Run(name)
+
+    def resume(self, run):
+        """Context manager making run the current one for a step, its
+        duration is the sum of the steps.
+        """
+        if run is None:
+            return NULL_CONTEXT
+        return _ResumeContext(self, run)
+
+    def finish(self, run):
+        """Record a run started with start()"""
+        if run is not None:
+            self._finish(run)
+
+    def phase(self, name):
+        """Context manager timing a phase of the current run"""
+        if self._current is None:
+            return NULL_CONTEXT
+        return _PhaseContext(self._current, name)
+
+    def count(self, name, amount=1):
+        """Add to a counter of the current run"""
+        current = self._current
+        if current is None:
+            return
+        current.counts[name] = current.counts.get(name, 0) + amount
+
+    def set_history(self, history):
+        self.runs = deque(self.runs, maxlen=history)
+
+    def clear(self):
+        self.runs.clear()
+
+    def _finish(self, run):
+        self.runs.append(run)
+        if not self.trace_path:
+            return
+        try:
+            with open(self.trace_path, 'a') as trace_file:
+                trace_file.write(json.dumps(run.to_dict()) + '\n')
+        except OSError:
+            # Not worth failing the operation over
+            pass
+
+
+profiler = Profiler()
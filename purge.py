@@ -0,0 +1,192 @@
+# ***** BEGIN GPL LICENSE BLOCK *****
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software Foundation,
+# Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ***** END GPL LICENCE BLOCK *****
+
+# <pep8 compliant>
+
+"""Removal of the datablocks left over by reference object updates.
+
+Orphans are the datablocks of the types below that nothing uses, or that
+only other orphans use, eg. the mesh of an unused object. A datablock with a
+fake user is never an orphan. Objects left renamed by treat_ob,
+"(PRE-SPLODE LOCAL) ...", get no special treatment: they are purged once
+nothing uses them, like the rest. Libraries none of the remaining
+datablocks come from are removed too.
+
+The orphans are found from a single bpy.data.user_map() and removed with a
+single bpy.data.batch_remove() where Blender has it.
+"""
+
+import bpy
+
+
+# Datablock types that are purged, with their bpy.data collection
+PURGED_TYPES = (
+    ('Object', 'objects'),
+    ('Mesh', 'meshes'),
+    ('Curve', 'curves'),
+    ('Armature', 'armatures'),
+    ('Lamp', 'lamps'),
+    ('Camera', 'cameras'),
+    ('Material', 'materials'),
+    ('Texture', 'textures'),
+    ('Image', 'images'),
+    ('Action', 'actions'),
+)
+
+# Rough in-memory sizes in bytes, for the estimate of what a purge frees
+_ID_SIZE = 1024
+_VERTEX_SIZE = 20
+_EDGE_SIZE = 12
+_LOOP_SIZE = 8
+_POLYGON_SIZE = 12
+
+
+class PurgeResult:
+    __slots__ = ('counts', 'estimated_bytes')
+
+    def __init__(self):
+        # bpy.data collection name -> number of datablocks removed
+        self.counts = {}
+        self.estimated_bytes = 0
+
+    def __bool__(self):
+        return bool(self.counts)
+
+    def total(self):
+        return sum(self.counts.values())
+
+    def summary(self, dry_run=False):
+        if not self.counts:
+            return "Nothing to purge"
+        parts = ['{} {}'.format(count, name)
+                 for name, count in sorted(self.counts.items())]
+        return "{} {}, about {:.1f} MB".format(
+            "Would remove" if dry_run else "Removed",
+            ', '.join(parts), self.estimated_bytes / (1024 * 1024))
+
+
+def _collection_name(idblock):
+    """Return the bpy.data collection of a purged datablock, or None"""
+    for type_name, collection_name in PURGED_TYPES:
+        # isinstance, for the subtypes like PointLamp or TextCurve
+        if isinstance(idblock, getattr(bpy.types, type_name)):
+            return collection_name
+    return None
+
+
+def estimated_size(idblock):
+    size = _ID_SIZE
+    if isinstance(idblock, bpy.types.Mesh):
+        size += (len(idblock.vertices) * _VERTEX_SIZE
+                 + len(idblock.edges) * _EDGE_SIZE
+                 + len(idblock.loops) * _LOOP_SIZE
+                 + len(idblock.polygons) * _POLYGON_SIZE)
+    elif isinstance(idblock, bpy.types.Image) and idblock.has_data:
+        width, height = idblock.size
+        size += width * height * idblock.channels * (4 if idblock.is_float else 1)
+    return size
+
+
+def find_orphans(user_map=None):
+    """Return the set of orphan datablocks, see the module docstring.
+
+    :param user_map: result of bpy.data.user_map(), computed if not given.
+    """
+    if user_map is None:
+        user_map = bpy.data.user_map()
+
+    purged_types = tuple(getattr(bpy.types, type_name) for type_name, _ in PURGED_TYPES)
+
+    def purgeable(idblock):
+        if not isinstance(idblock, purged_types) or idblock.use_fake_user:
+            return False
+        # Users that are not datablocks, eg. an image editor showing an
+        # image, are counted by ID.users but not by user_map
+        return idblock.users <= len(user_map[idblock])
+
+    # idblock -> idblocks it uses, and the number of users left
+    uses = {}
+    remaining = {}
+    for idblock, users in user_map.items():
+        remaining[idblock] = len(users)
+        for user in users:
+            uses.setdefault(user, []).append(idblock)
+
+    orphans = set()
+    stack = [idblock for idblock in user_map
+             if remaining[idblock] == 0 and purgeable(idblock)]
+    while stack:
+        idblock = stack.pop()
+        if idblock in orphans:
+            continue
+        orphans.add(idblock)
+        for used in uses.get(idblock, ()):
+            remaining[used] -= 1
+            if remaining[used] == 0 and used not in orphans and purgeable(used):
+                stack.append(used)
+    return orphans
+
+
+def unused_libraries(orphans, user_map):
+    """Return the libraries none of the remaining datablocks come from"""
+    used = set()
+    for idblock in user_map:
+        if idblock in orphans or idblock.library is None:
+            continue
+        library = idblock.library
+        while library is not None and library not in used:
+            used.add(library)
+            library = library.parent
+    return [library for library in bpy.data.libraries if library not in used]
+
+
+def purge_orphans(dry_run=False):
+    """Remove the orphans and the unused libraries.
+
+    :param dry_run: only count what would be removed.
+    :returns: PurgeResult.
+    """
+    user_map = bpy.data.user_map()
+    orphans = find_orphans(user_map)
+    libraries = unused_libraries(orphans, user_map)
+
+    result = PurgeResult()
+    for idblock in orphans:
+        name = _collection_name(idblock)
+        result.counts[name] = result.counts.get(name, 0) + 1
+        result.estimated_bytes += estimated_size(idblock)
+    if libraries:
+        result.counts['libraries'] = len(libraries)
+        result.estimated_bytes += len(libraries) * _ID_SIZE
+
+    if dry_run or not result:
+        return result
+
+    batch_remove = getattr(bpy.data, 'batch_remove', None)
+    if batch_remove is not None:
+        batch_remove(ids=list(orphans) + libraries)
+        return result
+
+    # Blender versions without batch_remove
+    for idblock in orphans:
+        getattr(bpy.data, _collection_name(idblock)).remove(idblock, do_unlink=True)
+    remove_library = getattr(bpy.data.libraries, 'remove', None)
+    if remove_library is not None:
+        for library in libraries:
+            remove_library(library)
+    return result
@@ -0,0 +1,129 @@
+# ***** BEGIN GPL LICENSE BLOCK *****
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software Foundation,
+# Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ***** END GPL LICENCE BLOCK *****
+
+# <pep8 compliant>
+
+"""Render preview images of the groups of a blend file.
+
+Usage, normally started by previews.PreviewRenderer:
+    blender -b --factory-startup -P render_previews.py -- JOB_JSON
+
+JOB_JSON is {"file": path, "size": pixels, "previews": [[group, png], ...]}.
+Each group is linked into an empty scene, framed by an orthographic camera
+and rendered with Blender Internal to its PNG path. The names of the groups
+rendered are printed as JSON on a line starting with RESULT_PREFIX, which
+must match the one of previews.py.
+"""
+
+import os
+import sys
+import json
+
+import bpy
+from mathutils import Vector
+
+
+RESULT_PREFIX = 'POWERLIB_PREVIEWS '
+
+# Direction the camera looks from, towards the center of the group
+VIEW_DIRECTION = Vector((1.0, -1.0, 0.8)).normalized()
+
+
+def group_bounds(group):
+    """Return the world space (min, max) corners of a group's objects"""
+    corners = [ob.matrix_world * Vector(corner)
+               for ob in group.objects
+               for corner in ob.bound_box]
+    if not corners:
+        return Vector((-1.0, -1.0, -1.0)), Vector((1.0, 1.0, 1.0))
+    low = Vector([min(co[axis] for co in corners) for axis in range(3)])
+    high = Vector([max(co[axis] for co in corners) for axis in range(3)])
+    return low, high
+
+
+def setup_scene(size):
+    scene = bpy.context.scene
+    scene.render.engine = 'BLENDER_RENDER'
+    scene.render.resolution_x = scene.render.resolution_y = size
+    scene.render.resolution_percentage = 100
+    scene.render.alpha_mode = 'TRANSPARENT'
+    scene.render.use_antialiasing = True
+    scene.render.image_settings.file_format = 'PNG'
+    scene.render.image_settings.color_mode = 'RGBA'
+
+    camera = bpy.data.objects.new('PreviewCamera', bpy.data.cameras.new('PreviewCamera'))
+    camera.data.type = 'ORTHO'
+    scene.objects.link(camera)
+    scene.camera = camera
+
+    sun = bpy.data.objects.new('PreviewSun', bpy.data.lamps.new('PreviewSun', 'SUN'))
+    sun.rotation_euler = (0.8, 0.2, 0.6)
+    scene.objects.link(sun)
+    return scene, camera
+
+
+def render_group(scene, camera, group, filepath):
+    instance = bpy.data.objects.new(group.name, None)
+    instance.dupli_type = 'GROUP'
+    instance.dupli_group = group
+    scene.objects.link(instance)
+    try:
+        low, high = group_bounds(group)
+        center = (low + high) / 2.0
+        radius = max((high - low).length / 2.0, 0.01)
+
+        camera.location = center + VIEW_DIRECTION * radius * 4.0
+        camera.rotation_euler = VIEW_DIRECTION.to_track_quat('Z', 'Y').to_euler()
+        camera.data.ortho_scale = radius * 2.2
+        camera.data.clip_end = radius * 10.0
+
+        # Written next to the final path, so a preview is never seen half-written
+        tmp_path = filepath + '.tmp.png'
+        scene.render.filepath = tmp_path
+        bpy.ops.render.render(write_still=True)
+        os.replace(tmp_path, filepath)
+    finally:
+        scene.objects.unlink(instance)
+        bpy.data.objects.remove(instance, do_unlink=True)
+
+
+def main(job):
+    previews = dict(job['previews'])
+    with bpy.data.libraries.load(job['file'], link=True) as (data_from, data_to):
+        data_to.groups = [name for name in data_from.groups if name in previews]
+
+    scene, camera = setup_scene(job['size'])
+    rendered = []
+    for group in data_to.groups:
+        if group is None:
+            continue
+        try:
+            render_group(scene, camera, group, previews[group.name])
+        except Exception:
+            import traceback
+            traceback.print_exc()
+            continue
+        rendered.append(group.name)
+
+    print(RESULT_PREFIX + json.dumps({'rendered': rendered}))
+    sys.stdout.flush()
+
+
+if __name__ == "__main__":
+    argv = sys.argv[sys.argv.index('--') + 1:] if '--' in sys.argv else []
+    main(json.loads(argv[0]))
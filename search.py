@@ -0,0 +1,402 @@
+# ***** BEGIN GPL LICENSE BLOCK *****
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software Foundation,
+# Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ***** END GPL LICENCE BLOCK *****
+
+# <pep8 compliant>
+
+"""Search index over the assets of a library.
+
+Every asset is indexed with its name, the group names of its components
+and their file paths, all lowercased. A query is split on whitespace and an
+asset matches when it matches every term:
+
+    - a term of three characters or more must be a substring of one of the
+      texts. Candidates come from a trigram index: the assets having the
+      rarest trigram of the query,
+    - a shorter term must be the start of a word of the texts, looked up by
+      bisection in the sorted list of the words.
+
+The assets whose name starts with the first term rank first. They are read
+in order from the sorted list of the names, so a search with a limit only
+ranks all the other matches when there are not enough of those.
+
+Assets are added and removed one at a time, so the index follows the edits
+made to the library without being rebuilt.
+
+This module does not depend on bpy.
+"""
+
+import re
+import heapq
+from bisect import bisect_left, insort
+
+# Up to this many new words are inserted one by one into the sorted words,
+# more are sorted in all at once
+_INSORT_MAX = 64
+
+# Trigram postings are intersected while the candidate documents are more
+# than _FEW_CANDIDATES and at most _INTERSECT_MAX
+_FEW_CANDIDATES = 256
+_INTERSECT_MAX = 8192
+
+# A search with a limit ranks all its candidates up to this many, beyond it
+# goes through the names in order
+_RANK_ALL_MAX = 8192
+
+
+_WORD_SPLIT = re.compile(r'[^0-9a-z]+')
+
+
+class _Document:
+    __slots__ = ('key', 'name', 'text', 'words', 'trigrams', 'name_trigrams')
+
+    def __init__(self, key, name, texts):
+        self.key = key
+        self.name = name.lower()
+        # One string, so that a substring test is a single `in`. The
+        # trigrams across two texts are never looked up, whitespace splits
+        # the query terms.
+        self.text = text = '\n'.join([name] + [text for text in texts if text]).lower()
+        self.words = set(_WORD_SPLIT.split(text))
+        self.words.discard('')
+        self.trigrams = {text[i:i + 3] for i in range(len(text) - 2)}
+        # A shorter name is its own "trigram"
+        name = self.name
+        self.name_trigrams = {name[i:i + 3] for i in range(max(len(name) - 2, 1))}
+
+    def matches(self, term):
+        if len(term) >= 3:
+            return term in self.text
+        return any(word.startswith(term) for word in self.words)
+
+
+class SearchIndex:
+    """Index of keys, eg. model.Asset, by name and other texts"""
+
+    def __init__(self):
+        # document id -> _Document
+        self._documents = {}
+        # key -> document id
+        self._ids = {}
+        self._next_id = 0
+        # trigram -> set of document ids
+        self._trigrams = {}
+        # trigram of the names only -> set of document ids
+        self._name_trigrams = {}
+        # word -> set of document ids
+        self._words = {}
+        # The words sorted, for prefix lookups. Can hold removed words, and
+        # misses the words added since the last lookup, see _sorted_words
+        self._sorted = []
+        self._new_words = []
+        # (name, document id) sorted, for the names starting with a query.
+        # Can hold removed documents, and misses the ones added since the
+        # last lookup, see _sorted_names
+        self._names = []
+        self._new_names = []
+
+    def __len__(self):
+        return len(self._documents)
+
+    def add(self, key, name, texts=()):
+        """Index a key under its name and other texts, replacing what it was
+        indexed under before.
+        """
+        if key in self._ids:
+            self.remove(key)
+        doc_id = self._next_id
+        self._next_id += 1
+        document = _Document(key, name, texts)
+        self._documents[doc_id] = document
+        self._ids[key] = doc_id
+        self._new_names.append((document.name, doc_id))
+
+        for trigram in document.trigrams:
+            self._trigrams.setdefault(trigram, set()).add(doc_id)
+        for trigram in document.name_trigrams:
+            self._name_trigrams.setdefault(trigram, set()).add(doc_id)
+        for word in document.words:
+            posting = self._words.get(word)
+            if posting is None:
+                posting = self._words[word] = set()
+                self._new_words.append(word)
+            posting.add(doc_id)
+
+    def remove(self, key):
+        doc_id = self._ids.pop(key, None)
+        if doc_id is None:
+            return
+        document = self._documents.pop(doc_id)
+
+        for trigram in document.trigrams:
+            posting = self._trigrams[trigram]
+            posting.discard(doc_id)
+            if not posting:
+                del self._trigrams[trigram]
+        for trigram in document.name_trigrams:
+            posting = self._name_trigrams[trigram]
+            posting.discard(doc_id)
+            if not posting:
+                del self._name_trigrams[trigram]
+        for word in document.words:
+            posting = self._words[word]
+            posting.discard(doc_id)
+            if not posting:
+                del self._words[word]
+
+    def clear(self):
+        self.__init__()
+
+    def _sorted_words(self):
+        new_words = self._new_words
+        if len(new_words) > _INSORT_MAX:
+            # Also drops the removed words
+            self._sorted = sorted(self._words)
+        else:
+            for word in new_words:
+                index = bisect_left(self._sorted, word)
+                if index == len(self._sorted) or self._sorted[index] != word:
+                    insort(self._sorted, word)
+        self._new_words = []
+        return self._sorted
+
+    def _sorted_names(self):
+        new_names = self._new_names
+        if len(new_names) > _INSORT_MAX:
+            # Also drops the removed documents
+            documents = self._documents
+            self._names = sorted(
+                (document.name, doc_id) for doc_id, document in documents.items())
+        else:
+            for entry in new_names:
+                insort(self._names, entry)
+        self._new_names = []
+        return self._names
+
+    def _named(self, prefix):
+        """Iterate over the ids of the documents whose name starts with
+        prefix, by name.
+        """
+        names = self._sorted_names()
+        documents = self._documents
+        index = bisect_left(names, (prefix,))
+        while index < len(names) and names[index][0].startswith(prefix):
+            doc_id = names[index][1]
+            if doc_id in documents:
+                yield doc_id
+            index += 1
+
+    def _prefixed(self, prefix):
+        """Iterate over the ids of the documents with a word starting with
+        prefix, once each, in the order of the words.
+        """
+        words = self._sorted_words()
+        index = bisect_left(words, prefix)
+        seen = set()
+        while index < len(words) and words[index].startswith(prefix):
+            for doc_id in sorted(self._words.get(words[index], ())):
+                if doc_id not in seen:
+                    seen.add(doc_id)
+                    yield doc_id
+            index += 1
+
+    def _prefixed_count(self, prefix):
+        """Return how many documents _prefixed(prefix) yields, at most"""
+        words = self._sorted_words()
+        index = bisect_left(words, prefix)
+        count = 0
+        while index < len(words) and words[index].startswith(prefix):
+            count += len(self._words.get(words[index], ()))
+            index += 1
+        return count
+
+    def _postings(self, terms):
+        """Return the sets of document ids that every match is in, smallest
+        first, or None when nothing matches. Empty when a query of short
+        terms has too many candidates to list them.
+        """
+        postings = []
+        for term in terms:
+            if len(term) < 3:
+                continue
+            for i in range(len(term) - 2):
+                posting = self._trigrams.get(term[i:i + 3])
+                if posting is None:
+                    return None
+                postings.append(posting)
+        if not postings:
+            # Only short terms
+            prefix = max(terms, key=len)
+            count = self._prefixed_count(prefix)
+            if not count:
+                return None
+            if count > _RANK_ALL_MAX:
+                return []
+            return [set(self._prefixed(prefix))]
+        postings.sort(key=len)
+        return postings
+
+    def _candidates(self, terms, postings):
+        """Iterate over document ids that include all the matches, possibly
+        more.
+        """
+        if not postings:
+            yield from self._prefixed(max(terms, key=len))
+            return
+
+        # Intersecting costs the size of the smaller set: worth it for rare
+        # trigrams, while common ones are checked per candidate
+        postings = list(postings)
+        candidates = postings.pop(0)
+        while postings and _FEW_CANDIDATES < len(candidates) <= _INTERSECT_MAX:
+            candidates = candidates & postings.pop(0)
+        for doc_id in candidates:
+            if all(doc_id in posting for posting in postings):
+                yield doc_id
+
+    def _containing(self, first):
+        """Return the ids of the documents whose name contains first but
+        does not start with it, or None when there are too many to list.
+        """
+        if len(first) < 3:
+            # In any of the trigrams of the name
+            postings = [posting for trigram, posting in self._name_trigrams.items()
+                        if first in trigram]
+            if sum(len(posting) for posting in postings) > _RANK_ALL_MAX:
+                return None
+            candidates = set().union(*postings)
+        else:
+            postings = []
+            for i in range(len(first) - 2):
+                posting = self._name_trigrams.get(first[i:i + 3])
+                if posting is None:
+                    return []
+                postings.append(posting)
+            postings.sort(key=len)
+            if len(postings[0]) > _RANK_ALL_MAX:
+                return None
+            candidates = postings[0]
+
+        documents = self._documents
+        return [doc_id for doc_id in candidates
+                if first in documents[doc_id].name
+                and not documents[doc_id].name.startswith(first)]
+
+    def _scan_names(self, terms, postings, count):
+        """Return up to count matches whose name does not start with the
+        first term, best ranked first, going through the names in order.
+        """
+        documents = self._documents
+        first = terms[0]
+
+        def matches(doc_id):
+            if not all(doc_id in posting for posting in postings):
+                return False
+            document = documents[doc_id]
+            return all(document.matches(term) for term in terms)
+
+        # The names containing the first term, then the others
+        inside, outside = [], []
+        containing = self._containing(first)
+        if containing is not None:
+            inside = sorted((documents[doc_id] for doc_id in containing if matches(doc_id)),
+                            key=lambda document: document.name)
+            if len(inside) >= count:
+                return inside[:count]
+
+        for name, doc_id in self._sorted_names():
+            if name.startswith(first) or doc_id not in documents:
+                continue
+            if first in name:
+                if containing is None and matches(doc_id):
+                    inside.append(documents[doc_id])
+                    if len(inside) >= count:
+                        break
+            elif len(outside) < count - len(inside):
+                if matches(doc_id):
+                    outside.append(documents[doc_id])
+            elif containing is not None:
+                # The names containing the first term are all listed
+                break
+        return (inside + outside)[:count]
+
+    def search(self, query, limit=None):
+        """Return the keys matching a query, see the module docstring.
+
+        :param limit: return at most this many keys, the best ranked ones.
+        :returns: list of keys, the ones whose name starts with the query
+            first, then by name.
+        """
+        terms = query.lower().split()
+        if not terms:
+            return []
+
+        documents = self._documents
+        first = terms[0]
+        found = []
+        if limit is not None:
+            # Already in ranked order
+            for doc_id in self._named(first):
+                document = documents[doc_id]
+                if all(document.matches(term) for term in terms):
+                    found.append(document)
+                    if len(found) >= limit:
+                        return [document.key for document in found]
+
+        postings = self._postings(terms)
+        if postings is None:
+            return [document.key for document in found]
+
+        if limit is not None:
+            if postings:
+                # Set intersections are cheap next to checking the
+                # candidates one by one, narrow them down before choosing
+                # how to rank them
+                postings = list(postings)
+                candidates = postings.pop(0)
+                while postings and len(candidates) > _RANK_ALL_MAX:
+                    narrowed = candidates & postings.pop(0)
+                    shrunk = len(narrowed) <= len(candidates) // 2
+                    candidates = narrowed
+                    if not shrunk:
+                        # The other trigrams are as common, checked lazily
+                        break
+                postings.insert(0, candidates)
+            if not postings or len(postings[0]) > _RANK_ALL_MAX:
+                # Too many candidates to rank them all, while the names in
+                # order soon give enough matches
+                found.extend(self._scan_names(terms, postings, limit - len(found)))
+                return [document.key for document in found]
+
+        others = []
+        for doc_id in self._candidates(terms, postings):
+            document = documents[doc_id]
+            if limit is not None and document.name.startswith(first):
+                continue
+            if all(document.matches(term) for term in terms):
+                others.append(document)
+
+        def rank(document):
+            return (not document.name.startswith(first), first not in document.name,
+                    document.name)
+
+        if limit is None:
+            others.sort(key=rank)
+        else:
+            others = heapq.nsmallest(limit - len(found), others, key=rank)
+        found.extend(others)
+        return [document.key for document in found]
@@ -0,0 +1,317 @@
+# ***** BEGIN GPL LICENSE BLOCK *****
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software Foundation,
+# Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ***** END GPL LICENCE BLOCK *****
+
+# <pep8 compliant>
+
+"""SQLite storage of a library, for libraries too large for one JSON file.
+
+A library path ending in .sqlite, .sqlite3 or .db is stored in three
+tables: collections, assets and components, indexed by name, by asset, by
+file path and by group name. Opening the library only reads the collection
+names; the assets of a collection are read when it is shown.
+
+Edits are not written by rewriting the library: model.Library records them
+(see Library.changes) and apply_changes() writes them row by row, all in one
+transaction.
+
+See convert_library.py to convert libraries to and from JSON.
+
+This module does not depend on bpy.
+"""
+
+import os
+import json
+import sqlite3
+from collections import OrderedDict
+
+if __package__:
+    from . import model
+else:
+    import model
+
+
+SCHEMA_VERSION = 1
+SQLITE_EXTENSIONS = {'.sqlite', '.sqlite3', '.db'}
+
+SCHEMA = """
+CREATE TABLE collections (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+CREATE TABLE assets (
+    id INTEGER PRIMARY KEY,
+    collection_id INTEGER NOT NULL REFERENCES collections(id) ON DELETE CASCADE,
+    name TEXT NOT NULL,
+    UNIQUE (collection_id, name)
+);
+CREATE TABLE components (
+    id INTEGER PRIMARY KEY,
+    asset_id INTEGER NOT NULL REFERENCES assets(id) ON DELETE CASCADE,
+    type_name TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    filepath TEXT NOT NULL,
+    group_name TEXT NOT NULL
+);
+CREATE INDEX components_by_asset ON components(asset_id, type_name, position);
+CREATE INDEX components_by_file ON components(filepath);
+CREATE INDEX components_by_group ON components(group_name);
+"""
+
+
+def is_sqlite_path(library_path):
+    """Whether a library path is stored with this module rather than JSON"""
+    return os.path.splitext(library_path)[1].lower() in SQLITE_EXTENSIONS
+
+
+def _component_rows(asset_id, asset_dict):
+    for type_name, components in asset_dict.items():
+        for position, (filepath, group_name) in enumerate(components):
+            yield asset_id, type_name, position, filepath, group_name
+
+
+class LibraryStore:
+    """A library in an SQLite database.
+
+    The connection may be used from another thread than the one that opened
+    it, one thread at a time, eg. read in a thread and edited afterwards.
+
+    :raises ValueError: when the file is not a library database.
+    """
+
+    def __init__(self, library_path):
+        self.library_path = library_path
+        self.connection = sqlite3.connect(library_path, check_same_thread=False)
+        try:
+            self.connection.execute('PRAGMA foreign_keys = ON')
+            version = self.connection.execute('PRAGMA user_version').fetchone()[0]
+            if version == 0:
+                with self.connection:
+                    self.connection.executescript(SCHEMA)
+                    self.connection.execute('PRAGMA user_version = {}'.format(SCHEMA_VERSION))
+            elif version != SCHEMA_VERSION:
+                raise ValueError("Unsupported library schema version {}".format(version))
+        except (sqlite3.DatabaseError, ValueError) as ex:
+            self.connection.close()
+            raise ValueError("Not a library database {}: {}".format(library_path, ex))
+
+    def close(self):
+        self.connection.close()
+
+    # Reading
+
+    def collection_names(self):
+        return [name for name, in self.connection.execute(
+            'SELECT name FROM collections ORDER BY id')]
+
+    def _read_assets(self, where, params):
+        """Return {collection name: {asset name: asset dict}}"""
+        rows = self.connection.execute("""
+            SELECT col.name, a.name, c.type_name, c.filepath, c.group_name
+            FROM collections col
+            JOIN assets a ON a.collection_id = col.id
+            LEFT JOIN components c ON c.asset_id = a.id
+            {}
+            ORDER BY col.id, a.id, c.id
+            """.format(where), params)
+        # Components are inserted in order, so their ids keep the order of the
+        # component types of each asset as well as the order within a type
+        collections = OrderedDict()
+        for collection_name, asset_name, type_name, filepath, group_name in rows:
+            asset = collections.setdefault(
+                collection_name, OrderedDict()).setdefault(asset_name, OrderedDict())
+            if type_name is not None:
+                asset.setdefault(type_name, []).append([filepath, group_name])
+        return collections
+
+    def load_collection(self, name):
+        """Return the assets of a collection in the JSON schema"""
+        return self._read_assets('WHERE col.name = ?', (name,)).get(name, {})
+
+    def read_index(self):
+        """Return a model.Library of the collection names only, see
+        model.Library.unloaded.
+        """
+        library = model.Library()
+        for name in self.collection_names():
+            library.add_collection(name)
+            library.unloaded.add(name)
+        library.read_search_texts = self.read_search_texts
+        return library
+
+    def read_search_texts(self, names):
+        """Return the texts to search the assets of collections by, without
+        reading the assets themselves.
+
+        Opens a connection of its own, so that the search index can be built
+        in a thread while the library is read and written.
+
+        :param names: the collections to read.
+        :returns: [(collection name, asset name, [group name, file path, ...])]
+        """
+        names = set(names)
+        result = []
+        connection = sqlite3.connect(self.library_path)
+        try:
+            rows = connection.execute("""
+                SELECT col.name, a.id, a.name, c.group_name, c.filepath
+                FROM collections col
+                JOIN assets a ON a.collection_id = col.id
+                LEFT JOIN components c ON c.asset_id = a.id
+                ORDER BY col.id, a.id, c.id
+                """)
+            last_id = None
+            for collection_name, asset_id, asset_name, group_name, filepath in rows:
+                if collection_name not in names:
+                    continue
+                if asset_id != last_id:
+                    last_id = asset_id
+                    texts = []
+                    result.append((collection_name, asset_name, texts))
+                if filepath is not None:
+                    texts.append(group_name)
+                    texts.append(filepath)
+        finally:
+            connection.close()
+        return result
+
+    def to_dict(self):
+        """Return the whole library in the JSON schema"""
+        library_dict = OrderedDict((name, OrderedDict()) for name in self.collection_names())
+        library_dict.update(self._read_assets('', ()))
+        return library_dict
+
+    # Writing, one transaction each. The _write_* methods leave the
+    # transaction to the caller.
+
+    def _collection_id(self, name):
+        row = self.connection.execute(
+            'SELECT id FROM collections WHERE name = ?', (name,)).fetchone()
+        if row is not None:
+            return row[0]
+        return self.connection.execute(
+            'INSERT INTO collections (name) VALUES (?)', (name,)).lastrowid
+
+    def _write_add_collection(self, name):
+        self._collection_id(name)
+
+    def _write_remove_collection(self, name):
+        self.connection.execute('DELETE FROM collections WHERE name = ?', (name,))
+
+    def _write_rename_collection(self, old_name, new_name):
+        # Nothing to do when old_name is gone, eg. the rename was written
+        # already. A new_name in use fails, model.Library refuses it too.
+        self.connection.execute(
+            'UPDATE collections SET name = ? WHERE name = ?', (new_name, old_name))
+
+    def _write_set_asset(self, collection_name, asset_name, asset_dict):
+        collection_id = self._collection_id(collection_name)
+        row = self.connection.execute(
+            'SELECT id FROM assets WHERE collection_id = ? AND name = ?',
+            (collection_id, asset_name)).fetchone()
+        if row is None:
+            asset_id = self.connection.execute(
+                'INSERT INTO assets (collection_id, name) VALUES (?, ?)',
+                (collection_id, asset_name)).lastrowid
+        else:
+            asset_id = row[0]
+            self.connection.execute('DELETE FROM components WHERE asset_id = ?', (asset_id,))
+        self.connection.executemany(
+            'INSERT INTO components (asset_id, type_name, position, filepath, group_name) '
+            'VALUES (?, ?, ?, ?, ?)', _component_rows(asset_id, asset_dict))
+
+    def _write_remove_asset(self, collection_name, asset_name):
+        self.connection.execute(
+            'DELETE FROM assets WHERE name = ? AND collection_id = '
+            '(SELECT id FROM collections WHERE name = ?)', (asset_name, collection_name))
+
+    def add_collection(self, name):
+        with self.connection:
+            self._write_add_collection(name)
+
+    def remove_collection(self, name):
+        with self.connection:
+            self._write_remove_collection(name)
+
+    def rename_collection(self, old_name, new_name):
+        with self.connection:
+            self._write_rename_collection(old_name, new_name)
+
+    def set_asset(self, collection_name, asset_name, asset_dict):
+        """Add or replace an asset and its components"""
+        with self.connection:
+            self._write_set_asset(collection_name, asset_name, asset_dict)
+
+    def remove_asset(self, collection_name, asset_name):
+        with self.connection:
+            self._write_remove_asset(collection_name, asset_name)
+
+    def apply_changes(self, changes):
+        """Write the edits recorded by a model.Library, in order, in a single
+        transaction: either all of them are written or none.
+
+        :returns: number of edits written.
+        :raises sqlite3.Error: when the edits could not be written.
+        """
+        writers = {
+            'add_collection': self._write_add_collection,
+            'remove_collection': self._write_remove_collection,
+            'rename_collection': self._write_rename_collection,
+            'set_asset': self._write_set_asset,
+            'remove_asset': self._write_remove_asset,
+        }
+        with self.connection:
+            for kind, *args in changes:
+                writers[kind](*args)
+        return len(changes)
+
+    def import_dict(self, library_dict):
+        """Replace the whole library with one in the JSON schema, in a single
+        transaction.
+        """
+        with self.connection:
+            self.connection.execute('DELETE FROM collections')
+            for collection_name, collection_dict in library_dict.items():
+                collection_id = self.connection.execute(
+                    'INSERT INTO collections (name) VALUES (?)', (collection_name,)).lastrowid
+                for asset_name, asset_dict in collection_dict.items():
+                    asset_id = self.connection.execute(
+                        'INSERT INTO assets (collection_id, name) VALUES (?, ?)',
+                        (collection_id, asset_name)).lastrowid
+                    self.connection.executemany(
+                        'INSERT INTO components (asset_id, type_name, position, filepath, '
+                        'group_name) VALUES (?, ?, ?, ?, ?)',
+                        _component_rows(asset_id, asset_dict))
+
+
+def read_library_file(library_path):
+    """Read a whole library file, JSON or SQLite, into a model.Library
+
+    :raises ValueError: when the content is empty or malformed.
+    """
+    if is_sqlite_path(library_path):
+        store = LibraryStore(library_path)
+        try:
+            return model.Library.from_dict(store.to_dict())
+        finally:
+            store.close()
+
+    with open(library_path) as data_file:
+        try:
+            return model.Library.from_dict(json.load(data_file))
+        except (KeyError, ValueError, AttributeError, TypeError) as ex:
+            raise ValueError("Malformed library {}: {}".format(library_path, ex))
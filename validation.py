@@ -0,0 +1,265 @@
+# ***** BEGIN GPL LICENSE BLOCK *****
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software Foundation,
+# Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ***** END GPL LICENCE BLOCK *****
+
+# <pep8 compliant>
+
+"""Checks of a whole library in one pass.
+
+    validator = Validator(library, library_path, group_cache)
+    report = validator.run()
+
+Every component is checked for:
+
+    missing_file        its file does not exist
+    unreadable_file     its file can not be read as a blend file
+    missing_group       its group is not in its file
+    self_reference      its file is the library JSON itself
+    duplicate_component the asset lists the same file and group twice
+
+and every asset for:
+
+    duplicate_asset     another asset has exactly the same components
+    duplicate_name      another collection has an asset with the same name
+
+The files are checked once however many components use them, existence by
+listing their directories (see paths.py), groups with blendfile.py in a
+thread pool. This runs inside Blender, whose process is not safe to fork and
+whose sys.executable is Blender itself, so there are no worker processes;
+reading the files is mostly I/O anyway. Group lists come from the group cache
+when the files did not change, and new lists are added to it.
+
+This module does not depend on bpy.
+"""
+
+import os
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from . import blendfile
+from .paths import PathCache
+
+
+ERROR = 'ERROR'
+WARNING = 'WARNING'
+
+SEVERITIES = {
+    'missing_file': ERROR,
+    'unreadable_file': ERROR,
+    'missing_group': ERROR,
+    'self_reference': ERROR,
+    'duplicate_component': WARNING,
+    'duplicate_asset': WARNING,
+    'duplicate_name': WARNING,
+}
+
+
+def report_path_for_library(library_path):
+    """Return the path of the report that belongs to a library JSON"""
+    return os.path.splitext(library_path)[0] + '.validation.json'
+
+
+class Issue:
+    __slots__ = ('kind', 'collection', 'asset', 'filepath', 'id', 'message')
+
+    def __init__(self, kind, asset, component=None, message=''):
+        self.kind = kind
+        self.collection = asset.collection.name
+        self.asset = asset.name
+        self.filepath = component.filepath if component is not None else None
+        self.id = component.id if component is not None else None
+        self.message = message
+
+    @property
+    def severity(self):
+        return SEVERITIES[self.kind]
+
+    def to_dict(self):
+        return {
+            'kind': self.kind,
+            'severity': self.severity,
+            'collection': self.collection,
+            'asset': self.asset,
+            'filepath': self.filepath,
+            'id': self.id,
+            'message': self.message,
+        }
+
+
+def _list_groups(abspath):
+    """Worker thread: return (group names, None) or (None, (issue kind,
+    error message))
+    """
+    try:
+        return blendfile.list_groups(abspath), None
+    except FileNotFoundError:
+        # Removed since its directory was listed
+        return None, ('missing_file', '')
+    except (OSError, blendfile.BlendFileError) as ex:
+        return None, ('unreadable_file', str(ex))
+
+
+class Validator:
+    def __init__(self, library, library_path, group_cache=None, jobs=None):
+        """
+        :param library: the model.Library to check.
+        :param library_path: absolute path of the library JSON.
+        :param group_cache: groupcache.GroupCache to read and fill, optional.
+        :param jobs: number of reading threads, defaults to the CPU count.
+        """
+        self.library = library
+        self.library_path = os.path.normpath(library_path)
+        self.group_cache = group_cache
+        self.jobs = jobs or os.cpu_count() or 1
+        self.paths = PathCache()
+        self.paths.reset(None, os.path.dirname(self.library_path), '')
+        self.issues = []
+        self.num_components = 0
+        self.num_files = 0
+
+    def run(self):
+        """Check the library and return the report as a dict"""
+        start = time.time()
+        self.issues = []
+
+        # abspath -> list of (asset, component) using that file
+        users_by_file = self._check_components()
+        groups_by_file = self._list_groups(users_by_file)
+
+        for abspath, users in users_by_file.items():
+            groups = groups_by_file.get(abspath)
+            if groups is None:
+                continue
+            groups = set(groups)
+            for asset, component in users:
+                if component.id not in groups:
+                    self.issues.append(Issue(
+                        'missing_group', asset, component,
+                        "No group {} in the file".format(component.id)))
+
+        self._check_assets()
+        return self.report(time.time() - start)
+
+    def _check_components(self):
+        users_by_file = {}
+        self.num_components = 0
+
+        for collection in self.library.collections.values():
+            for asset in collection.assets.values():
+                seen = set()
+                for component in asset.components():
+                    self.num_components += 1
+
+                    key = (component.type_name, component.filepath, component.id)
+                    if key in seen:
+                        self.issues.append(Issue('duplicate_component', asset, component))
+                    seen.add(key)
+
+                    abspath = self.paths.absolute(component.filepath)
+                    if abspath is None:
+                        self.issues.append(Issue('missing_file', asset, component))
+                    elif abspath == self.library_path:
+                        self.issues.append(Issue('self_reference', asset, component))
+                    else:
+                        users_by_file.setdefault(abspath, []).append((asset, component))
+
+        self.num_files = len(users_by_file)
+        return users_by_file
+
+    def _list_groups(self, users_by_file):
+        """Return abspath -> group names of the files that could be read"""
+        cache = self.group_cache
+        result = {}
+        to_list = {}
+        for abspath in users_by_file:
+            try:
+                stat = os.stat(abspath)
+            except OSError:
+                # Removed since its directory was listed
+                to_list[abspath] = None
+                continue
+            groups = None
+            if cache is not None:
+                groups = cache.lookup(abspath, stat.st_mtime, stat.st_size)
+            if groups is None:
+                to_list[abspath] = stat
+            else:
+                result[abspath] = groups
+
+        if to_list:
+            paths = list(to_list)
+            with ThreadPoolExecutor(max_workers=self.jobs) as executor:
+                listed = executor.map(_list_groups, paths)
+                for abspath, (groups, error) in zip(paths, listed):
+                    if error is not None:
+                        kind, message = error
+                        for asset, component in users_by_file[abspath]:
+                            self.issues.append(Issue(kind, asset, component, message))
+                        continue
+                    stat = to_list[abspath]
+                    if cache is not None and stat is not None:
+                        cache.put(abspath, stat.st_mtime, stat.st_size, groups)
+                    result[abspath] = groups
+        return result
+
+    def _check_assets(self):
+        by_components = {}
+        for collection in self.library.collections.values():
+            for asset in collection.assets.values():
+                key = tuple(sorted(
+                    (c.type_name, c.filepath, c.id) for c in asset.components()))
+                if not key:
+                    continue
+                other = by_components.setdefault(key, asset)
+                if other is not asset:
+                    self.issues.append(Issue(
+                        'duplicate_asset', asset,
+                        message="Same components as {}/{}".format(
+                            other.collection.name, other.name)))
+
+        for name, assets in self.library.assets_by_name.items():
+            if len(assets) < 2:
+                continue
+            assets = list(assets)
+            for asset in assets[1:]:
+                self.issues.append(Issue(
+                    'duplicate_name', asset,
+                    message="Also in collection {}".format(assets[0].collection.name)))
+
+    def report(self, seconds=0.0):
+        counts = {}
+        for issue in self.issues:
+            counts[issue.kind] = counts.get(issue.kind, 0) + 1
+        return {
+            'library': self.library_path,
+            'seconds': round(seconds, 3),
+            'summary': {
+                'collections': len(self.library.collections),
+                'components': self.num_components,
+                'files': self.num_files,
+                'errors': sum(1 for i in self.issues if i.severity == ERROR),
+                'warnings': sum(1 for i in self.issues if i.severity == WARNING),
+                'issues': counts,
+            },
+            'issues': [issue.to_dict() for issue in self.issues],
+        }
+
+
+def write_report(report, report_path):
+    with open(report_path, 'w') as report_file:
+        json.dump(report, report_file, indent=4, sort_keys=True)